@@ -1,36 +1,105 @@
+import contextvars
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import streamlit as st
 import pandas as pd
-from sqlalchemy import create_engine, text
-
-
-MYSQL_USER = "root"
-MYSQL_PASSWORD = "venkat"
-MYSQL_HOST = "localhost"
-MYSQL_DATABASE = "cdta_db"
+import pyarrow as pa
+from sqlalchemy import text
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+import backend
+import instrumentation
+import query_governor
+from detector import DETECTION_RULES, FLAG_ARCHIVE_TABLE, resolve_flags
+from insights import INSIGHTS, OVERVIEW_QUERIES, ROLLUP_INSIGHTS, ROLLUP_OVERVIEW_QUERIES, keyset_predicate
+from query_governor import DEFAULT_ROW_CAP, EXPORT_ROW_CAP, QueryRejected
+from query_cache import QueryResultCache, bump_data_version, cache_key, read_data_version
+from report_batch import latest_bundle, load_bundle_report
+from vehicle_profiles import ProfileCache, lookup_profile
+from vehicle_search import find_plates
 
 TRAFFIC_STOPS_TABLE = "traffic_stops"
 FLAGGED_VEHICLES_TABLE = "flagged_vehicles"
+INGEST_WATERMARKS_TABLE = "ingest_watermarks"
+OVERVIEW_WORKERS = 4
+SEARCH_PAGE_SIZES = [25, 50, 100, 250, 500]
+SEARCH_COUNT_CAP = 100000
+FLAG_STATUSES = ["Active (Unresolved)", "Resolved", "All", "Archived"]
+FLAG_PAGE_SIZES = [50, 100, 250, 500]
+FLAG_COUNT_CAP = 10000
+SQL_DISPLAY_MAX_BYTES = 64 * 1024 * 1024
+SQL_EXPORT_DIR = "exports"
+SQL_DOWNLOAD_MAX_BYTES = 200 * 1024 * 1024
+METRICS_DUMP_FILES = {"Prometheus text": "metrics.prom", "JSON": "metrics.json"}
+SQL_OUTPUTS = {"Display": None, "Export to Parquet": "parquet", "Export to CSV": "csv"}
+SEARCH_COLUMNS = [
+    'stop_id', 'stop_date', 'stop_time', 'country_name', 'driver_gender', 'driver_age',
+    'driver_race', 'violation', 'search_conducted', 'search_type', 'stop_outcome',
+    'is_arrested', 'stop_duration', 'drugs_related_stop', 'vehicle_number'
+]
 
 @st.cache_resource
 def get_db_connection():
+    # MySQL or the embedded DuckDB copy, per SECURECHECK_BACKEND. The MySQL
+    # pool is larger than OVERVIEW_WORKERS so concurrent panels never wait.
     try:
-        db_connection_str = (
-            f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}/{MYSQL_DATABASE}"
-        )
-        engine = create_engine(db_connection_str)
-        return engine
+        return backend.get_engine()
     except Exception as e:
         st.error(f"Error connecting to the database: {e}")
         st.stop()
 
-def fetch_data(query, params=None):
+@st.cache_resource
+def get_result_cache():
+    return QueryResultCache()
+
+@st.cache_resource
+def get_profile_cache():
+    return ProfileCache()
+
+def flags_available():
+    # Flags live in MySQL only; the DuckDB stand-in has no flag tables.
+    return get_db_connection().dialect.name != "duckdb"
+
+def sync_result_cache():
+    # One primary-key read per rerun; a changed data version empties the cache.
     engine = get_db_connection()
+    with engine.connect() as connection:
+        get_result_cache().sync_version(read_data_version(connection))
+
+def format_seconds(value):
+    if pd.isna(value):
+        return None
+    value = int(value)
+    return f"{value // 3600:02d}:{value % 3600 // 60:02d}:{value % 60:02d}"
+
+def run_query(engine, result_cache, query, params=None):
+    # Safe to call from worker threads: it takes the engine and cache as
+    # arguments and never touches st, so errors propagate to the caller.
+    if params is not None and not isinstance(params, (tuple, dict)):
+        params = tuple(params)
+    key = cache_key(query, params)
+    # Captured before the read, so a version bump during it keeps the
+    # result out of the cache.
+    data_version = result_cache.data_version
+    cached_df = result_cache.get(key)
+    if cached_df is not None:
+        instrumentation.METRICS.record_result(query, "hit")
+        return cached_df
+
+    with engine.connect() as connection:
+        df = backend.read_frame(connection, query, params)
+    # TIME columns arrive as timedeltas; show them as HH:MM:SS.
+    for column in df.select_dtypes(include='timedelta64').columns:
+        df[column] = df[column].dt.total_seconds().map(format_seconds)
+    instrumentation.METRICS.record_result(query, "miss", len(df), result_cache.put(key, df, data_version))
+    return df
+
+def fetch_data(query, params=None):
     try:
-        with engine.connect() as connection:
-            if params is not None and not isinstance(params, (tuple, dict)):
-                params = tuple(params)
-            df = pd.read_sql(query, connection, params=params)
-        return df
+        return run_query(get_db_connection(), get_result_cache(), query, params)
     except Exception as e:
         st.error(f"Error fetching data with query: {query}. Reason: {e}")
         return pd.DataFrame()
@@ -39,238 +108,209 @@ def execute_query(query, params=None):
     engine = get_db_connection()
     try:
         with engine.connect() as connection:
-            if params is not None and not isinstance(params, (tuple, dict)):
-                params = tuple(params)
-            connection.execute(text(query), params)
+            backend.run(connection, query, params)
+            bump_data_version(connection)
             connection.commit()
+        sync_result_cache()
     except Exception as e:
         st.error(f"Error executing query: {query}. Reason: {e}")
 
+def current_user():
+    # Signed-in users are limited per account, anyone else per browser session.
+    try:
+        if st.user.is_logged_in:
+            return st.user.email
+    except (AttributeError, KeyError):
+        pass
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "local"
+
+def governed_batches(query, status):
+    # The governor yields None while the statement is still running; redrawing
+    # the status then is also where a Cancel click stops this script run.
+    started = time.perf_counter()
+    for batch in query_governor.run_governed(query, current_user()):
+        if batch is None:
+            status.info(f"Running for {time.perf_counter() - started:.0f}s... (Cancel stops it)")
+            continue
+        yield batch
+
+def stream_custom_query(query):
+    # Custom queries stream typed Arrow batches straight to the page instead of
+    # going through the result cache, so a SELECT * never loads the whole table
+    # into this process. Reading stops once the display cap is reached.
+    status = st.empty()
+    table_placeholder = st.empty()
+    batches = []
+    shown_bytes = 0
+    capped = False
+    status.info("Running query...")
+    for batch in governed_batches(query, status):
+        if shown_bytes + batch.nbytes > SQL_DISPLAY_MAX_BYTES and batches:
+            capped = True
+            break
+        batches.append(batch)
+        shown_bytes += batch.nbytes
+        table_placeholder.dataframe(pa.Table.from_batches(batches), use_container_width=True)
+        status.info(f"Fetched {sum(b.num_rows for b in batches):,} rows so far...")
+    rows = sum(b.num_rows for b in batches)
+    if capped:
+        status.warning(f"Showing the first {rows:,} rows ({shown_bytes / 1024 / 1024:.0f} MB display limit). "
+                       "Export the query to get the full result.")
+    elif rows:
+        status.success(f"Query executed successfully! {rows:,} rows.")
+    else:
+        status.info("Query returned no results.")
+
+def export_custom_query(query, fmt):
+    os.makedirs(SQL_EXPORT_DIR, exist_ok=True)
+    path = os.path.join(SQL_EXPORT_DIR, f"query_{pd.Timestamp.now():%Y%m%dT%H%M%S}.{fmt}")
+    status = st.empty()
+    status.info("Exporting...")
+    rows = backend.write_batches(governed_batches(query, status), path, fmt)
+    status.empty()
+    size = os.path.getsize(path)
+    st.success(f"Exported {rows:,} rows ({size / 1024 / 1024:.1f} MB) to {path}.")
+    if size <= SQL_DOWNLOAD_MAX_BYTES:
+        with open(path, "rb") as export_file:
+            st.download_button("Download export", export_file, file_name=os.path.basename(path))
+    else:
+        st.info("The export is too large to download through the browser; copy it from the server.")
 
-INSIGHTS = {
-    "Top 10 Drug-Related Vehicles": f"""
-        SELECT vehicle_number, COUNT(*) as stop_count
-        FROM {TRAFFIC_STOPS_TABLE}
-        WHERE drugs_related_stop = TRUE AND vehicle_number != 'Unknown'
-        GROUP BY vehicle_number
-        ORDER BY stop_count DESC
-        LIMIT 10;
-    """,
-    "Most Frequently Searched Vehicles": f"""
-        SELECT vehicle_number, COUNT(*) as search_count
-        FROM {TRAFFIC_STOPS_TABLE}
-        WHERE search_conducted = TRUE AND vehicle_number != 'Unknown'
-        GROUP BY vehicle_number
-        ORDER BY search_count DESC
-        LIMIT 10;
-    """,
-    "Driver Age Group with Highest Arrest Rate": f"""
-        SELECT
-            CASE
-                WHEN driver_age BETWEEN 15 AND 20 THEN '15-20'
-                WHEN driver_age BETWEEN 21 AND 25 THEN '21-25'
-                WHEN driver_age BETWEEN 26 AND 35 THEN '26-35'
-                WHEN driver_age BETWEEN 36 AND 50 THEN '36-50'
-                WHEN driver_age > 50 THEN '50+'
-                ELSE 'Unknown'
-            END as age_group,
-            (SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) as arrest_rate
-        FROM {TRAFFIC_STOPS_TABLE}
-        WHERE driver_age > 0
-        GROUP BY age_group
-        ORDER BY arrest_rate DESC;
-    """,
-    "Gender Distribution of Drivers Stopped by Country": f"""
-        SELECT country_name, driver_gender, COUNT(*) as stop_count
-        FROM {TRAFFIC_STOPS_TABLE}
-        WHERE country_name != 'Unknown' AND driver_gender != 'Unknown'
-        GROUP BY country_name, driver_gender
-        ORDER BY country_name, driver_gender;
-    """,
-    "Race and Gender Combination with Highest Search Rate": f"""
-        SELECT
-            driver_race,
-            driver_gender,
-            (SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) as search_rate
-        FROM {TRAFFIC_STOPS_TABLE}
-        WHERE driver_race != 'Unknown' AND driver_gender != 'Unknown'
-        GROUP BY driver_race, driver_gender
-        ORDER BY search_rate DESC
-        LIMIT 10;
-    """,
-    "Time of Day with Most Traffic Stops": f"""
-        SELECT
-            HOUR(stop_time) AS hour_of_day,
-            COUNT(*) AS stop_count
-        FROM {TRAFFIC_STOPS_TABLE}
-        GROUP BY hour_of_day
-        ORDER BY stop_count DESC;
-    """,
-    "Average Stop Duration for Different Violations": f"""
-        SELECT violation, AVG(
-            CASE stop_duration
-                WHEN '0-15 Min' THEN 7.5
-                WHEN '16-30 Min' THEN 23
-                WHEN '30+ Min' THEN 45
-                ELSE 0
-            END
-        ) as average_duration_minutes
-        FROM {TRAFFIC_STOPS_TABLE}
-        WHERE violation != 'Unknown'
-        GROUP BY violation
-        ORDER BY average_duration_minutes DESC;
-    """,
-    "Night Stops More Likely to Lead to Arrests?": f"""
-        SELECT
-            CASE
-                WHEN HOUR(stop_time) >= 20 OR HOUR(stop_time) < 6
-                THEN 'Night'
-                ELSE 'Day'
-            END as time_of_day_category,
-            (SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) as arrest_rate
-        FROM {TRAFFIC_STOPS_TABLE}
-        GROUP BY time_of_day_category
-        ORDER BY arrest_rate DESC;
-    """,
-    "Violations Most Associated with Searches or Arrests": f"""
-        SELECT
-            violation,
-            (SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) as search_rate,
-            (SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) as arrest_rate
-        FROM {TRAFFIC_STOPS_TABLE}
-        WHERE violation != 'Unknown'
-        GROUP BY violation
-        ORDER BY search_rate DESC, arrest_rate DESC;
-    """,
-    "Violations Most Common Among Younger Drivers (<25)": f"""
-        SELECT violation, COUNT(*) as stop_count
-        FROM {TRAFFIC_STOPS_TABLE}
-        WHERE driver_age > 0 AND driver_age < 25 AND violation != 'Unknown'
-        GROUP BY violation
-        ORDER BY stop_count DESC
-        LIMIT 10;
-    """,
-    "Violation That Rarely Results in Search or Arrest": f"""
-        SELECT
-            violation,
-            (SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) as search_rate,
-            (SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) as arrest_rate
-        FROM {TRAFFIC_STOPS_TABLE}
-        WHERE violation != 'Unknown'
-        GROUP BY violation
-        HAVING search_rate < 5 AND arrest_rate < 5
-        ORDER BY search_rate ASC, arrest_rate ASC
-        LIMIT 5;
-    """,
-    "Countries with Highest Rate of Drug-Related Stops": f"""
-        SELECT country_name,
-               (SUM(CASE WHEN drugs_related_stop = TRUE THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) as drug_related_stop_rate
-        FROM {TRAFFIC_STOPS_TABLE}
-        WHERE country_name != 'Unknown'
-        GROUP BY country_name
-        ORDER BY drug_related_stop_rate DESC
-        LIMIT 10;
-    """,
-    "Arrest Rate by Country and Violation": f"""
-        SELECT country_name, violation,
-               (SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) as arrest_rate
-        FROM {TRAFFIC_STOPS_TABLE}
-        WHERE country_name != 'Unknown' AND violation != 'Unknown'
-        GROUP BY country_name, violation
-        HAVING COUNT(*) > 10
-        ORDER BY country_name, arrest_rate DESC;
-    """,
-    "Country with Most Stops with Search Conducted": f"""
-        SELECT country_name, COUNT(*) as search_conducted_stops_count
-        FROM {TRAFFIC_STOPS_TABLE}
-        WHERE search_conducted = TRUE AND country_name != 'Unknown'
-        GROUP BY country_name
-        ORDER BY search_conducted_stops_count DESC
-        LIMIT 5;
-    """,
-    "Yearly Breakdown of Stops and Arrests by Country": f"""
-        SELECT
-            YEAR(stop_date) AS stop_year,
-            country_name,
-            COUNT(*) AS total_stops,
-            SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) AS total_arrests,
-            (SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) AS arrest_rate_percentage
-        FROM {TRAFFIC_STOPS_TABLE}
-        WHERE country_name != 'Unknown' AND stop_date IS NOT NULL
-        GROUP BY stop_year, country_name
-        ORDER BY stop_year, country_name;
-    """,
-    "Driver Violation Trends Based on Age and Race": f"""
-        SELECT
-            ts.driver_race,
-            ts.driver_age,
-            ts.violation,
-            COUNT(*) AS violation_count
-        FROM {TRAFFIC_STOPS_TABLE} AS ts
-        WHERE ts.driver_race != 'Unknown' AND ts.violation != 'Unknown' AND ts.driver_age > 0
-        GROUP BY ts.driver_race, ts.driver_age, ts.violation
-        ORDER BY ts.driver_race, ts.driver_age, violation_count DESC
-        LIMIT 100;
-    """,
-    "Time Period Analysis of Stops (Year, Month, Hour)": f"""
-        SELECT
-            YEAR(stop_date) AS stop_year,
-            MONTH(stop_date) AS stop_month,
-            HOUR(stop_time) AS stop_hour,
-            COUNT(*) AS number_of_stops
-        FROM {TRAFFIC_STOPS_TABLE}
-        WHERE stop_date IS NOT NULL AND stop_time IS NOT NULL
-        GROUP BY stop_year, stop_month, stop_hour
-        ORDER BY stop_year, stop_month, stop_hour;
-    """,
-    "Violations with High Search and Arrest Rates": f"""
-        WITH ViolationStats AS (
-            SELECT
-                violation,
-                COUNT(*) AS total_stops,
-                SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END) AS total_searches,
-                SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) AS total_arrests
-            FROM {TRAFFIC_STOPS_TABLE}
-            WHERE violation != 'Unknown'
-            GROUP BY violation
-        )
-        SELECT
-            violation,
-            total_stops,
-            total_searches,
-            total_arrests,
-            (total_searches * 100.0 / total_stops) AS search_rate_percentage,
-            (total_arrests * 100.0 / total_stops) AS arrest_rate_percentage
-        FROM ViolationStats
-        WHERE total_stops > 50
-        ORDER BY search_rate_percentage DESC, arrest_rate_percentage DESC
-        LIMIT 10;
-    """,
-    "Driver Demographics by Country (Age, Gender, and Race)": f"""
-        SELECT
-            country_name,
-            driver_gender,
-            driver_race,
-            COUNT(*) AS total_stops,
-            AVG(driver_age) AS average_driver_age
-        FROM {TRAFFIC_STOPS_TABLE}
-        WHERE country_name != 'Unknown' AND driver_gender != 'Unknown' AND driver_race != 'Unknown' AND driver_age > 0
-        GROUP BY country_name, driver_gender, driver_race
-        ORDER BY country_name, total_stops DESC
-        LIMIT 100;
-    """,
-    "Top 5 Violations with Highest Arrest Rates": f"""
-        SELECT
-            violation,
-            (SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) as arrest_rate
-        FROM {TRAFFIC_STOPS_TABLE}
-        WHERE violation != 'Unknown'
-        GROUP BY violation
-        ORDER BY arrest_rate DESC
-        LIMIT 5;
-    """
-}
+@st.cache_data(max_entries=1)
+def rollup_is_current(data_version):
+    # The rollup can answer a report only if it has folded in every stop. Loads
+    # bump the data version, so the answer is cached per version.
+    engine = get_db_connection()
+    try:
+        with engine.connect() as connection:
+            row = connection.execute(text(f"""
+                SELECT
+                    w.rollup_stop_id,
+                    (SELECT COALESCE(MAX(stop_id), 0) FROM {TRAFFIC_STOPS_TABLE}) AS max_stop_id
+                FROM {INGEST_WATERMARKS_TABLE} w
+                WHERE w.table_name = :table_name;
+            """), {'table_name': TRAFFIC_STOPS_TABLE}).first()
+        return row is not None and row.rollup_stop_id == row.max_stop_id
+    except Exception:
+        return False
+
+def insight_query(name, use_rollup):
+    if use_rollup and name in ROLLUP_INSIGHTS:
+        return ROLLUP_INSIGHTS[name]
+    return INSIGHTS[name]
+
+def overview_query(name, use_rollup):
+    return ROLLUP_OVERVIEW_QUERIES[name] if use_rollup else OVERVIEW_QUERIES[name]
+
+def row_cursor(row):
+    stop_time = row['stop_time']
+    return (
+        str(pd.Timestamp(row['stop_date']).date()),
+        None if pd.isna(stop_time) else str(stop_time),
+        int(row['stop_id']),
+    )
+
+@st.cache_data(max_entries=256)
+def matching_plates(term, data_version):
+    # Resolves a partial plate to exact plates through the trigram index;
+    # None means fall back to a LIKE scan.
+    engine = get_db_connection()
+    try:
+        with engine.connect() as connection:
+            return find_plates(connection, term)
+    except Exception:
+        return None
+
+def next_search_page():
+    st.session_state.search_cursors.append(st.session_state.search_next_cursor)
+
+def previous_search_page():
+    if st.session_state.search_cursors:
+        st.session_state.search_cursors.pop()
+
+def flag_filter(status, rule_ids, plate):
+    # (table, WHERE clause, named params) for the Flagged Vehicles filters.
+    # Archived flags live in their own table; the others in flagged_vehicles,
+    # where a status plus the (resolved, flag_timestamp) index serves each page.
+    table = FLAG_ARCHIVE_TABLE if status == "Archived" else FLAGGED_VEHICLES_TABLE
+    conditions = []
+    params = {}
+    if status == "Active (Unresolved)":
+        conditions.append("resolved = FALSE")
+    elif status == "Resolved":
+        conditions.append("resolved = TRUE")
+    if rule_ids:
+        names = [f"rule_{n}" for n in range(len(rule_ids))]
+        conditions.append(f"rule_id IN ({', '.join(':' + name for name in names)})")
+        params.update(zip(names, rule_ids))
+    if plate:
+        conditions.append("vehicle_number = :plate")
+        params['plate'] = plate.strip()
+    return table, " AND ".join(conditions) or "1=1", params
+
+def next_flag_page():
+    st.session_state.flag_cursors.append(st.session_state.flag_next_cursor)
+
+def previous_flag_page():
+    if st.session_state.flag_cursors:
+        st.session_state.flag_cursors.pop()
+
+def parse_flag_ids(value):
+    ids = value.replace(",", " ").split()
+    if not all(flag_id.isdigit() for flag_id in ids):
+        raise ValueError("Flag IDs must be whole numbers separated by commas or spaces.")
+    return [int(flag_id) for flag_id in ids]
+
+def resolve_flagged(flag_ids=None, where=None, params=None):
+    # Any number of flags in one UPDATE and one data version bump, so the page
+    # reruns once per action instead of once per flag.
+    engine = get_db_connection()
+    try:
+        with engine.connect() as connection:
+            resolved = resolve_flags(connection, flag_ids, where, params)
+            connection.commit()
+        sync_result_cache()
+        return resolved
+    except Exception as e:
+        st.error(f"Error resolving flags. Reason: {e}")
+        return 0
+
+def lookup_vehicle(plate):
+    # One primary-key read, or none when the plate was looked up before at the
+    # current data version (synced with the result cache on every rerun).
+    cache = get_profile_cache()
+    cache.sync_version(get_result_cache().data_version)
+    try:
+        with get_db_connection().connect() as connection:
+            return lookup_profile(connection, plate, cache)
+    except Exception as e:
+        st.error(f"Error looking up vehicle '{plate.strip()}'. Reason: {e}")
+        st.stop()
 
+@st.cache_data(max_entries=64)
+def bundle_report(bundle_dir, manifest, name):
+    # Bundles are immutable once written, so the directory is a complete key.
+    return load_bundle_report(bundle_dir, manifest, name)
+
+def fetch_concurrently(queries):
+    # Runs independent panel queries on the pooled engine and yields
+    # (name, df, error) as each one finishes, so the page can paint panels in
+    # completion order instead of waiting for the slowest.
+    engine = get_db_connection()
+    result_cache = get_result_cache()
+    with ThreadPoolExecutor(max_workers=OVERVIEW_WORKERS) as executor:
+        futures = {
+            # Each worker runs in a copy of this context, so its queries are
+            # attributed to the page that asked for them.
+            executor.submit(contextvars.copy_context().run, run_query, engine, result_cache, query): name
+            for name, query in queries.items()
+        }
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], pd.DataFrame(), e
 
 st.set_page_config(layout="wide", page_title="SecureCheck Police Post Logs")
 
@@ -278,54 +318,78 @@ st.title("🚓 SecureCheck: Police Post Logs Dashboard")
 st.markdown("---")
 
 st.sidebar.header("Navigation")
-page = st.sidebar.radio("Go to", ["Dashboard Overview", "Search Logs", "Analytics & Reports", "Flagged Vehicles", "Automated SQL Queries"])
+page = st.sidebar.radio("Go to", ["Dashboard Overview", "Search Logs", "Analytics & Reports", "Flagged Vehicles", "Vehicle Lookup", "Automated SQL Queries", "Performance"])
+# Every database call from here on is attributed to this page.
+instrumentation.set_caller(f"app:{page}")
 st.sidebar.markdown("---")
 st.sidebar.info("This dashboard provides real-time insights into police traffic stop data.")
 
+sync_result_cache()
+cache_stats = get_result_cache().stats()
+st.sidebar.caption(
+    f"Backend: {backend.BACKEND}. Result cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+    f"({cache_stats['hit_rate']:.0%}), {cache_stats['entries']} entries, "
+    f"{cache_stats['bytes'] / 1024 / 1024:.1f} of {cache_stats['max_bytes'] / 1024 / 1024:.0f} MB, "
+    f"{cache_stats['evictions']} evictions, data version {cache_stats['data_version']}"
+)
+
 if page == "Dashboard Overview":
     st.header("Dashboard Overview: Recent Activity")
-    recent_logs_query = f"SELECT * FROM {TRAFFIC_STOPS_TABLE} ORDER BY stop_date DESC, stop_time DESC LIMIT 20;"
-    recent_df = fetch_data(recent_logs_query)
-
-    if not recent_df.empty:
-        st.dataframe(recent_df, use_container_width=True)
-    else:
-        st.info("No recent traffic stop data available. Check database connection and data.")
+    recent_placeholder = st.empty()
+    recent_placeholder.info("Loading recent activity...")
 
     st.markdown("---")
 
     st.header("Key Statistics")
     col1, col2, col3 = st.columns(3)
-
-    total_stops_df = fetch_data(f"SELECT COUNT(*) FROM {TRAFFIC_STOPS_TABLE};")
-    total_stops = total_stops_df.iloc[0,0] if not total_stops_df.empty else 0
-    col1.metric("Total Stops Recorded", total_stops)
-
-    total_arrests_df = fetch_data(f"SELECT COUNT(*) FROM {TRAFFIC_STOPS_TABLE} WHERE is_arrested = TRUE;")
-    total_arrests = total_arrests_df.iloc[0,0] if not total_arrests_df.empty else 0
-    col2.metric("Total Arrests", total_arrests)
-
-    total_searches_df = fetch_data(f"SELECT COUNT(*) FROM {TRAFFIC_STOPS_TABLE} WHERE search_conducted = TRUE;")
-    total_searches = total_searches_df.iloc[0,0] if not total_searches_df.empty else 0
-    col3.metric("Total Searches Conducted", total_searches)
+    metric_placeholders = {
+        'total_stops': (col1.empty(), "Total Stops Recorded"),
+        'total_arrests': (col2.empty(), "Total Arrests"),
+        'total_searches': (col3.empty(), "Total Searches Conducted"),
+    }
+    for placeholder, label in metric_placeholders.values():
+        placeholder.metric(label, "…")
 
     st.markdown("---")
 
     st.header("Interactive Data Visualization")
-
-    violation_counts = fetch_data(f"SELECT violation, COUNT(*) as count FROM {TRAFFIC_STOPS_TABLE} WHERE violation != 'Unknown' GROUP BY violation ORDER BY count DESC;")
-    if not violation_counts.empty:
-        st.subheader("Stops by Violation Type")
-        st.bar_chart(violation_counts.set_index('violation'))
-    else:
-        st.info("No violation data to display. Check database data.")
-
-    country_counts = fetch_data(f"SELECT country_name, COUNT(*) as count FROM {TRAFFIC_STOPS_TABLE} WHERE country_name != 'Unknown' GROUP BY country_name ORDER BY count DESC;")
-    if not country_counts.empty:
-        st.subheader("Stops by Country")
-        st.bar_chart(country_counts.set_index('country_name'))
-    else:
-        st.info("No country data to display. Check database data.")
+    violation_placeholder = st.empty()
+    violation_placeholder.info("Loading violation chart...")
+    country_placeholder = st.empty()
+    country_placeholder.info("Loading country chart...")
+
+    use_rollup = rollup_is_current(get_result_cache().data_version)
+    panel_queries = {
+        name: overview_query(name, use_rollup)
+        for name in ("recent_stops", "key_statistics", "violation_counts", "country_counts")
+    }
+
+    for name, df, error in fetch_concurrently(panel_queries):
+        if error is not None:
+            st.error(f"Error fetching data with query: {panel_queries[name]}. Reason: {error}")
+
+        if name == "recent_stops":
+            if not df.empty:
+                recent_placeholder.dataframe(df, use_container_width=True)
+            else:
+                recent_placeholder.info("No recent traffic stop data available. Check database connection and data.")
+        elif name == "key_statistics":
+            for column, (placeholder, label) in metric_placeholders.items():
+                placeholder.metric(label, int(df.iloc[0][column]) if not df.empty else 0)
+        elif name == "violation_counts":
+            if not df.empty:
+                with violation_placeholder.container():
+                    st.subheader("Stops by Violation Type")
+                    st.bar_chart(df.set_index('violation'))
+            else:
+                violation_placeholder.info("No violation data to display. Check database data.")
+        elif name == "country_counts":
+            if not df.empty:
+                with country_placeholder.container():
+                    st.subheader("Stops by Country")
+                    st.bar_chart(df.set_index('country_name'))
+            else:
+                country_placeholder.info("No country data to display. Check database data.")
 
 
 elif page == "Search Logs":
@@ -350,56 +414,123 @@ elif page == "Search Logs":
 
     vehicle_number_search = st.text_input("Search by Vehicle Number (partial match)", "")
 
-    query_parts = [f"SELECT * FROM {TRAFFIC_STOPS_TABLE} WHERE 1=1"]
+    page_size = st.selectbox("Rows per page", SEARCH_PAGE_SIZES, index=SEARCH_PAGE_SIZES.index(100))
+
+    where_parts = ["WHERE 1=1"]
     params_list = []
 
     if selected_country != "All":
-        query_parts.append(f"AND country_name = %s")
+        where_parts.append(f"AND country_name = %s")
         params_list.append(selected_country)
     if selected_gender != "All":
-        query_parts.append(f"AND driver_gender = %s")
+        where_parts.append(f"AND driver_gender = %s")
         params_list.append(selected_gender)
     if selected_violation != "All":
-        query_parts.append(f"AND violation = %s")
+        where_parts.append(f"AND violation = %s")
         params_list.append(selected_violation)
     if search_conducted_filter:
-        query_parts.append("AND search_conducted = TRUE")
+        where_parts.append("AND search_conducted = TRUE")
     if is_arrested_filter:
-        query_parts.append("AND is_arrested = TRUE")
+        where_parts.append("AND is_arrested = TRUE")
     
-    query_parts.append(f"AND driver_age BETWEEN %s AND %s")
+    where_parts.append(f"AND driver_age BETWEEN %s AND %s")
     params_list.append(min_age)
     params_list.append(max_age)
 
     if vehicle_number_search:
-        query_parts.append(f"AND vehicle_number LIKE %s")
-        params_list.append(f"%{vehicle_number_search}%")
+        plates = matching_plates(vehicle_number_search, get_result_cache().data_version)
+        if plates is None:
+            where_parts.append(f"AND vehicle_number LIKE %s")
+            params_list.append(f"%{vehicle_number_search}%")
+        elif plates:
+            where_parts.append(f"AND vehicle_number IN ({', '.join(['%s'] * len(plates))})")
+            params_list.extend(plates)
+        else:
+            where_parts.append("AND 1=0")
 
-    search_query = " ".join(query_parts) + f" ORDER BY stop_date DESC, stop_time DESC LIMIT 1000;"
+    where_clause = " ".join(where_parts)
 
+    # Any change to the filters or page size starts again from the first page.
+    search_key = (where_clause, tuple(params_list), page_size)
     if st.button("Apply Filters and Search"):
+        st.session_state.search_key = search_key
+        st.session_state.search_cursors = []
+    elif st.session_state.get('search_key') not in (None, search_key):
+        st.session_state.search_key = None
+
+    if st.session_state.get('search_key') == search_key:
         st.markdown("---")
         st.subheader("Search Results")
-        search_results_df = fetch_data(search_query, params_list)
+
+        # Each page starts after the last row of the previous one, so page
+        # 10,000 costs the same index range scan as page 1; no OFFSET.
+        cursors = st.session_state.search_cursors
+        page_where, page_params = where_clause, list(params_list)
+        if cursors:
+            cursor_sql, cursor_params = keyset_predicate(cursors[-1])
+            page_where += " " + cursor_sql
+            page_params += cursor_params
+        search_query = (
+            f"SELECT {', '.join(SEARCH_COLUMNS)} FROM {TRAFFIC_STOPS_TABLE} {page_where} "
+            f"ORDER BY stop_date DESC, stop_time DESC, stop_id DESC LIMIT {page_size + 1};"
+        )
+        search_results_df = fetch_data(search_query, page_params)
+
+        # Counting stops at SEARCH_COUNT_CAP so broad filters stay cheap; the
+        # result is cached until the data version changes.
+        count_df = fetch_data(
+            f"SELECT COUNT(*) FROM (SELECT 1 FROM {TRAFFIC_STOPS_TABLE} {where_clause} LIMIT {SEARCH_COUNT_CAP + 1}) matches;",
+            params_list,
+        )
+        match_count = int(count_df.iloc[0, 0]) if not count_df.empty else 0
+        match_label = f"more than {SEARCH_COUNT_CAP:,}" if match_count > SEARCH_COUNT_CAP else f"{match_count:,}"
+
+        has_next = len(search_results_df) > page_size
+        search_results_df = search_results_df.head(page_size)
         if not search_results_df.empty:
+            st.session_state.search_next_cursor = row_cursor(search_results_df.iloc[-1])
             st.dataframe(search_results_df, use_container_width=True)
-            st.success(f"Found {len(search_results_df)} matching records.")
+            first_row = len(cursors) * page_size + 1
+            st.success(
+                f"Showing records {first_row:,}-{first_row + len(search_results_df) - 1:,} "
+                f"of {match_label} matching records."
+            )
         else:
             st.info("No records found matching your criteria.")
 
+        prev_col, next_col = st.columns(2)
+        prev_col.button("◀ Previous page", on_click=previous_search_page, disabled=not cursors)
+        next_col.button("Next page ▶", on_click=next_search_page, disabled=not has_next)
+
 elif page == "Analytics & Reports":
     st.header("📈 Analytics & Reports")
     st.write("Explore various statistical reports and trends from the traffic stop data.")
 
     selected_query_name = st.selectbox("Select an Insightful Query", list(INSIGHTS.keys()))
-    query_to_run = INSIGHTS[selected_query_name]
-    
-    # Removed this line: st.code(query_to_run, language='sql')
+    query_to_run = insight_query(selected_query_name, rollup_is_current(get_result_cache().data_version))
+
+    bundle = latest_bundle()
+    source_options = ["Latest precomputed bundle", "Live query"] if bundle else ["Live query"]
+    report_source = st.radio("Report source:", source_options, horizontal=True)
+    if bundle and report_source == source_options[0]:
+        bundle_dir, manifest = bundle
+        st.caption(
+            f"Bundle {manifest['bundle_id']} generated {manifest['created_at']} "
+            f"from data version {manifest['data_version']}."
+        )
+        if manifest['data_version'] != get_result_cache().data_version:
+            st.warning("The data has changed since this bundle was generated; run a live query for current figures.")
 
     if st.button(f"Run {selected_query_name} Report"):
         st.markdown("---")
         st.subheader(f"Results for: {selected_query_name}")
-        report_df = fetch_data(query_to_run)
+        report_df = None
+        if bundle and report_source == source_options[0]:
+            report_df = bundle_report(bundle_dir, manifest, selected_query_name)
+            if report_df is None:
+                st.info("This report is missing from the bundle; running it live.")
+        if report_df is None:
+            report_df = fetch_data(query_to_run)
         if not report_df.empty:
             st.dataframe(report_df, use_container_width=True)
             if 'count' in report_df.columns:
@@ -422,40 +553,139 @@ elif page == "Analytics & Reports":
 elif page == "Flagged Vehicles":
     st.header("🚨 Flagged Vehicles for Review")
     st.write("Vehicles automatically flagged by the detection system for further review.")
-
-    status_filter = st.radio("Show Flags:", ["Active (Unresolved)", "Resolved", "All"])
-
-    query = f"SELECT * FROM {FLAGGED_VEHICLES_TABLE}"
-    params = []
-    if status_filter == "Active (Unresolved)":
-        query += " WHERE resolved = FALSE"
-    elif status_filter == "Resolved":
-        query += " WHERE resolved = TRUE"
-    query += " ORDER BY flag_timestamp DESC"
-
-    flagged_df = fetch_data(query, params)
+    if not flags_available():
+        st.warning("Flags are kept in MySQL only; the DuckDB stand-in has no flag tables or archive. "
+                   "Run the dashboard with SECURECHECK_BACKEND=mysql to review and resolve flags.")
+        st.stop()
+    if 'flag_notice' in st.session_state:
+        st.success(st.session_state.pop('flag_notice'))
+
+    status_filter = st.radio("Show Flags:", FLAG_STATUSES)
+    rule_col, plate_col, size_col = st.columns(3)
+    selected_rules = rule_col.multiselect("Rules", [rule['rule_id'] for rule in DETECTION_RULES])
+    plate_filter = plate_col.text_input("Vehicle Number (exact)")
+    page_size = size_col.selectbox("Flags per page", FLAG_PAGE_SIZES)
+    flag_table, flag_where, flag_params = flag_filter(status_filter, selected_rules, plate_filter)
+
+    # Any change to the filters or page size starts again from the first page.
+    flag_key = (flag_table, flag_where, tuple(sorted(flag_params.items())), page_size)
+    if st.session_state.get('flag_key') != flag_key:
+        st.session_state.flag_key = flag_key
+        st.session_state.flag_cursors = []
+
+    # Keyset pages on (flag_timestamp, flag_id), newest first; no OFFSET.
+    cursors = st.session_state.flag_cursors
+    page_where, page_params = flag_where, dict(flag_params)
+    if cursors:
+        page_where += (" AND (flag_timestamp < :cursor_timestamp"
+                       " OR (flag_timestamp = :cursor_timestamp AND flag_id < :cursor_flag_id))")
+        page_params['cursor_timestamp'], page_params['cursor_flag_id'] = cursors[-1]
+    status_columns = "resolved_at, archived_at" if flag_table == FLAG_ARCHIVE_TABLE else "resolved, resolved_at"
+    flagged_df = fetch_data(
+        f"SELECT flag_id, vehicle_number, rule_id, flag_reason, flag_timestamp, {status_columns} "
+        f"FROM {flag_table} WHERE {page_where} "
+        f"ORDER BY flag_timestamp DESC, flag_id DESC LIMIT {page_size + 1};",
+        page_params,
+    )
+    count_df = fetch_data(
+        f"SELECT COUNT(*) FROM (SELECT 1 FROM {flag_table} WHERE {flag_where} LIMIT {FLAG_COUNT_CAP + 1}) matches;",
+        flag_params,
+    )
+    match_count = int(count_df.iloc[0, 0]) if not count_df.empty else 0
+    match_label = f"more than {FLAG_COUNT_CAP:,}" if match_count > FLAG_COUNT_CAP else f"{match_count:,}"
+
+    has_next = len(flagged_df) > page_size
+    flagged_df = flagged_df.head(page_size)
+    can_resolve = flag_table == FLAGGED_VEHICLES_TABLE and status_filter != "Resolved"
 
     if not flagged_df.empty:
-        st.dataframe(flagged_df, use_container_width=True)
-
-        st.subheader("Resolve Flag")
-        flag_id_to_resolve = st.number_input("Enter Flag ID to Mark as Resolved", min_value=1, format="%d")
-        if st.button("Mark as Resolved"):
-            if flag_id_to_resolve:
-                update_query = f"""
-                UPDATE {FLAGGED_VEHICLES_TABLE}
-                SET resolved = TRUE
-                WHERE flag_id = %s;
-                """
-                execute_query(update_query, (flag_id_to_resolve,))
-                st.success(f"Flag ID {flag_id_to_resolve} marked as resolved.")
+        last_flag = flagged_df.iloc[-1]
+        st.session_state.flag_next_cursor = (
+            pd.Timestamp(last_flag['flag_timestamp']).to_pydatetime(), int(last_flag['flag_id'])
+        )
+        selected_ids = []
+        if can_resolve:
+            edited_df = st.data_editor(
+                flagged_df.assign(select=False),
+                column_order=['select'] + list(flagged_df.columns),
+                column_config={'select': st.column_config.CheckboxColumn("Resolve")},
+                disabled=list(flagged_df.columns),
+                hide_index=True,
+                use_container_width=True,
+                key=f"flag_editor_{len(cursors)}",
+            )
+            selected_ids = edited_df.loc[edited_df['select'] & ~edited_df['resolved'].astype(bool), 'flag_id'].tolist()
+        else:
+            st.dataframe(flagged_df, use_container_width=True)
+        first_row = len(cursors) * page_size + 1
+        st.caption(f"Showing flags {first_row:,}-{first_row + len(flagged_df) - 1:,} of {match_label}.")
+
+        prev_col, next_col = st.columns(2)
+        prev_col.button("◀ Previous page", on_click=previous_flag_page, disabled=not cursors)
+        next_col.button("Next page ▶", on_click=next_flag_page, disabled=not has_next)
+
+        if can_resolve:
+            st.subheader("Resolve Flags")
+            if st.button(f"Resolve {len(selected_ids)} selected", disabled=not selected_ids):
+                st.session_state.flag_notice = f"{resolve_flagged(flag_ids=selected_ids)} flags marked as resolved."
+                st.rerun()
+
+            ids_text = st.text_input("Flag IDs to resolve (separated by commas or spaces)")
+            if st.button("Resolve listed IDs"):
+                try:
+                    flag_ids = parse_flag_ids(ids_text)
+                except ValueError as e:
+                    st.warning(str(e))
+                else:
+                    if flag_ids:
+                        st.session_state.flag_notice = f"{resolve_flagged(flag_ids=flag_ids)} flags marked as resolved."
+                        st.rerun()
+                    else:
+                        st.warning("Please enter at least one Flag ID.")
+
+            confirm_all = st.checkbox(f"Resolve every active flag matching these filters ({match_label})")
+            if st.button("Resolve all matching", disabled=not confirm_all):
+                resolved = resolve_flagged(where=flag_where, params=flag_params)
+                st.session_state.flag_notice = f"{resolved} flags marked as resolved."
                 st.rerun()
-            else:
-                st.warning("Please enter a valid Flag ID.")
     else:
         st.info("No flagged vehicles to display based on the current filter.")
 
 
+elif page == "Vehicle Lookup":
+    st.header("🔎 Vehicle Lookup")
+    st.write("Everything on record for a vehicle number: stop history, recent speeding and active flags.")
+    plate = st.text_input("Vehicle Number (exact)")
+
+    if plate.strip():
+        start = time.perf_counter()
+        profile = lookup_vehicle(plate)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if profile is None:
+            st.info(f"No stops or flags on record for '{plate.strip()}'.")
+        else:
+            if not flags_available():
+                st.info("Flags are not available on the DuckDB stand-in; this profile shows stops only.")
+            elif profile['active_flags']:
+                st.error(f"🚨 {profile['active_flags']} active flag(s): {', '.join(profile['flag_rules'])} "
+                         f"(last flagged {profile['last_flagged_at']}). See Flagged Vehicles for details.")
+            else:
+                st.success("No active flags for this vehicle.")
+
+            counts = [("Total Stops", 'stops'), ("Searches", 'searches'), ("Arrests", 'arrests'),
+                      ("Drug-Related Stops", 'drug_stops'), ("Speeding Stops", 'speeding_stops')]
+            for column, (label, name) in zip(st.columns(len(counts)), counts):
+                column.metric(label, f"{profile[name]:,}")
+            st.write(f"**First seen:** {profile['first_seen'] or 'n/a'} · "
+                     f"**Last seen:** {profile['last_seen_at'] or 'n/a'} in {profile['last_country'] or 'n/a'}")
+
+            if profile['recent_speeding']:
+                st.subheader("Recent Speeding Stops")
+                st.dataframe(pd.DataFrame({'Stop time': profile['recent_speeding']}), hide_index=True)
+        profile_stats = get_profile_cache().stats()
+        st.caption(f"Looked up in {elapsed_ms:.1f} ms. Profile cache: {profile_stats['hits']} hits / "
+                   f"{profile_stats['misses']} misses, {profile_stats['entries']} entries.")
+
 elif page == "Automated SQL Queries":
     st.header("🤖 Automated SQL Query Executor")
     st.write("This section allows you to run custom SQL queries directly against the database.")
@@ -463,16 +693,93 @@ elif page == "Automated SQL Queries":
 
     custom_query = st.text_area("Enter your custom SQL SELECT query:", height=150, value=f"SELECT * FROM {TRAFFIC_STOPS_TABLE} LIMIT 10;")
 
-    if st.button("Execute Custom Query"):
-        if custom_query.strip().upper().startswith("SELECT"):
-            try:
-                custom_df = fetch_data(custom_query)
-                if not custom_df.empty:
-                    st.success("Query executed successfully!")
-                    st.dataframe(custom_df, use_container_width=True)
-                else:
-                    st.info("Query returned no results.")
-            except Exception as e:
-                st.error(f"Error executing query: {e}")
-        else:
-            st.error("Only SELECT queries are allowed for direct execution here.")
+    output = st.radio("Output", list(SQL_OUTPUTS), horizontal=True)
+    st.caption(f"Queries are checked with EXPLAIN first, limited to {DEFAULT_ROW_CAP:,} rows "
+               f"({EXPORT_ROW_CAP:,} for exports) and {query_governor.STATEMENT_TIMEOUT_SECONDS}s, "
+               f"and each user can run {query_governor.MAX_QUERIES_PER_USER} at a time.")
+
+    run_col, cancel_col = st.columns(2)
+    run_clicked = run_col.button("Execute Custom Query")
+    if cancel_col.button("Cancel Running Query"):
+        # Clicking already stops this session's running script, and with it
+        # the statement; this also cancels ones left running in other tabs.
+        query_governor.cancel_user_queries(current_user(), get_db_connection())
+        st.info("Running custom queries were cancelled.")
+
+    if run_clicked:
+        fmt = SQL_OUTPUTS[output]
+        try:
+            plan = query_governor.review(custom_query, DEFAULT_ROW_CAP if fmt is None else EXPORT_ROW_CAP,
+                                         get_db_connection())
+            for warning in plan['warnings']:
+                st.warning(warning)
+            if fmt is None:
+                stream_custom_query(plan['query'])
+            else:
+                export_custom_query(plan['query'], fmt)
+        except (QueryRejected, TimeoutError) as e:
+            st.error(str(e))
+        except Exception as e:
+            st.error(f"Error executing query: {e}")
+
+elif page == "Performance":
+    st.header("⏱️ Query Performance")
+    snapshot = instrumentation.METRICS.snapshot()
+    st.write(f"Every database call made by this dashboard process since {snapshot['started_at']}, "
+             "grouped by calling page and statement shape (literals and parameters replaced by ?).")
+
+    if not snapshot['queries']:
+        st.info("No queries recorded yet. Visit the other pages first.")
+    else:
+        metrics_df = pd.DataFrame(snapshot['queries'])
+        callers = sorted(metrics_df['caller'].unique())
+        selected_callers = st.multiselect("Caller", callers, default=callers)
+        metrics_df = metrics_df[metrics_df['caller'].isin(selected_callers)]
+
+        lookups = metrics_df['cache_hits'] + metrics_df['cache_misses']
+        metrics_df['cache_hit_rate'] = (metrics_df['cache_hits'] / lookups.where(lookups > 0)).round(2)
+        for column in ('seconds', 'mean_seconds', 'p50_seconds', 'p95_seconds', 'max_seconds'):
+            metrics_df[column.replace('seconds', 'ms')] = (metrics_df[column] * 1000).round(1)
+        metrics_df['total_s'] = metrics_df['seconds'].round(3)
+        metrics_df['mb'] = (metrics_df['bytes'] / 1024 / 1024).round(2)
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Database Calls", int(metrics_df['calls'].sum()))
+        col2.metric("Time in Database", f"{metrics_df['seconds'].sum():.2f}s")
+        col3.metric("Errors", int(metrics_df['errors'].sum()))
+
+        st.subheader("Statements by Total Time")
+        st.dataframe(metrics_df[[
+            'caller', 'calls', 'errors', 'total_s', 'mean_ms', 'p50_ms', 'p95_ms', 'max_ms',
+            'rows', 'mb', 'cache_hits', 'cache_misses', 'cache_hit_rate', 'query_id', 'query'
+        ]], use_container_width=True)
+
+        st.subheader("Latency Histogram")
+        selected_id = st.selectbox(
+            "Statement", metrics_df['query_id'].unique(),
+            format_func=lambda value: f"{value}: {metrics_df.loc[metrics_df['query_id'] == value, 'query'].iloc[0][:120]}",
+        )
+        buckets = [sum(values) for values in zip(*metrics_df.loc[metrics_df['query_id'] == selected_id, 'buckets'])]
+        bounds = [f"≤{bound * 1000:g} ms" for bound in snapshot['bucket_bounds']] + [f">{snapshot['bucket_bounds'][-1]:g} s"]
+        st.bar_chart(pd.DataFrame({'calls': buckets}, index=pd.CategoricalIndex(bounds, categories=bounds, ordered=True)))
+
+    st.subheader(f"Slow Queries (over {snapshot['slow_query_seconds']:g}s)")
+    if snapshot['slow_queries']:
+        st.dataframe(pd.DataFrame(snapshot['slow_queries'][::-1]), use_container_width=True)
+    else:
+        st.info("No slow queries recorded.")
+
+    st.subheader("Export")
+    dump_format = st.radio("Format", list(METRICS_DUMP_FILES), horizontal=True)
+    dump_body = (
+        instrumentation.prometheus_text(snapshot) if dump_format == "Prometheus text"
+        else json.dumps(snapshot, indent=2)
+    )
+    export_col, reset_col = st.columns(2)
+    export_col.download_button("Download Metrics", dump_body, file_name=METRICS_DUMP_FILES[dump_format])
+    if export_col.button("Write Metrics File"):
+        path = instrumentation.write_dump(METRICS_DUMP_FILES[dump_format])
+        export_col.success(f"Metrics written to {path}.")
+    if reset_col.button("Reset Metrics"):
+        instrumentation.METRICS.reset()
+        st.rerun()
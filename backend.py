@@ -0,0 +1,225 @@
+import os
+import re
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from sqlalchemy import create_engine, text
+
+from index_advisor import attach_workload_recorder
+from instrumentation import METRICS, attach_instrumentation
+
+MYSQL_USER = "root"
+MYSQL_PASSWORD = "venkat"
+MYSQL_HOST = "localhost"
+MYSQL_DATABASE = "cdta_db"
+MYSQL_POOL_SIZE = 8
+STREAM_BATCH_ROWS = 50000
+STREAM_BATCH_MAX_BYTES = 32 * 1024 * 1024
+EXPORT_FORMATS = ("parquet", "csv")
+
+# 'mysql' is the server the loaders and detector write to. 'duckdb' is an
+# embedded columnar copy built from the cleaned Parquet snapshot
+# (data_processor.py --mode duckdb); the dashboard and report batch can read
+# from it with no database server running.
+BACKENDS = ("mysql", "duckdb")
+BACKEND = os.environ.get("SECURECHECK_BACKEND", "mysql")
+DUCKDB_PATH = os.environ.get("SECURECHECK_DUCKDB", "securecheck.duckdb")
+
+_engines = {}
+
+def mysql_url(database=MYSQL_DATABASE):
+    url = f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}"
+    return f"{url}/{database}" if database else url
+
+def server_engine():
+    # No default database, for CREATE DATABASE; the caller disposes of it.
+    return attach_instrumentation(create_engine(mysql_url(None)))
+
+def get_engine(backend=None):
+    # One pooled engine per backend and process.
+    backend = backend or BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}'; expected one of {', '.join(BACKENDS)}.")
+    if backend not in _engines:
+        if backend == "mysql":
+            engine = create_engine(mysql_url(), pool_size=MYSQL_POOL_SIZE, pool_pre_ping=True)
+        else:
+            # Read-only so the dashboard and a report batch can share the file.
+            engine = create_engine(f"duckdb:///{DUCKDB_PATH}", connect_args={'read_only': True})
+        _engines[backend] = attach_instrumentation(attach_workload_recorder(engine))
+    return _engines[backend]
+
+def translate(query, params, dialect):
+    # Every MySQL-ism the shared queries use, rewritten for the embedded
+    # engine. Queries are written for MySQL and pass through unchanged there.
+    if dialect != "duckdb":
+        return query, params
+    query = re.sub(r"\bAS\s+SIGNED\b", "AS BIGINT", query, flags=re.IGNORECASE)
+    query = re.sub(r"\bAS\s+UNSIGNED\b", "AS UBIGINT", query, flags=re.IGNORECASE)
+    query = re.sub(r"\bINSERT\s+IGNORE\b", "INSERT OR IGNORE", query, flags=re.IGNORECASE)
+    query = re.sub(
+        r"DATE_SUB\(\s*([^,]+?)\s*,\s*INTERVAL\s+([^)]+?)\s+DAY\s*\)",
+        r"(\1 - INTERVAL (\2) DAY)", query, flags=re.IGNORECASE,
+    )
+    if isinstance(params, (list, tuple)) and params:
+        query = query.replace("%s", "?").replace("%%", "%")
+    elif isinstance(params, dict):
+        query = re.sub(r"%\((\w+)\)s", r"$\1", query)
+    return query, params
+
+def read_frame(connection, query, params=None):
+    # Positional parameters use the driver's own placeholders (%s for MySQL);
+    # named ones use :name.
+    query, params = translate(str(query), params, connection.dialect.name)
+    if isinstance(params, dict):
+        return pd.read_sql(text(query), connection, params=params)
+    if params is not None:
+        params = tuple(params)
+    return pd.read_sql(query, connection, params=params)
+
+def run(connection, query, params=None):
+    query, params = translate(str(query), params, connection.dialect.name)
+    if isinstance(params, (list, tuple)):
+        return connection.exec_driver_sql(query, tuple(params))
+    return connection.execute(text(query), params)
+
+def fetch_data(query, params=None, backend=None):
+    with get_engine(backend).connect() as connection:
+        return read_frame(connection, query, params)
+
+def execute_query(query, params=None, backend=None):
+    with get_engine(backend).connect() as connection:
+        run(connection, query, params)
+        connection.commit()
+
+def mysql_arrow_type(type_code):
+    # Column types from the cursor description, so every batch of a stream
+    # shares one schema even when a batch holds only NULLs in some column.
+    # Types missing here (DECIMAL, BIT, ...) are inferred from the values.
+    from pymysql.constants import FIELD_TYPE
+    return {
+        FIELD_TYPE.TINY: pa.int8(),
+        FIELD_TYPE.SHORT: pa.int16(),
+        FIELD_TYPE.INT24: pa.int32(),
+        FIELD_TYPE.LONG: pa.int64(),
+        FIELD_TYPE.LONGLONG: pa.int64(),
+        FIELD_TYPE.YEAR: pa.int16(),
+        FIELD_TYPE.FLOAT: pa.float32(),
+        FIELD_TYPE.DOUBLE: pa.float64(),
+        FIELD_TYPE.DATE: pa.date32(),
+        FIELD_TYPE.DATETIME: pa.timestamp("us"),
+        FIELD_TYPE.TIMESTAMP: pa.timestamp("us"),
+        FIELD_TYPE.TIME: pa.duration("us"),
+        FIELD_TYPE.ENUM: pa.string(),
+        FIELD_TYPE.STRING: pa.string(),
+        FIELD_TYPE.VAR_STRING: pa.string(),
+        FIELD_TYPE.VARCHAR: pa.string(),
+    }.get(type_code)
+
+def column_array(values, arrow_type):
+    if arrow_type is not None:
+        try:
+            return pa.array(values, type=arrow_type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            # e.g. BIGINT UNSIGNED values past the int64 range.
+            pass
+    return pa.array(values)
+
+def cursor_batches(connection, query, params, batch_rows, max_batch_bytes):
+    # stream_results gives pymysql's unbuffered SSCursor: rows are read off
+    # the socket as they are fetched instead of all at once by execute().
+    streaming = connection.execution_options(stream_results=True, max_row_buffer=batch_rows)
+    result = run(streaming, query, params)
+    names = list(result.keys())
+    types = [mysql_arrow_type(column[1]) for column in result.cursor.description]
+    rows_per_batch = batch_rows
+    exhausted = False
+    try:
+        while True:
+            rows = result.fetchmany(rows_per_batch)
+            if not rows:
+                exhausted = True
+                break
+            arrays = [column_array(list(values), arrow_type) for values, arrow_type in zip(zip(*rows), types)]
+            del rows
+            batch = pa.RecordBatch.from_arrays(arrays, names=names)
+            # The first batch tells how wide a row is; wide rows get smaller
+            # batches so no single batch exceeds max_batch_bytes.
+            row_bytes = max(1, batch.nbytes // batch.num_rows)
+            rows_per_batch = max(1, min(batch_rows, max_batch_bytes // row_bytes))
+            yield batch
+    finally:
+        if not exhausted:
+            # Closing an unbuffered cursor early reads the rest of the result
+            # off the wire; dropping the connection abandons it instead.
+            connection.invalidate()
+
+def duckdb_batches(connection, query, params, batch_rows):
+    # DuckDB produces Arrow natively; the reader pulls one batch at a time.
+    # The statement runs on the pooled connection itself, so interrupting that
+    # connection (see query_governor) cancels it.
+    query, params = translate(str(query), params, "duckdb")
+    if isinstance(params, (list, tuple)):
+        params = tuple(params)
+    raw = connection.connection.dbapi_connection
+    # The raw connection bypasses SQLAlchemy's execute events, so the call is
+    # timed here for the query metrics.
+    started = time.perf_counter()
+    try:
+        raw.execute(query, params or ())
+    except Exception as e:
+        METRICS.record_call(query, time.perf_counter() - started, error=e)
+        raise
+    METRICS.record_call(query, time.perf_counter() - started)
+    # to_arrow_reader replaced fetch_record_batch in newer DuckDB releases.
+    reader = getattr(raw, "to_arrow_reader", None) or raw.fetch_record_batch
+    yield from reader(batch_rows)
+
+def stream_batches(connection, query, params=None, batch_rows=STREAM_BATCH_ROWS, max_batch_bytes=STREAM_BATCH_MAX_BYTES):
+    if connection.dialect.name == "duckdb":
+        return duckdb_batches(connection, query, params, batch_rows)
+    return cursor_batches(connection, query, params, batch_rows, max_batch_bytes)
+
+def iter_batches(query, params=None, batch_rows=STREAM_BATCH_ROWS, max_batch_bytes=STREAM_BATCH_MAX_BYTES, backend=None):
+    # Yields the result as typed pyarrow RecordBatches instead of one
+    # object-dtype DataFrame, so only one batch is held at a time. Stop
+    # iterating (or close the generator) to abandon the rest of the result.
+    with get_engine(backend).connect() as connection:
+        yield from stream_batches(connection, query, params, batch_rows, max_batch_bytes)
+
+def write_batches(batches, path, fmt="parquet"):
+    # Writes batches as they arrive; memory stays at one batch however large
+    # the result. Written under a temporary name, then renamed.
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{fmt}'; expected one of {', '.join(EXPORT_FORMATS)}.")
+    tmp_path = path + ".tmp"
+    writer = None
+    rows = 0
+    try:
+        for batch in batches:
+            if writer is None:
+                schema = batch.schema
+                writer = pq.ParquetWriter(tmp_path, schema) if fmt == "parquet" else pa_csv.CSVWriter(tmp_path, schema)
+            if batch.schema != schema:
+                batch = batch.cast(schema)
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if writer is None:
+        # No batches at all: an empty file still marks the export as done.
+        open(tmp_path, "w").close()
+    else:
+        writer.close()
+    os.replace(tmp_path, path)
+    return rows
+
+def export_query(query, path, fmt="parquet", params=None, backend=None):
+    return write_batches(iter_batches(query, params, backend=backend), path, fmt)
@@ -0,0 +1,358 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import duckdb
+import pandas as pd
+from sqlalchemy import create_engine
+
+from backend import read_frame, stream_batches
+from data_processor import TABLE_NAME, csv_source_position, export_duckdb, iter_csv_chunks, snapshot_path
+from detector import (
+    DRIVER_AGGREGATES_TABLE, active_rules, full_aggregates_query, full_candidates_query, rule_params
+)
+from insights import INSIGHTS, OVERVIEW_QUERIES
+from partitions import windowed_queries
+from report_batch import report_slug
+from stream_detector import evaluate_stop, new_state, stream_rules
+from synthetic_data import DEFAULT_ROWS, generate_csv
+from vehicle_profiles import lookup_profile, sample_plates
+
+BENCHMARK_CSV = "synthetic_stops.csv"
+BENCHMARK_DB = "benchmark.duckdb"
+RESULTS_DIR = "benchmark_results"
+PHASES = ("ingest", "detector", "insights", "overview", "search", "partitions", "profiles")
+DEFAULT_REPEATS = 5
+REGRESSION_THRESHOLD = 0.10
+# Only changes above this many milliseconds count as regressions; smaller
+# timings are mostly noise.
+MIN_REGRESSION_MS = 5.0
+OVERVIEW_WORKERS = 4
+STREAM_DETECTOR_STOPS = 1000000
+NEW_STOP_SHARE = 0.01
+SEARCH_PAGE_SIZE = 50
+SEARCH_DEEP_PAGES = 20
+SEARCH_COUNT_CAP = 100000
+PROFILE_LOOKUPS = 50
+SEARCH_COLUMNS = (
+    "stop_id, stop_date, stop_time, country_name, driver_gender, driver_age, driver_race, violation, "
+    "search_conducted, search_type, stop_outcome, is_arrested, stop_duration, drugs_related_stop, vehicle_number"
+)
+
+def timed(fn, repeats):
+    # One untimed warm-up run, then repeats timed runs.
+    fn()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'median_ms': timings[len(timings) // 2],
+        'p95_ms': timings[min(len(timings) - 1, int(0.95 * len(timings)))],
+        'min_ms': timings[0],
+    }
+
+def metric(results, name, value, unit, better):
+    results[name] = {'value': round(value, 3), 'unit': unit, 'better': better}
+    print(f"  {name}: {value:,.1f} {unit}")
+
+def record_latency(results, name, timings):
+    metric(results, f"{name}.median_ms", timings['median_ms'], "ms", "lower")
+    # p95 over a handful of runs is too noisy to gate on; it is kept for reading.
+    results[f"{name}.p95_ms"] = {'value': round(timings['p95_ms'], 3), 'unit': "ms", 'better': None}
+
+def standin_engine(db_path):
+    return create_engine(f"duckdb:///{db_path}", connect_args={'read_only': True})
+
+def query_timer(engine, query, params=None):
+    def run():
+        with engine.connect() as connection:
+            read_frame(connection, query, params)
+    return run
+
+def bench_ingest(results, csv_path, db_path, rows):
+    # Parse + clean + snapshot is the CPU side of every load mode; the DuckDB
+    # build is the stand-in's bulk load. The cached snapshot is removed first
+    # so the CSV is really parsed.
+    snapshot_file = snapshot_path(csv_path)
+    if os.path.exists(snapshot_file):
+        os.remove(snapshot_file)
+    start = time.perf_counter()
+    cleaned = sum(len(chunk) for chunk in iter_csv_chunks(csv_path, snapshot_file=snapshot_file))
+    elapsed = time.perf_counter() - start
+    metric(results, "ingest.clean_rows_per_sec", cleaned / elapsed, "rows/s", "higher")
+
+    start = time.perf_counter()
+    export_duckdb(csv_path, db_path)
+    elapsed = time.perf_counter() - start
+    metric(results, "ingest.standin_load_rows_per_sec", rows / elapsed, "rows/s", "higher")
+
+def bench_detector(results, engine, repeats):
+    # The full-mode detector SQL, run read-only: the aggregate scan becomes a
+    # CTE under the temporary table's name, and each rule counts its
+    # candidates from it. The newest NEW_STOP_SHARE of stops play the part of
+    # the stops added since the last run.
+    rules = active_rules()
+    with engine.connect() as connection:
+        max_stop_id = int(read_frame(connection, f"SELECT COALESCE(MAX(stop_id), 0) AS max_stop_id FROM {TABLE_NAME}").iloc[0, 0])
+    params = rule_params(rules, int(max_stop_id * (1 - NEW_STOP_SHARE)), max_stop_id)
+    aggregates = f"WITH {DRIVER_AGGREGATES_TABLE} AS ({full_aggregates_query(rules)})"
+
+    record_latency(results, "detector.full_scan",
+                   timed(query_timer(engine, f"{aggregates} SELECT COUNT(*) FROM {DRIVER_AGGREGATES_TABLE}", params), repeats))
+    for rule in rules:
+        query = f"{aggregates} SELECT COUNT(*) AS hits FROM ({full_candidates_query(rule)}) AS hits"
+        record_latency(results, f"detector.rule.{rule['rule_id']}", timed(query_timer(engine, query, params), repeats))
+
+    # The streaming detector's in-memory rule evaluation over the first stops.
+    rules = stream_rules()
+    state = new_state()
+    now = datetime.now()
+    evaluated = 0
+    flags = 0
+    start = time.perf_counter()
+    with engine.connect() as connection:
+        query = f"SELECT * FROM {TABLE_NAME} ORDER BY stop_id LIMIT {STREAM_DETECTOR_STOPS}"
+        for batch in stream_batches(connection, query):
+            for stop in batch.to_pylist():
+                flags += len(evaluate_stop(state, rules, stop, now))
+            evaluated += batch.num_rows
+    elapsed = time.perf_counter() - start
+    metric(results, "detector.stream_stops_per_sec", evaluated / elapsed, "stops/s", "higher")
+    print(f"  ({flags:,} flags raised over {evaluated:,} stops)")
+
+def bench_insights(results, engine, repeats):
+    for name, query in INSIGHTS.items():
+        record_latency(results, f"insights.{report_slug(name)}", timed(query_timer(engine, query), repeats))
+
+def bench_overview(results, engine, repeats):
+    for name, query in OVERVIEW_QUERIES.items():
+        record_latency(results, f"overview.{name}", timed(query_timer(engine, query), repeats))
+
+    # The page as the dashboard draws it: every panel at once on the pool.
+    def load_page():
+        with ThreadPoolExecutor(max_workers=OVERVIEW_WORKERS) as executor:
+            list(executor.map(lambda query: query_timer(engine, query)(), OVERVIEW_QUERIES.values()))
+    record_latency(results, "overview.page", timed(load_page, repeats))
+
+def search_page_query(where="", cursor=None):
+    # The Search Logs keyset query: newest first, one page past the cursor.
+    params = []
+    if cursor is not None:
+        where += " AND (stop_date, stop_time, stop_id) < (%s, %s, %s)"
+        params += list(cursor)
+    return f"""
+        SELECT {SEARCH_COLUMNS} FROM {TABLE_NAME}
+        WHERE 1=1 {where}
+        ORDER BY stop_date DESC, stop_time DESC, stop_id DESC
+        LIMIT {SEARCH_PAGE_SIZE + 1}
+    """, params
+
+def bench_search(results, engine, repeats):
+    with engine.connect() as connection:
+        cursor = None
+        for _ in range(SEARCH_DEEP_PAGES):
+            query, params = search_page_query(cursor=cursor)
+            last = read_frame(connection, query, params).iloc[SEARCH_PAGE_SIZE - 1]
+            cursor = (last['stop_date'], last['stop_time'], int(last['stop_id']))
+        plate = read_frame(connection, f"""
+            SELECT vehicle_number FROM {TABLE_NAME} WHERE vehicle_number != 'Unknown'
+            GROUP BY vehicle_number ORDER BY COUNT(*) DESC LIMIT 1
+        """).iloc[0, 0]
+
+    searches = {
+        'first_page': search_page_query(),
+        'deep_page': search_page_query(cursor=cursor),
+        'filtered_page': search_page_query(" AND violation = %s AND country_name = %s"),
+        'exact_plate': search_page_query(" AND vehicle_number = %s"),
+        'partial_plate': search_page_query(" AND vehicle_number LIKE %s"),
+        'capped_count': (f"SELECT COUNT(*) FROM (SELECT 1 FROM {TABLE_NAME} WHERE violation = %s "
+                         f"LIMIT {SEARCH_COUNT_CAP + 1}) AS capped", []),
+    }
+    search_params = {
+        'filtered_page': ['Speeding', 'USA'],
+        'exact_plate': [plate],
+        'partial_plate': [f"%{plate[2:6]}%"],
+        'capped_count': ['Speeding'],
+    }
+    for name, (query, params) in searches.items():
+        params = search_params.get(name, params) or None
+        record_latency(results, f"search.{name}", timed(query_timer(engine, query, params), repeats))
+
+def flat_db_path(db_path):
+    root, ext = os.path.splitext(db_path)
+    return f"{root}_flat{ext}"
+
+def bench_partitions(results, engine, csv_path, db_path, repeats):
+    # Windowed queries on the per-period tables against the same rows in one
+    # table, the layout before partitioning. The flat copy is rebuilt whenever
+    # the stand-in is newer.
+    flat_path = flat_db_path(db_path)
+    if not os.path.exists(flat_path) or os.path.getmtime(flat_path) < os.path.getmtime(db_path):
+        export_duckdb(csv_path, flat_path, period=None)
+    flat_engine = standin_engine(flat_path)
+    with engine.connect() as connection:
+        last_day = read_frame(connection, f"SELECT MAX(stop_date) AS last_day FROM {TABLE_NAME}").iloc[0, 0]
+    for name, query in windowed_queries(pd.Timestamp(last_day).date()).items():
+        flat = timed(query_timer(flat_engine, query), repeats)
+        partitioned = timed(query_timer(engine, query), repeats)
+        record_latency(results, f"partitions.{name}.flat", flat)
+        record_latency(results, f"partitions.{name}.partitioned", partitioned)
+        metric(results, f"partitions.{name}.speedup", flat['median_ms'] / max(partitioned['median_ms'], 1e-9), "x", "higher")
+    flat_engine.dispose()
+
+def bench_profiles(results, engine, repeats):
+    # The profile's primary-key read against answering the same question from
+    # the vehicle's stops, as the Search Logs page had to.
+    with engine.connect() as connection:
+        plates = sample_plates(connection, PROFILE_LOOKUPS)
+    scan_query = f"""
+        SELECT COUNT(*) AS stops,
+               SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END) AS searches,
+               SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) AS arrests,
+               SUM(CASE WHEN drugs_related_stop = TRUE THEN 1 ELSE 0 END) AS drug_stops,
+               MAX(stop_date) AS last_seen
+        FROM {TABLE_NAME} WHERE vehicle_number = %s
+    """
+
+    def lookups():
+        with engine.connect() as connection:
+            for plate in plates:
+                lookup_profile(connection, plate)
+
+    def scans():
+        with engine.connect() as connection:
+            for plate in plates:
+                read_frame(connection, scan_query, [plate])
+
+    lookup = timed(lookups, repeats)
+    scan = timed(scans, repeats)
+    for name, timings in (("lookup", lookup), ("stop_scan", scan)):
+        record_latency(results, f"profiles.{name}", {key: value / len(plates) for key, value in timings.items()})
+    metric(results, "profiles.speedup", scan['median_ms'] / max(lookup['median_ms'], 1e-9), "x", "higher")
+
+def run_metadata(args, rows):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'created_at': datetime.now().isoformat(timespec="seconds"),
+        'git_commit': commit or None,
+        'rows': rows,
+        'seed': args.seed,
+        'repeats': args.repeats,
+        'phases': args.phases,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'duckdb': duckdb.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+def prepare_csv(csv_path, rows, seed, regenerate=False):
+    # Reuses the synthetic CSV only if it holds the requested number of rows.
+    if not regenerate and os.path.exists(csv_path):
+        existing = csv_source_position(csv_path)[1]
+        if existing == rows:
+            return rows
+        print(f"NOTE: '{csv_path}' has {existing:,} rows, not {rows:,}; regenerating it.")
+    print(f"--- Generating {rows:,} synthetic stops ---")
+    generate_csv(csv_path, rows, seed)
+    return rows
+
+def run_benchmarks(args):
+    phases = args.phases.split(",")
+    unknown = set(phases) - set(PHASES)
+    if unknown:
+        raise SystemExit(f"Unknown phases: {', '.join(sorted(unknown))}")
+
+    rows = prepare_csv(args.csv, args.rows, args.seed, args.regenerate)
+    args.output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%dT%H%M%S}_{rows}.json")
+    if "ingest" not in phases and not os.path.exists(args.db):
+        export_duckdb(args.csv, args.db)
+
+    results = {}
+    engine = None
+    for phase in phases:
+        print(f"--- {phase} ---")
+        if phase == "ingest":
+            bench_ingest(results, args.csv, args.db, rows)
+            continue
+        engine = engine or standin_engine(args.db)
+        if phase == "partitions":
+            bench_partitions(results, engine, args.csv, args.db, args.repeats)
+            continue
+        {
+            'detector': bench_detector,
+            'insights': bench_insights,
+            'overview': bench_overview,
+            'search': bench_search,
+            'profiles': bench_profiles,
+        }[phase](results, engine, args.repeats)
+
+    report = {'meta': run_metadata(args, rows), 'metrics': results}
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as results_file:
+        json.dump(report, results_file, indent=2)
+    print(f"SUCCESS: {len(results)} metrics written to '{args.output}'.")
+    return report
+
+def compare_results(base_path, new_path, threshold=REGRESSION_THRESHOLD):
+    # Returns the names of metrics that got worse by more than threshold.
+    with open(base_path) as base_file:
+        base = json.load(base_file)
+    with open(new_path) as new_file:
+        new = json.load(new_file)
+    if base['meta']['rows'] != new['meta']['rows']:
+        print(f"WARNING: comparing runs over different row counts ({base['meta']['rows']:,} vs {new['meta']['rows']:,}).")
+
+    regressions = []
+    print(f"{'metric':<60} {'base':>12} {'new':>12} {'change':>8}")
+    for name in sorted(set(base['metrics']) & set(new['metrics'])):
+        old_value, new_value = base['metrics'][name]['value'], new['metrics'][name]['value']
+        better = new['metrics'][name]['better']
+        if better is None:
+            continue
+        change = (new_value - old_value) / old_value if old_value else 0.0
+        worse = change > threshold if better == "lower" else change < -threshold
+        if worse and new['metrics'][name]['unit'] == "ms" and new_value - old_value < MIN_REGRESSION_MS:
+            worse = False
+        if worse:
+            regressions.append(name)
+        marker = "REGRESSION" if worse else ("improved" if (change < -threshold if better == "lower" else change > threshold) else "")
+        print(f"{name:<60} {old_value:>12,.1f} {new_value:>12,.1f} {change:>+8.1%} {marker}")
+    for name in sorted(set(base['metrics']) ^ set(new['metrics'])):
+        print(f"{name:<60} only in {'base' if name in base['metrics'] else 'new'} run")
+    print(f"{len(regressions)} regressions over {threshold:.0%}.")
+    return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="End-to-end benchmarks on synthetic data and a local DuckDB stand-in.")
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS, help="Synthetic stops to generate.")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the synthetic data.")
+    parser.add_argument("--csv", default=BENCHMARK_CSV, help="Synthetic CSV (generated when missing).")
+    parser.add_argument("--regenerate", action="store_true", help="Regenerate the CSV even if it exists.")
+    parser.add_argument("--db", default=BENCHMARK_DB, help="DuckDB stand-in database.")
+    parser.add_argument("--phases", default=",".join(PHASES), help="Comma-separated phases to run.")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="Timed runs per query.")
+    parser.add_argument("--output", help=f"Results file (default {RESULTS_DIR}/<timestamp>_<rows>.json).")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"),
+                        help="Compare two results files instead of running; exits 1 on regressions.")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Relative change that counts as a regression.")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.compare:
+        sys.exit(1 if compare_results(*args.compare, args.threshold) else 0)
+    run_benchmarks(args)
@@ -1,20 +1,107 @@
+import argparse
+import atexit
+import hashlib
+import io
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine, text
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import func, insert, text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 
-MYSQL_USER = "root"
-MYSQL_PASSWORD = "venkat"
-MYSQL_HOST = "localhost"
-MYSQL_DATABASE = "cdta_db"
+from backend import DUCKDB_PATH, MYSQL_DATABASE, MYSQL_HOST, get_engine, server_engine
+from insights import INSIGHTS
+from instrumentation import print_summary
+from partitions import STANDIN_PARTITION_PERIOD, extend_partitions, partition_clause, split_duckdb_periods
+from query_cache import bump_data_version, bump_standin_data_version
+from vehicle_profiles import PROFILE_TABLE, build_standin_profiles, rebuild_profiles, refresh_profiles
+from vehicle_search import TRIGRAM_TABLE, rebuild_trigrams, refresh_trigrams
 
 TABLE_NAME = "traffic_stops"
+STAGING_TABLE_NAME = f"{TABLE_NAME}_staging"
+WATERMARK_TABLE_NAME = "ingest_watermarks"
+ROLLUP_TABLE_NAME = f"{TABLE_NAME}_rollup"
+ROLLUP_STAGING_TABLE_NAME = f"{ROLLUP_TABLE_NAME}_staging"
+LEGACY_TABLE_NAME = f"{TABLE_NAME}_legacy"
+
+CSV_PATH = "traffic_stops.csv"
+SNAPSHOT_DIR = "snapshots"
+# Bumped whenever the snapshot layout changes, so older snapshots are ignored.
+SNAPSHOT_FORMAT = 2
+# An incremental load starts where the last load stopped reading the CSV, if
+# the SOURCE_DIGEST_BYTES at the start of the file and before that point are
+# unchanged.
+SOURCE_DIGEST_BYTES = 1 << 20
+INGEST_CHUNK_SIZE = 50000
+INSERT_BATCH_SIZE = 1000
+# Parallel mode: chunks being cleaned per worker process, chunks queued per
+# insert connection, and the block size of the scan for record boundaries.
+PARSE_TASKS_PER_WORKER = 2
+PARALLEL_INSERTERS = 4
+INSERT_QUEUE_PER_INSERTER = 2
+INSERT_RETRIES = 3
+SCAN_BLOCK_BYTES = 8 * 1024 * 1024
+# Bytes read_csv treats as blank: a line of only these is skipped.
+WHITESPACE_BYTES = [9, 10, 13, 32]
+CONTENT_BYTES = np.ones(256, dtype=bool)
+CONTENT_BYTES[WHITESPACE_BYTES] = False
+
+TABLE_COLUMNS = [
+    'stop_date', 'stop_time', 'country_name', 'driver_gender', 'driver_age_raw',
+    'driver_age', 'driver_race', 'violation_raw', 'violation', 'search_conducted',
+    'search_type', 'stop_outcome', 'is_arrested', 'stop_duration',
+    'drugs_related_stop', 'vehicle_number'
+]
+
+LOW_CARDINALITY_COLUMNS = {
+    'country_name', 'driver_gender', 'driver_race', 'violation_raw',
+    'violation', 'search_type', 'stop_outcome', 'stop_duration'
+}
+
+# Dimension columns are stored as ENUMs once loaded (1 byte per value instead
+# of a VARCHAR); a column with more distinct values than this stays VARCHAR.
+DIMENSION_COLUMNS = [
+    'country_name', 'driver_gender', 'driver_race', 'violation_raw',
+    'violation', 'search_type', 'stop_outcome', 'stop_duration'
+]
+MAX_ENUM_VALUES = 255
+
+STOP_DURATION_MINUTES = {'0-15 Min': 7.5, '16-30 Min': 23, '30+ Min': 45}
+
+SECONDARY_INDEXES = {
+    'idx_stop_date': 'stop_date',
+    'idx_violation': 'violation',
+    'idx_vehicle_number': 'vehicle_number',
+    'idx_drugs_related_stop': 'drugs_related_stop',
+    'idx_driver_age': 'driver_age',
+    'idx_is_arrested': 'is_arrested',
+    'idx_country_name': 'country_name',
+    'idx_driver_gender': 'driver_gender',
+    'idx_driver_race': 'driver_race',
+    # Matches the Search Logs sort order so keyset pages are index range scans.
+    'idx_stop_recency': 'stop_date, stop_time, stop_id',
+}
 
-def clean_data(df):
-    df_cleaned = df.dropna(axis=1, how='all')
+def clean_data(df, drop_empty_columns=True):
+    # A single chunk can be all-NaN in a column the full file still fills, so
+    # streaming callers keep every column and let the table schema decide.
+    if drop_empty_columns:
+        df_cleaned = df.dropna(axis=1, how='all')
+    else:
+        df_cleaned = df
 
     if 'driver_age_raw' in df_cleaned.columns:
-        df_cleaned['driver_age_raw'] = df_cleaned['driver_age_raw'].fillna(-1).astype(int)
+        df_cleaned['driver_age_raw'] = df_cleaned['driver_age_raw'].fillna(-1).astype('int16')
     if 'driver_age' in df_cleaned.columns:
-        df_cleaned['driver_age'] = df_cleaned['driver_age'].fillna(-1).astype(int)
+        df_cleaned['driver_age'] = df_cleaned['driver_age'].fillna(-1).astype('int16')
 
     categorical_cols = [
         'country_name', 'driver_gender', 'driver_race',
@@ -24,6 +111,8 @@ def clean_data(df):
     for col in categorical_cols:
         if col in df_cleaned.columns:
             df_cleaned[col] = df_cleaned[col].fillna('Unknown')
+            if col in LOW_CARDINALITY_COLUMNS:
+                df_cleaned[col] = df_cleaned[col].astype('category')
 
     boolean_cols = ['search_conducted', 'is_arrested', 'drugs_related_stop']
     for col in boolean_cols:
@@ -34,91 +123,358 @@ def clean_data(df):
         df_cleaned['stop_date'] = pd.to_datetime(df_cleaned['stop_date'], errors='coerce')
         df_cleaned.dropna(subset=['stop_date'], inplace=True)
     if 'stop_time' in df_cleaned.columns:
-        df_cleaned['stop_time'] = df_cleaned['stop_time'].astype(str)
+        df_cleaned['stop_time'] = parse_stop_time(df_cleaned['stop_time'])
 
     return df_cleaned
 
-def create_and_populate_db(df):
-    print(f"--- Starting Database Population ---")
-    print(f"Attempting to connect to MySQL at {MYSQL_HOST} for database creation/check...")
-    db_connection_str = (
-        f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}"
+def parse_stop_time(values):
+    # The source writes times as "HH:MM"; to_timedelta needs the seconds part.
+    values = values.astype(str).str.strip()
+    values = values.where(values.str.count(':') != 1, values + ':00')
+    return pd.to_timedelta(values, errors='coerce')
+
+def format_stop_time(values):
+    seconds = values.dt.total_seconds()
+    formatted = (
+        (seconds // 3600).astype('Int64').astype(str).str.zfill(2) + ':'
+        + (seconds % 3600 // 60).astype('Int64').astype(str).str.zfill(2) + ':'
+        + (seconds % 60).astype('Int64').astype(str).str.zfill(2)
     )
-    temp_engine = create_engine(db_connection_str)
+    return formatted.astype(object).where(values.notna(), None)
+
+def to_sql_frame(df):
+    if 'stop_time' in df.columns and pd.api.types.is_timedelta64_dtype(df['stop_time']):
+        df = df.copy()
+        df['stop_time'] = format_stop_time(df['stop_time'])
+    return df
+
+def memory_per_row(df):
+    if df.empty:
+        return 0.0
+    return df.memory_usage(index=False, deep=True).sum() / len(df)
+
+def report_memory(csv_path=CSV_PATH, sample_rows=INGEST_CHUNK_SIZE):
+    raw_df = pd.read_csv(csv_path, nrows=sample_rows)
+    cleaned_df = clean_data(raw_df.copy(), drop_empty_columns=False)
+    raw_bytes = memory_per_row(raw_df)
+    cleaned_bytes = memory_per_row(cleaned_df)
+    print(f"MEMORY: parsed CSV {raw_bytes:,.0f} bytes/row, cleaned {cleaned_bytes:,.0f} bytes/row "
+          f"over {len(raw_df)} sample rows ({raw_bytes / max(cleaned_bytes, 1e-9):.1f}x smaller).")
+    for col, dtype in cleaned_df.dtypes.items():
+        col_bytes = cleaned_df[col].memory_usage(index=False, deep=True) / max(len(cleaned_df), 1)
+        print(f"    {col:<20} {str(dtype):<16} {col_bytes:,.1f} bytes/row")
+
+def legacy_table_query(table_name):
+    # The schema before derived columns and ENUM dimensions, kept only so
+    # schema-report can measure the difference.
+    index_definitions = ",\n".join(
+        f"        INDEX {name} ({columns})" for name, columns in SECONDARY_INDEXES.items()
+    )
+    return f"""
+    CREATE TABLE {table_name} (
+        stop_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        stop_date DATE,
+        stop_time VARCHAR(8),
+        country_name VARCHAR(255),
+        driver_gender VARCHAR(50),
+        driver_age_raw INT,
+        driver_age INT,
+        driver_race VARCHAR(50),
+        violation_raw VARCHAR(255),
+        violation VARCHAR(255),
+        search_conducted BOOLEAN,
+        search_type VARCHAR(255),
+        stop_outcome VARCHAR(50),
+        is_arrested BOOLEAN,
+        stop_duration VARCHAR(50),
+        drugs_related_stop BOOLEAN,
+        vehicle_number VARCHAR(255),
+        row_hash BIGINT UNSIGNED NOT NULL,
+        UNIQUE INDEX uq_row_hash (row_hash),
+{index_definitions}
+    );
+    """
+
+def legacy_query(query):
+    # Rewrites a report for the legacy table, deriving the columns per row the
+    # way the reports did before.
+    query = re.sub(rf"\b{TABLE_NAME}\b", LEGACY_TABLE_NAME, query)
+    derived = {
+        'stop_year': "YEAR(stop_date)",
+        'stop_month': "MONTH(stop_date)",
+        'stop_hour': "HOUR(stop_time)",
+        'duration_minutes': f"({duration_minutes_sql()})",
+    }
+    for column, expression in derived.items():
+        query = re.sub(rf"\b{column}\b", expression, query)
+    return query
+
+def table_size(connection, table_name):
+    connection.execute(text(f"ANALYZE TABLE {table_name};")).fetchall()
+    row = connection.execute(text("""
+        SELECT TABLE_ROWS, DATA_LENGTH, INDEX_LENGTH FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table_name;
+    """), {'table_name': table_name}).first()
+    return row.TABLE_ROWS or 0, row.DATA_LENGTH or 0, row.INDEX_LENGTH or 0
+
+def time_query(connection, query, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        connection.execute(text(query)).fetchall()
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2]
+
+def report_schema(repeats=3, keep_legacy=False):
+    # Copies traffic_stops into the legacy schema and compares storage and
+    # INSIGHTS latency between the two.
+    engine = get_db_connection()
+    with engine.connect() as connection:
+        legacy_columns = ", ".join(['stop_id'] + TABLE_COLUMNS + ['row_hash'])
+        connection.execute(text(f"DROP TABLE IF EXISTS {LEGACY_TABLE_NAME};"))
+        connection.execute(text(legacy_table_query(LEGACY_TABLE_NAME)))
+        connection.execute(text(
+            f"INSERT INTO {LEGACY_TABLE_NAME} ({legacy_columns}) SELECT {legacy_columns} FROM {TABLE_NAME};"
+        ))
+        connection.commit()
+
+        print("SIZE:              rows        data MB     index MB")
+        for label, table_name in (("legacy", LEGACY_TABLE_NAME), ("optimized", TABLE_NAME)):
+            rows, data_bytes, index_bytes = table_size(connection, table_name)
+            print(f"    {label:<10} {rows:>12,} {data_bytes / 1024 / 1024:>12,.1f} {index_bytes / 1024 / 1024:>12,.1f}")
+
+        print("LATENCY (median ms):   legacy  optimized")
+        totals = [0.0, 0.0]
+        for name, query in INSIGHTS.items():
+            legacy_seconds = time_query(connection, legacy_query(query), repeats)
+            optimized_seconds = time_query(connection, query, repeats)
+            totals[0] += legacy_seconds
+            totals[1] += optimized_seconds
+            print(f"    {legacy_seconds * 1000:>10,.1f} {optimized_seconds * 1000:>10,.1f}  {name}")
+        print(f"    {totals[0] * 1000:>10,.1f} {totals[1] * 1000:>10,.1f}  (all reports)")
+
+        if not keep_legacy:
+            connection.execute(text(f"DROP TABLE {LEGACY_TABLE_NAME};"))
+            connection.commit()
+
+def ensure_database():
+    print(f"Attempting to connect to MySQL at {MYSQL_HOST} for database creation/check...")
+    temp_engine = server_engine()
 
     try:
         with temp_engine.connect() as temp_conn:
             temp_conn.execute(text(f"CREATE DATABASE IF NOT EXISTS {MYSQL_DATABASE};"))
             temp_conn.commit()
         print(f"SUCCESS: Database '{MYSQL_DATABASE}' ensured to exist.")
+        return True
     except Exception as e:
         print(f"ERROR: Could not create or verify database '{MYSQL_DATABASE}'.")
         print(f"Reason: {e}")
         print("Please ensure your MySQL server is running and credentials have database creation/access permissions.")
-        return
+        return False
+    finally:
+        temp_engine.dispose()
 
-    print(f"Connecting to database '{MYSQL_DATABASE}' to create/populate table...")
-    db_connection_str_with_db = (
-        f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}/{MYSQL_DATABASE}"
+def get_db_connection():
+    # Loads always write to MySQL; the embedded copy is exported separately.
+    return get_engine("mysql")
+
+def duration_minutes_sql(column='stop_duration'):
+    cases = " ".join(f"WHEN '{label}' THEN {minutes}" for label, minutes in STOP_DURATION_MINUTES.items())
+    return f"CASE {column} {cases} ELSE 0 END"
+
+def create_table_query(table_name, with_indexes=True):
+    # stop_year, stop_month, stop_hour and duration_minutes are stored
+    # generated columns, so reports group on plain columns instead of calling
+    # YEAR()/HOUR() or mapping duration labels on every row.
+    # The table is range-partitioned on stop_date, and MySQL requires every
+    # unique key to contain it. row_hash already covers stop_date, so
+    # (row_hash, stop_date) is unique exactly when row_hash is.
+    column_definitions = f"""
+        stop_id BIGINT AUTO_INCREMENT,
+        stop_date DATE NOT NULL,
+        stop_time TIME,
+        country_name VARCHAR(255),
+        driver_gender VARCHAR(50),
+        driver_age_raw INT,
+        driver_age INT,
+        driver_race VARCHAR(50),
+        violation_raw VARCHAR(255),
+        violation VARCHAR(255),
+        search_conducted BOOLEAN,
+        search_type VARCHAR(255),
+        stop_outcome VARCHAR(50),
+        is_arrested BOOLEAN,
+        stop_duration VARCHAR(50),
+        drugs_related_stop BOOLEAN,
+        vehicle_number VARCHAR(255),
+        row_hash BIGINT UNSIGNED NOT NULL,
+        stop_year SMALLINT AS (YEAR(stop_date)) STORED,
+        stop_month TINYINT AS (MONTH(stop_date)) STORED,
+        stop_hour TINYINT AS (HOUR(stop_time)) STORED,
+        duration_minutes DECIMAL(4,1) AS ({duration_minutes_sql()}) STORED,
+        PRIMARY KEY (stop_id, stop_date),
+        UNIQUE INDEX uq_row_hash (row_hash, stop_date)"""
+    if with_indexes:
+        index_definitions = ",\n".join(
+            f"        INDEX {name} ({columns})" for name, columns in SECONDARY_INDEXES.items()
+        )
+        column_definitions += ",\n" + index_definitions
+    return f"CREATE TABLE {table_name} ({column_definitions}\n    ) {partition_clause()};"
+
+def recreate_table(connection, table_name=TABLE_NAME, with_indexes=True):
+    connection.execute(text(f"DROP TABLE IF EXISTS {table_name};"))
+    connection.commit()
+    print(f"SUCCESS: Existing table '{table_name}' dropped if it existed in '{MYSQL_DATABASE}'.")
+
+    connection.execute(text(create_table_query(table_name, with_indexes)))
+    connection.commit()
+    if with_indexes:
+        print(f"SUCCESS: Table '{table_name}' created with indexes in '{MYSQL_DATABASE}'.")
+    else:
+        print(f"SUCCESS: Table '{table_name}' created without secondary indexes in '{MYSQL_DATABASE}'.")
+
+def build_secondary_indexes(connection, table_name):
+    # One ALTER re-types the dimension columns and builds every index in a
+    # single pass over the loaded rows.
+    add_index_clauses = ", ".join(
+        dimension_enum_clauses(connection, table_name)
+        + [f"ADD INDEX {name} ({columns})" for name, columns in SECONDARY_INDEXES.items()]
+    )
+    connection.execute(text(f"ALTER TABLE {table_name} {add_index_clauses};"))
+    connection.commit()
+    print(f"SUCCESS: Built {len(SECONDARY_INDEXES)} secondary indexes on '{table_name}'.")
+
+def quote_sql_string(value):
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "''") + "'"
+
+def enum_column_sql(column, values):
+    if len(values) > MAX_ENUM_VALUES:
+        return f"MODIFY {column} VARCHAR(255) NOT NULL DEFAULT 'Unknown'"
+    members = ", ".join(quote_sql_string(value) for value in sorted(values))
+    return f"MODIFY {column} ENUM({members}) NOT NULL DEFAULT 'Unknown'"
+
+def dimension_enum_clauses(connection, table_name):
+    # Members are the values present plus 'Unknown', sorted so that ORDER BY on
+    # an ENUM (which sorts by member position) stays alphabetical.
+    clauses = []
+    for column in DIMENSION_COLUMNS:
+        values = {row[0] for row in connection.execute(text(f"SELECT DISTINCT {column} FROM {table_name};"))}
+        values = {value for value in values if value is not None} | {'Unknown'}
+        clauses.append(enum_column_sql(column, values))
+    return clauses
+
+def encode_dimension_columns(connection, table_name=TABLE_NAME):
+    start = time.perf_counter()
+    connection.execute(text(f"ALTER TABLE {table_name} {', '.join(dimension_enum_clauses(connection, table_name))};"))
+    connection.commit()
+    print(f"SUCCESS: Dimension columns of '{table_name}' stored as ENUMs in {time.perf_counter() - start:.1f}s.")
+
+def enum_members(connection, table_name):
+    # {column: set of members} for the dimension columns that are ENUMs.
+    members = {}
+    for column_name, column_type in connection.execute(text("""
+        SELECT COLUMN_NAME, COLUMN_TYPE FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table_name AND DATA_TYPE = 'enum';
+    """), {'table_name': table_name}):
+        if column_name in DIMENSION_COLUMNS:
+            members[column_name] = {
+                value.replace("''", "'").replace("\\\\", "\\")
+                for value in re.findall(r"'((?:[^']|'')*)'", column_type)
+            }
+    return members
+
+def extend_dimension_enums(connection, table_name, chunk, members):
+    # A value an ENUM does not list would be stored as '' by INSERT IGNORE, so
+    # new values are added to the column before the chunk is inserted.
+    clauses = []
+    for column, known in members.items():
+        if column not in chunk.columns:
+            continue
+        new_values = set(chunk[column].dropna().astype(str).unique()) - known
+        if new_values:
+            known |= new_values
+            clauses.append(enum_column_sql(column, known))
+            print(f"NOTE: Adding {len(new_values)} new value(s) to '{column}' on '{table_name}'.")
+    if clauses:
+        connection.execute(text(f"ALTER TABLE {table_name} {', '.join(clauses)};"))
+        connection.commit()
+
+def table_exists(connection, table_name):
+    result = connection.execute(
+        text(
+            "SELECT COUNT(*) FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = :schema AND TABLE_NAME = :table_name;"
+        ),
+        {'schema': MYSQL_DATABASE, 'table_name': table_name},
     )
-    engine = create_engine(db_connection_str_with_db)
+    return result.scalar() > 0
 
+def drop_staging_tables(engine):
+    # A reload that stops early leaves no half-built staging tables for the
+    # next one. Runs on its own connection: the reload's may be broken.
     try:
         with engine.connect() as connection:
-            connection.execute(text(f"DROP TABLE IF EXISTS {TABLE_NAME};"))
+            for table_name in (STAGING_TABLE_NAME, ROLLUP_STAGING_TABLE_NAME):
+                connection.execute(text(f"DROP TABLE IF EXISTS {table_name};"))
             connection.commit()
-            print(f"SUCCESS: Existing table '{TABLE_NAME}' dropped if it existed in '{MYSQL_DATABASE}'.")
-
-            create_table_with_indexes_query = f"""
-            CREATE TABLE {TABLE_NAME} (
-                stop_date DATE,
-                stop_time VARCHAR(8),
-                country_name VARCHAR(255),
-                driver_gender VARCHAR(50),
-                driver_age_raw INT,
-                driver_age INT,
-                driver_race VARCHAR(50),
-                violation_raw VARCHAR(255),
-                violation VARCHAR(255),
-                search_conducted BOOLEAN,
-                search_type VARCHAR(255),
-                stop_outcome VARCHAR(50),
-                is_arrested BOOLEAN,
-                stop_duration VARCHAR(50),
-                drugs_related_stop BOOLEAN,
-                vehicle_number VARCHAR(255),
-                INDEX idx_stop_date (stop_date),
-                INDEX idx_violation (violation),
-                INDEX idx_vehicle_number (vehicle_number),
-                INDEX idx_drugs_related_stop (drugs_related_stop),
-                INDEX idx_driver_age (driver_age),
-                INDEX idx_is_arrested (is_arrested),
-                INDEX idx_country_name (country_name),
-                INDEX idx_driver_gender (driver_gender),
-                INDEX idx_driver_race (driver_race)
-            );
-            """
-            connection.execute(text(create_table_with_indexes_query))
-            connection.commit()
-            print(f"SUCCESS: Table '{TABLE_NAME}' created with indexes in '{MYSQL_DATABASE}'.")
+    except Exception as e:
+        print(f"WARNING: Could not drop the staging tables: {e}")
 
+def swap_in_staging_tables(connection, table_pairs):
+    # RENAME TABLE with several pairs is atomic, so readers see either the old
+    # tables or the fully loaded ones, never a missing or partial table.
+    renames = []
+    old_tables = []
+    for live_table, staging_table in table_pairs:
+        old_table = f"{live_table}_old"
+        connection.execute(text(f"DROP TABLE IF EXISTS {old_table};"))
+        if table_exists(connection, live_table):
+            renames.append(f"{live_table} TO {old_table}")
+            old_tables.append(old_table)
+        renames.append(f"{staging_table} TO {live_table}")
+    connection.execute(text(f"RENAME TABLE {', '.join(renames)};"))
+    for old_table in old_tables:
+        connection.execute(text(f"DROP TABLE {old_table};"))
+    connection.commit()
+    for live_table, _ in table_pairs:
+        print(f"SUCCESS: Staging table swapped in as '{live_table}'.")
 
-            df.to_sql(
-                TABLE_NAME,
-                engine,
-                if_exists='append', 
-                index=False,
-            )
+def verify_table(connection, table_name=TABLE_NAME):
+    result = connection.execute(text(f"SELECT COUNT(*) FROM {table_name};"))
+    count = result.scalar()
+    print(f"VERIFICATION: Total rows in '{table_name}' after insertion: {count}")
+    return count
+
+def create_and_populate_db(df, position=None):
+    print(f"--- Starting Database Population ---")
+    if not ensure_database():
+        return
+
+    print(f"Connecting to database '{MYSQL_DATABASE}' to create/populate table...")
+    engine = get_db_connection()
+
+    try:
+        with engine.connect() as connection:
+            recreate_table(connection)
+
+            extend_partitions(connection, TABLE_NAME, df)
+            inserted = insert_chunk(add_row_hash(df), connection)
+            connection.commit()
             print(f"SUCCESS: DataFrame successfully written to '{TABLE_NAME}' table in '{MYSQL_DATABASE}'.")
+            if inserted < len(df):
+                print(f"NOTE: Skipped {len(df) - inserted} duplicate rows.")
 
-            result = connection.execute(text(f"SELECT COUNT(*) FROM {TABLE_NAME};"))
-            count = result.scalar()
-            print(f"VERIFICATION: Total rows in '{TABLE_NAME}' after insertion: {count}")
-            
-            result = connection.execute(text(f"SELECT * FROM {TABLE_NAME} LIMIT 5;"))
-            print("VERIFICATION: First 5 rows from the database:")
-            for i, row in enumerate(result):
-                pass
+            verify_table(connection)
+            encode_dimension_columns(connection)
+            save_watermark(connection, latest_stop_at(df), inserted)
+            if position is not None:
+                save_source_position(connection, position)
+            save_rollup_watermark(connection, rebuild_rollup(connection))
+            save_trigram_watermark(connection, rebuild_trigrams(connection))
+            save_profile_watermark(connection, rebuild_profiles(connection))
+            bump_data_version(connection)
+            connection.commit()
     except Exception as e:
         print(f"ERROR: Failed to populate table '{TABLE_NAME}' in '{MYSQL_DATABASE}'.")
         print(f"Reason: {e}")
@@ -127,18 +483,935 @@ def create_and_populate_db(df):
 
     print(f"--- Database Population Finished ---")
 
+def add_row_hash(df):
+    # The hash is the dedup key for re-read data. It covers the values as
+    # stored, independent of the dtypes pandas inferred, and the row's
+    # position in the source file (the frame's index, the record number
+    # read_csv assigns). Two identical stops on different rows are both kept;
+    # the same row read twice is stored once.
+    hash_input = to_sql_frame(df).reindex(columns=TABLE_COLUMNS).astype(str)
+    if 'stop_date' in df.columns:
+        hash_input['stop_date'] = df['stop_date'].dt.strftime('%Y-%m-%d')
+    hash_input['source_row'] = df.index.astype(str)
+    df = df.copy()
+    df['row_hash'] = pd.util.hash_pandas_object(hash_input, index=False).to_numpy()
+    return df
+
+def stop_timestamps(df):
+    stop_at = df['stop_date']
+    if 'stop_time' in df.columns:
+        stop_at = stop_at + pd.to_timedelta(df['stop_time'], errors='coerce').fillna(pd.Timedelta(0))
+    return stop_at
+
+def latest_stop_at(df):
+    if df.empty:
+        return None
+    return stop_timestamps(df).max()
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def snapshot_path(csv_path):
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    name = f"{TABLE_NAME}_{stem}_{file_sha256(csv_path)[:16]}_v{SNAPSHOT_FORMAT}.parquet"
+    return os.path.join(SNAPSHOT_DIR, name)
+
+def snapshot_schema():
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    fields = {
+        'stop_date': pa.timestamp('us'),
+        'stop_time': pa.duration('us'),
+        'driver_age_raw': pa.int16(),
+        'driver_age': pa.int16(),
+        'search_conducted': pa.bool_(),
+        'is_arrested': pa.bool_(),
+        'drugs_related_stop': pa.bool_(),
+        'vehicle_number': pa.string(),
+    }
+    # source_row keeps each row's record number, which row_hash depends on.
+    return pa.schema([
+        (col, dictionary if col in LOW_CARDINALITY_COLUMNS else fields[col]) for col in TABLE_COLUMNS
+    ] + [('source_row', pa.int64())])
+
+def prune_snapshots(keep):
+    # Snapshots are named after the CSV and its digest, so every change to a
+    # CSV leaves one behind; only the newest of each CSV is kept.
+    prefix = os.path.basename(keep).rsplit('_', 2)[0] + '_'
+    for name in os.listdir(SNAPSHOT_DIR):
+        path = os.path.join(SNAPSHOT_DIR, name)
+        if name.startswith(prefix) and re.fullmatch(r"[0-9a-f]{16}_v\d+\.parquet", name[len(prefix):]) and path != keep:
+            os.remove(path)
+            print(f"NOTE: Removed old snapshot '{path}'.")
+
+def iter_snapshot_chunks(path, chunk_size=INGEST_CHUNK_SIZE):
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=chunk_size):
+        chunk = pa.Table.from_batches([batch], schema=parquet_file.schema_arrow).to_pandas()
+        yield chunk.set_index('source_row')
+
+def clean_csv_chunk(chunk):
+    # The index stays the record number, including for rows after dropped ones.
+    cleaned = clean_data(chunk, drop_empty_columns=False).reindex(columns=TABLE_COLUMNS)
+    cleaned.index.name = 'source_row'
+    return cleaned
+
+def snapshot_chunks(chunks, snapshot_file=None):
+    # The snapshot is written next to the load and only renamed into place once
+    # the whole file was read, so an interrupted run never leaves a partial one.
+    writer = None
+    temp_path = f"{snapshot_file}.tmp" if snapshot_file else None
+    schema = snapshot_schema()
+    completed = False
+    try:
+        for cleaned in chunks:
+            if snapshot_file:
+                if writer is None:
+                    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+                    writer = pq.ParquetWriter(temp_path, schema)
+                writer.write_table(pa.Table.from_pandas(cleaned.reset_index(), schema=schema, preserve_index=False))
+            yield cleaned
+        completed = True
+    finally:
+        if writer is not None:
+            writer.close()
+            if completed:
+                os.replace(temp_path, snapshot_file)
+                print(f"SUCCESS: Cleaned snapshot written to '{snapshot_file}'.")
+                prune_snapshots(snapshot_file)
+            else:
+                os.remove(temp_path)
+
+def iter_csv_chunks(csv_path, chunk_size=INGEST_CHUNK_SIZE, snapshot_file=None):
+    chunks = (clean_csv_chunk(chunk) for chunk in pd.read_csv(csv_path, chunksize=chunk_size))
+    yield from snapshot_chunks(chunks, snapshot_file)
+
+def csv_record_ends(csv_path, block_size=SCAN_BLOCK_BYTES, start=0, complete_only=False):
+    # Yields, block by block, the byte offset just past every record from
+    # start (a record boundary) on, counted the way read_csv counts them: a
+    # newline inside a quoted field does not end a record, and blank or
+    # whitespace-only lines are skipped. A last record without a trailing
+    # newline ends at the end of the file, unless complete_only leaves it
+    # out because it may still be being written.
+    offset = start
+    quotes = 0
+    pending = False
+    with open(csv_path, 'rb') as f:
+        f.seek(start)
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            data = np.frombuffer(block, dtype=np.uint8)
+            newlines = np.flatnonzero(data == 10)
+            quote_at = np.flatnonzero(data == 34)
+            if len(quote_at):
+                # A newline is quoted when an odd number of quotes precede it.
+                quoted = (quotes + np.searchsorted(quote_at, newlines)) % 2 == 1
+                newlines = newlines[~quoted]
+                quotes = (quotes + len(quote_at)) % 2
+            elif quotes:
+                newlines = newlines[:0]
+            if len(newlines):
+                # A line has content if its last byte before the newline (and
+                # a CR) does; only lines ending in whitespace are looked at
+                # byte by byte. pending is the content of the line's part in
+                # the previous block.
+                starts = np.concatenate(([0], newlines[:-1] + 1))
+                last = newlines - 1
+                last = last - ((last >= starts) & (data[np.maximum(last, 0)] == 13))
+                has_content = (last >= starts) & CONTENT_BYTES[data[np.maximum(last, 0)]]
+                for line in np.flatnonzero(~has_content):
+                    has_content[line] = CONTENT_BYTES[data[starts[line]:newlines[line]]].any()
+                has_content[0] |= pending
+                pending = bool(CONTENT_BYTES[data[newlines[-1] + 1:]].any())
+                if has_content.any():
+                    yield newlines[has_content] + offset + 1
+            else:
+                pending = pending or bool(CONTENT_BYTES[data].any())
+            offset += len(block)
+    if pending and not complete_only:
+        yield np.array([offset])
+
+def csv_chunk_ranges(csv_path, chunk_size=INGEST_CHUNK_SIZE, block_size=SCAN_BLOCK_BYTES):
+    # Yields the (start, end) byte range of every chunk_size records after the
+    # header: the same chunks pd.read_csv(chunksize=...) reads, so per-chunk
+    # type inference and date parsing, and with them the rows clean_data
+    # drops, match the serial load.
+    start = None
+    records = 0
+    last_end = None
+    for ends in csv_record_ends(csv_path, block_size):
+        if start is None:
+            start = int(ends[0])
+            ends = ends[1:]
+        numbers = records + np.arange(1, len(ends) + 1)
+        for end in ends[numbers % chunk_size == 0]:
+            yield start, int(end)
+            start = int(end)
+        if len(ends):
+            last_end = int(ends[-1])
+        records += len(ends)
+    if records % chunk_size:
+        yield start, last_end
+
+def read_csv_range(csv_path, start, end):
+    with open(csv_path, 'rb') as f:
+        f.seek(start)
+        return io.BytesIO(f.read(end - start))
+
+def clean_csv_range(csv_path, start, end, names, first_row=0):
+    # Runs in a worker process: parses, cleans and hashes one chunk, whose
+    # first record is record number first_row of the file.
+    chunk = pd.read_csv(read_csv_range(csv_path, start, end), names=names, header=None)
+    chunk.index = pd.RangeIndex(first_row, first_row + len(chunk))
+    return add_row_hash(clean_csv_chunk(chunk))
+
+def source_digest(csv_path, offset):
+    # Digest of the bytes at the start of the file and just before offset,
+    # or None if the file is now shorter than offset.
+    if os.path.getsize(csv_path) < offset:
+        return None
+    digest = hashlib.sha256()
+    with open(csv_path, 'rb') as f:
+        digest.update(f.read(min(offset, SOURCE_DIGEST_BYTES)))
+        tail = max(offset - SOURCE_DIGEST_BYTES, 0)
+        f.seek(tail)
+        digest.update(f.read(offset - tail))
+    return digest.hexdigest()
+
+def csv_source_position(csv_path, offset=0, rows=0):
+    # The end of the last complete record and the number of records before
+    # it, scanning from offset, the end of the rows-th record (0 for the
+    # whole file, whose first record is the header). A last line without a
+    # newline is left for the next load, as it may still be being written.
+    records = 0 if offset else -1
+    for ends in csv_record_ends(csv_path, start=offset, complete_only=True):
+        records += len(ends)
+        offset = int(ends[-1])
+    rows += max(records, 0)
+    return offset, rows, source_digest(csv_path, offset)
+
+def iter_appended_chunks(csv_path, chunk_size, position, new_position):
+    # The records between two source positions, cleaned, with the record
+    # numbers a full read gives them, so their row_hash values match.
+    offset, rows, _ = position
+    names = pd.read_csv(csv_path, nrows=0).columns.tolist()
+    buffer = read_csv_range(csv_path, offset, new_position[0])
+    for chunk in pd.read_csv(buffer, names=names, header=None, chunksize=chunk_size):
+        chunk.index = chunk.index + rows
+        yield clean_csv_chunk(chunk)
+
+def iter_parallel_csv_chunks(csv_path, chunk_size=INGEST_CHUNK_SIZE, snapshot_file=None, workers=None):
+    # Chunks are cleaned in a process pool and yielded in file order, with at
+    # most PARSE_TASKS_PER_WORKER chunks per worker in flight.
+    names = pd.read_csv(csv_path, nrows=0).columns.tolist()
+    workers = workers or os.cpu_count()
+
+    def cleaned_chunks():
+        pool = ProcessPoolExecutor(max_workers=workers)
+        pending = deque()
+        try:
+            for number, (start, end) in enumerate(csv_chunk_ranges(csv_path, chunk_size)):
+                pending.append(pool.submit(clean_csv_range, csv_path, start, end, names, number * chunk_size))
+                if len(pending) >= workers * PARSE_TASKS_PER_WORKER:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+    yield from snapshot_chunks(cleaned_chunks(), snapshot_file)
+
+def iter_clean_chunks(csv_path, chunk_size=INGEST_CHUNK_SIZE, use_snapshot=True):
+    if not use_snapshot:
+        yield from iter_csv_chunks(csv_path, chunk_size)
+        return
+
+    snapshot_file = snapshot_path(csv_path)
+    if os.path.exists(snapshot_file):
+        print(f"Using cleaned snapshot '{snapshot_file}'.")
+        yield from iter_snapshot_chunks(snapshot_file, chunk_size)
+    else:
+        yield from iter_csv_chunks(csv_path, chunk_size, snapshot_file)
+
+def load_clean_data(csv_path=CSV_PATH):
+    chunks = list(iter_clean_chunks(csv_path))
+    if not chunks:
+        return pd.DataFrame(columns=TABLE_COLUMNS)
+    # Chunks carry their own category sets; re-categorize after the concat.
+    # The index stays the source record number that row_hash covers.
+    df = pd.concat(chunks)
+    for col in LOW_CARDINALITY_COLUMNS:
+        df[col] = df[col].astype('category')
+    return df
+
+def insert_ignore_rows(pd_table, connection, keys, data_iter):
+    rows = [dict(zip(keys, row)) for row in data_iter]
+    result = connection.execute(insert(pd_table.table).values(rows).prefix_with("IGNORE"))
+    return result.rowcount
+
+def insert_chunk(chunk, connection, table_name=TABLE_NAME):
+    # INSERT IGNORE against uq_row_hash skips rows that are already stored.
+    inserted = to_sql_frame(chunk).to_sql(
+        table_name,
+        connection,
+        if_exists='append',
+        index=False,
+        method=insert_ignore_rows,
+        chunksize=INSERT_BATCH_SIZE,
+    )
+    return inserted or 0
+
+def create_watermark_table(connection):
+    connection.execute(text(f"""
+    CREATE TABLE IF NOT EXISTS {WATERMARK_TABLE_NAME} (
+        table_name VARCHAR(64) PRIMARY KEY,
+        last_stop_at DATETIME,
+        rows_loaded BIGINT NOT NULL DEFAULT 0,
+        load_generation BIGINT NOT NULL DEFAULT 1,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    );
+    """))
+    ensure_column(connection, WATERMARK_TABLE_NAME, 'load_generation', "BIGINT NOT NULL DEFAULT 1")
+    ensure_column(connection, WATERMARK_TABLE_NAME, 'rollup_stop_id', "BIGINT NOT NULL DEFAULT 0")
+    ensure_column(connection, WATERMARK_TABLE_NAME, 'trigram_stop_id', "BIGINT NOT NULL DEFAULT 0")
+    ensure_column(connection, WATERMARK_TABLE_NAME, 'profile_stop_id', "BIGINT NOT NULL DEFAULT 0")
+    ensure_column(connection, WATERMARK_TABLE_NAME, 'source_offset', "BIGINT NOT NULL DEFAULT 0")
+    ensure_column(connection, WATERMARK_TABLE_NAME, 'source_rows', "BIGINT NOT NULL DEFAULT 0")
+    ensure_column(connection, WATERMARK_TABLE_NAME, 'source_digest', "CHAR(64)")
+    connection.commit()
+
+def ensure_column(connection, table_name, column_name, definition):
+    column_exists = connection.execute(text("""
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table_name AND COLUMN_NAME = :column_name;
+    """), {'table_name': table_name, 'column_name': column_name}).scalar()
+    if not column_exists:
+        connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {definition};"))
+
+def save_watermark(connection, last_stop_at, rows_loaded, reset=True):
+    create_watermark_table(connection)
+    if last_stop_at is not None and pd.isna(last_stop_at):
+        last_stop_at = None
+    if last_stop_at is not None:
+        last_stop_at = pd.Timestamp(last_stop_at).to_pydatetime()
+    # A full load replaces the watermark and starts a new load generation, which
+    # tells stop_id consumers such as the detector that ids were reassigned.
+    # An incremental load only moves the watermark forward.
+    if reset:
+        update_clause = (
+            "last_stop_at = VALUES(last_stop_at), rows_loaded = VALUES(rows_loaded), "
+            "load_generation = load_generation + 1"
+        )
+    else:
+        update_clause = (
+            "last_stop_at = GREATEST(COALESCE(last_stop_at, VALUES(last_stop_at)), "
+            "COALESCE(VALUES(last_stop_at), last_stop_at)), "
+            "rows_loaded = rows_loaded + VALUES(rows_loaded)"
+        )
+    connection.execute(
+        text(f"""
+        INSERT INTO {WATERMARK_TABLE_NAME} (table_name, last_stop_at, rows_loaded)
+        VALUES (:table_name, :last_stop_at, :rows_loaded)
+        ON DUPLICATE KEY UPDATE {update_clause};
+        """),
+        {'table_name': TABLE_NAME, 'last_stop_at': last_stop_at, 'rows_loaded': int(rows_loaded)},
+    )
+    connection.commit()
+
+def load_source_position(connection):
+    # (byte offset, records, digest) of the CSV as last read, or None.
+    create_watermark_table(connection)
+    row = connection.execute(
+        text(f"SELECT source_offset, source_rows, source_digest FROM {WATERMARK_TABLE_NAME} "
+             f"WHERE table_name = :table_name;"),
+        {'table_name': TABLE_NAME},
+    ).fetchone()
+    if row is None or not row[0]:
+        return None
+    return tuple(row)
+
+def save_source_position(connection, position):
+    offset, rows, digest = position
+    connection.execute(
+        text(f"""
+        UPDATE {WATERMARK_TABLE_NAME} SET source_offset = :offset, source_rows = :rows, source_digest = :digest
+        WHERE table_name = :table_name;
+        """),
+        {'offset': offset, 'rows': rows, 'digest': digest, 'table_name': TABLE_NAME},
+    )
+    connection.commit()
+
+def rollup_table_query(table_name):
+    return f"""
+    CREATE TABLE {table_name} (
+        stop_year SMALLINT NOT NULL,
+        stop_month TINYINT NOT NULL,
+        stop_hour TINYINT NOT NULL,
+        country_name VARCHAR(255) NOT NULL,
+        violation VARCHAR(255) NOT NULL,
+        driver_gender VARCHAR(50) NOT NULL,
+        driver_race VARCHAR(50) NOT NULL,
+        age_bucket SMALLINT NOT NULL,
+        stop_duration VARCHAR(50) NOT NULL,
+        stops BIGINT NOT NULL DEFAULT 0,
+        searches BIGINT NOT NULL DEFAULT 0,
+        arrests BIGINT NOT NULL DEFAULT 0,
+        drug_stops BIGINT NOT NULL DEFAULT 0,
+        driver_age_sum BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (stop_year, stop_month, stop_hour, country_name, violation,
+                     driver_gender, driver_race, age_bucket, stop_duration)
+    );
+    """
+
+def rollup_select_query(source_table, where_clause="1=1"):
+    # age_bucket holds the lower bound of each age band (-1 for unknown ages);
+    # the bands line up with every age split the INSIGHTS reports use.
+    # stop_hour is -1 when stop_time is missing.
+    return f"""
+    SELECT
+        stop_year,
+        stop_month,
+        COALESCE(stop_hour, -1) AS stop_hour,
+        country_name,
+        violation,
+        driver_gender,
+        driver_race,
+        CASE
+            WHEN driver_age <= 0 THEN -1
+            WHEN driver_age < 15 THEN 1
+            WHEN driver_age <= 20 THEN 15
+            WHEN driver_age <= 24 THEN 21
+            WHEN driver_age = 25 THEN 25
+            WHEN driver_age <= 35 THEN 26
+            WHEN driver_age <= 50 THEN 36
+            ELSE 51
+        END AS age_bucket,
+        stop_duration,
+        COUNT(*) AS stops,
+        SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END) AS searches,
+        SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) AS arrests,
+        SUM(CASE WHEN drugs_related_stop = TRUE THEN 1 ELSE 0 END) AS drug_stops,
+        SUM(GREATEST(driver_age, 0)) AS driver_age_sum
+    FROM {source_table}
+    WHERE {where_clause}
+    GROUP BY stop_year, stop_month, stop_hour, country_name, violation,
+             driver_gender, driver_race, age_bucket, stop_duration
+    """
+
+def rebuild_rollup(connection, source_table=TABLE_NAME, rollup_table=ROLLUP_TABLE_NAME):
+    max_stop_id = connection.execute(text(f"SELECT COALESCE(MAX(stop_id), 0) FROM {source_table};")).scalar()
+    connection.execute(text(f"DROP TABLE IF EXISTS {rollup_table};"))
+    connection.execute(text(rollup_table_query(rollup_table)))
+    connection.execute(
+        text(f"INSERT INTO {rollup_table} {rollup_select_query(source_table, 'stop_id <= :max_stop_id')};"),
+        {'max_stop_id': max_stop_id},
+    )
+    connection.commit()
+    print(f"SUCCESS: Rollup '{rollup_table}' rebuilt from '{source_table}'.")
+    return max_stop_id
+
+def refresh_rollup(connection):
+    # Folds stops added since the last refresh into the existing rollup rows.
+    if not table_exists(connection, ROLLUP_TABLE_NAME):
+        save_rollup_watermark(connection, rebuild_rollup(connection))
+        return
+    last_stop_id = connection.execute(
+        text(f"SELECT rollup_stop_id FROM {WATERMARK_TABLE_NAME} WHERE table_name = :table_name;"),
+        {'table_name': TABLE_NAME},
+    ).scalar() or 0
+    max_stop_id = connection.execute(text(f"SELECT COALESCE(MAX(stop_id), 0) FROM {TABLE_NAME};")).scalar()
+    measures = ['stops', 'searches', 'arrests', 'drug_stops', 'driver_age_sum']
+    updates = ", ".join(f"{name} = {name} + VALUES({name})" for name in measures)
+    result = connection.execute(
+        text(f"""
+        INSERT INTO {ROLLUP_TABLE_NAME}
+        {rollup_select_query(TABLE_NAME, 'stop_id > :last_stop_id AND stop_id <= :max_stop_id')}
+        ON DUPLICATE KEY UPDATE {updates};
+        """),
+        {'last_stop_id': last_stop_id, 'max_stop_id': max_stop_id},
+    )
+    save_rollup_watermark(connection, max_stop_id)
+    print(f"SUCCESS: Rollup refreshed with stops {last_stop_id + 1}..{max_stop_id} ({result.rowcount} rows touched).")
+
+def save_rollup_watermark(connection, stop_id):
+    connection.execute(
+        text(f"UPDATE {WATERMARK_TABLE_NAME} SET rollup_stop_id = :stop_id WHERE table_name = :table_name;"),
+        {'stop_id': stop_id, 'table_name': TABLE_NAME},
+    )
+    connection.commit()
+
+def save_trigram_watermark(connection, stop_id):
+    create_watermark_table(connection)
+    connection.execute(
+        text(f"UPDATE {WATERMARK_TABLE_NAME} SET trigram_stop_id = :stop_id WHERE table_name = :table_name;"),
+        {'stop_id': stop_id, 'table_name': TABLE_NAME},
+    )
+    connection.commit()
+
+def update_trigram_index(connection):
+    # Only plates from stops added since the last update are indexed.
+    last_stop_id = 0
+    if table_exists(connection, TRIGRAM_TABLE):
+        last_stop_id = connection.execute(
+            text(f"SELECT trigram_stop_id FROM {WATERMARK_TABLE_NAME} WHERE table_name = :table_name;"),
+            {'table_name': TABLE_NAME},
+        ).scalar() or 0
+    save_trigram_watermark(connection, refresh_trigrams(connection, TABLE_NAME, last_stop_id))
+
+def save_profile_watermark(connection, stop_id):
+    create_watermark_table(connection)
+    connection.execute(
+        text(f"UPDATE {WATERMARK_TABLE_NAME} SET profile_stop_id = :stop_id WHERE table_name = :table_name;"),
+        {'stop_id': stop_id, 'table_name': TABLE_NAME},
+    )
+    connection.commit()
+
+def update_vehicle_profiles(connection):
+    # Only stops added since the last update are folded into the profiles.
+    if not table_exists(connection, PROFILE_TABLE):
+        save_profile_watermark(connection, rebuild_profiles(connection))
+        return
+    last_stop_id = connection.execute(
+        text(f"SELECT profile_stop_id FROM {WATERMARK_TABLE_NAME} WHERE table_name = :table_name;"),
+        {'table_name': TABLE_NAME},
+    ).scalar() or 0
+    save_profile_watermark(connection, refresh_profiles(connection, TABLE_NAME, last_stop_id))
+
+def load_chunks(connection, chunks, table_name=TABLE_NAME, verb="loaded"):
+    rows_read = 0
+    rows_inserted = 0
+    last_stop_at = None
+    start = time.perf_counter()
+    members = enum_members(connection, table_name)
+
+    for chunk in chunks:
+        if not chunk.empty:
+            extend_dimension_enums(connection, table_name, chunk, members)
+            extend_partitions(connection, table_name, chunk)
+            rows_inserted += insert_chunk(add_row_hash(chunk), connection, table_name)
+            connection.commit()
+            chunk_last_stop_at = latest_stop_at(chunk)
+            if last_stop_at is None or chunk_last_stop_at > last_stop_at:
+                last_stop_at = chunk_last_stop_at
+        rows_read += len(chunk)
+        elapsed = time.perf_counter() - start
+        print(f"PROGRESS: {rows_read} rows read, {rows_inserted} {verb} in {elapsed:.1f}s ({rows_read / max(elapsed, 1e-9):,.0f} rows/sec)")
+
+    return rows_read, rows_inserted, last_stop_at
+
+def stream_and_populate_db(csv_path=CSV_PATH, chunk_size=INGEST_CHUNK_SIZE, use_snapshot=True):
+    print(f"--- Starting Streaming Database Population ---")
+    if not ensure_database():
+        return
+
+    engine = get_db_connection()
+    start = time.perf_counter()
+
+    try:
+        # Taken before reading, so rows appended during the load are read
+        # again by the next incremental one rather than skipped.
+        position = csv_source_position(csv_path)
+        with engine.connect() as connection:
+            recreate_table(connection)
+            total_rows, inserted, last_stop_at = load_chunks(connection, iter_clean_chunks(csv_path, chunk_size, use_snapshot))
+            verify_table(connection)
+            encode_dimension_columns(connection)
+            save_watermark(connection, last_stop_at, inserted)
+            save_source_position(connection, position)
+            save_rollup_watermark(connection, rebuild_rollup(connection))
+            save_trigram_watermark(connection, rebuild_trigrams(connection))
+            save_profile_watermark(connection, rebuild_profiles(connection))
+            bump_data_version(connection)
+            connection.commit()
+    except FileNotFoundError:
+        print(f"ERROR: '{csv_path}' not found. Please ensure the file is in the same directory.")
+        return
+    except Exception as e:
+        print(f"ERROR: Failed to stream data into '{TABLE_NAME}' in '{MYSQL_DATABASE}'.")
+        print(f"Reason: {e}")
+        return
+
+    elapsed = time.perf_counter() - start
+    print(f"SUCCESS: Streamed {total_rows} rows in {elapsed:.1f}s ({total_rows / max(elapsed, 1e-9):,.0f} rows/sec).")
+    print(f"--- Streaming Database Population Finished ---")
+
+def insert_first_rows(pd_table, connection, keys, data_iter):
+    # Chunks land in any order, so stop_ids are given explicitly; a row seen
+    # twice keeps the smaller (earlier) stop_id, as INSERT IGNORE keeps the
+    # first one in a serial load.
+    rows = [dict(zip(keys, row)) for row in data_iter]
+    statement = mysql_insert(pd_table.table).values(rows)
+    statement = statement.on_duplicate_key_update(
+        stop_id=func.least(pd_table.table.c.stop_id, statement.inserted.stop_id)
+    )
+    return connection.execute(statement).rowcount
+
+def insert_worker(engine, table_name, chunks, errors):
+    # One per insert connection; takes chunks until it gets None.
+    try:
+        with engine.connect() as connection:
+            while True:
+                chunk = chunks.get()
+                if chunk is None:
+                    return
+                if 'row_hash' not in chunk.columns:
+                    chunk = add_row_hash(chunk)
+                for attempt in range(INSERT_RETRIES):
+                    try:
+                        to_sql_frame(chunk).to_sql(
+                            table_name,
+                            connection,
+                            if_exists='append',
+                            index=False,
+                            method=insert_first_rows,
+                            chunksize=INSERT_BATCH_SIZE,
+                        )
+                        connection.commit()
+                        break
+                    except Exception as e:
+                        # Two connections writing the same duplicate row can
+                        # deadlock; the upsert is idempotent, so retry it.
+                        connection.rollback()
+                        if "deadlock" not in str(e).lower() or attempt == INSERT_RETRIES - 1:
+                            raise
+    except Exception as e:
+        errors.append(e)
+        # Keep draining so the producer never blocks on a full queue.
+        while chunks.get() is not None:
+            pass
+
+def parallel_load_chunks(connection, engine, chunks, table_name=TABLE_NAME, inserters=PARALLEL_INSERTERS):
+    # Chunks are numbered in file order and spread over several insert
+    # connections through a bounded queue; partitions are added on connection
+    # before a chunk is queued. Returns (rows read, latest stop).
+    queued = queue.Queue(maxsize=inserters * INSERT_QUEUE_PER_INSERTER)
+    errors = []
+    threads = [
+        threading.Thread(target=insert_worker, args=(engine, table_name, queued, errors), daemon=True)
+        for _ in range(inserters)
+    ]
+    for thread in threads:
+        thread.start()
+
+    rows_read = 0
+    last_stop_at = None
+    start = time.perf_counter()
+    try:
+        for chunk in chunks:
+            if errors:
+                break
+            if not chunk.empty:
+                chunk = chunk.assign(stop_id=np.arange(rows_read + 1, rows_read + len(chunk) + 1))
+                chunk_last_stop_at = latest_stop_at(chunk)
+                if last_stop_at is None or chunk_last_stop_at > last_stop_at:
+                    last_stop_at = chunk_last_stop_at
+                extend_partitions(connection, table_name, chunk)
+                queued.put(chunk)
+            rows_read += len(chunk)
+            elapsed = time.perf_counter() - start
+            print(f"PROGRESS: {rows_read} rows cleaned and queued in {elapsed:.1f}s "
+                  f"({rows_read / max(elapsed, 1e-9):,.0f} rows/sec)")
+    finally:
+        for _ in threads:
+            queued.put(None)
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    return rows_read, last_stop_at
+
+def parallel_populate_db(csv_path=CSV_PATH, chunk_size=INGEST_CHUNK_SIZE, use_snapshot=True,
+                         workers=None, inserters=PARALLEL_INSERTERS):
+    # The streaming load, with parsing and cleaning spread over worker
+    # processes and inserts over several connections. Secondary indexes and
+    # ENUMs are built once the rows are in, as in reload.
+    print(f"--- Starting Parallel Database Population ---")
+    if not ensure_database():
+        return
+
+    engine = get_db_connection()
+    start = time.perf_counter()
+
+    try:
+        position = csv_source_position(csv_path)
+        snapshot_file = snapshot_path(csv_path) if use_snapshot else None
+        if snapshot_file and os.path.exists(snapshot_file):
+            print(f"Using cleaned snapshot '{snapshot_file}'.")
+            chunks = iter_snapshot_chunks(snapshot_file, chunk_size)
+        else:
+            print(f"Cleaning with {workers or os.cpu_count()} worker processes, inserting over {inserters} connections.")
+            chunks = iter_parallel_csv_chunks(csv_path, chunk_size, snapshot_file, workers)
+
+        with engine.connect() as connection:
+            recreate_table(connection, with_indexes=False)
+            total_rows, last_stop_at = parallel_load_chunks(connection, engine, chunks, TABLE_NAME, inserters)
+            load_elapsed = time.perf_counter() - start
+            build_secondary_indexes(connection, TABLE_NAME)
+            inserted = verify_table(connection)
+            save_watermark(connection, last_stop_at, inserted)
+            save_source_position(connection, position)
+            save_rollup_watermark(connection, rebuild_rollup(connection))
+            save_trigram_watermark(connection, rebuild_trigrams(connection))
+            save_profile_watermark(connection, rebuild_profiles(connection))
+            bump_data_version(connection)
+            connection.commit()
+    except FileNotFoundError:
+        print(f"ERROR: '{csv_path}' not found. Please ensure the file is in the same directory.")
+        return
+    except Exception as e:
+        print(f"ERROR: Failed to load data in parallel into '{TABLE_NAME}' in '{MYSQL_DATABASE}'.")
+        print(f"Reason: {e}")
+        return
+
+    elapsed = time.perf_counter() - start
+    print(f"SUCCESS: Loaded {inserted} of {total_rows} rows in {elapsed:.1f}s (load {load_elapsed:.1f}s, "
+          f"{total_rows / max(load_elapsed, 1e-9):,.0f} rows/sec).")
+    print(f"--- Parallel Database Population Finished ---")
+
+def reload_db(csv_path=CSV_PATH, chunk_size=INGEST_CHUNK_SIZE, use_snapshot=True):
+    print(f"--- Starting Zero-Downtime Reload ---")
+    if not ensure_database():
+        return
+
+    engine = get_db_connection()
+    start = time.perf_counter()
+
+    try:
+        position = csv_source_position(csv_path)
+        with engine.connect() as connection:
+            recreate_table(connection, STAGING_TABLE_NAME, with_indexes=False)
+            total_rows, inserted, last_stop_at = load_chunks(
+                connection, iter_clean_chunks(csv_path, chunk_size, use_snapshot), STAGING_TABLE_NAME, verb="staged"
+            )
+            load_elapsed = time.perf_counter() - start
+
+            index_start = time.perf_counter()
+            build_secondary_indexes(connection, STAGING_TABLE_NAME)
+            index_elapsed = time.perf_counter() - index_start
+
+            staged_count = verify_table(connection, STAGING_TABLE_NAME)
+            if staged_count != inserted:
+                print(f"ERROR: Staging table has {staged_count} rows but {inserted} were loaded. Keeping the current '{TABLE_NAME}'.")
+                connection.rollback()
+                drop_staging_tables(engine)
+                return
+
+            rollup_start = time.perf_counter()
+            rollup_stop_id = rebuild_rollup(connection, STAGING_TABLE_NAME, ROLLUP_STAGING_TABLE_NAME)
+            print(f"SUCCESS: Rollup built in {time.perf_counter() - rollup_start:.1f}s.")
+
+            swap_in_staging_tables(connection, [
+                (TABLE_NAME, STAGING_TABLE_NAME),
+                (ROLLUP_TABLE_NAME, ROLLUP_STAGING_TABLE_NAME),
+            ])
+            save_watermark(connection, last_stop_at, inserted)
+            save_source_position(connection, position)
+            save_rollup_watermark(connection, rollup_stop_id)
+            # Plates are re-offered rather than the table rebuilt, so searches
+            # keep using the index during the reload; a plate that vanished
+            # just matches no stops.
+            save_trigram_watermark(connection, refresh_trigrams(connection, TABLE_NAME))
+            # Stop ids were reassigned, so the profiles are rebuilt, in a
+            # staging table that is renamed into place like traffic_stops.
+            save_profile_watermark(connection, rebuild_profiles(connection))
+            bump_data_version(connection)
+            connection.commit()
+    except FileNotFoundError:
+        print(f"ERROR: '{csv_path}' not found. Please ensure the file is in the same directory.")
+        return
+    except Exception as e:
+        print(f"ERROR: Reload into '{STAGING_TABLE_NAME}' failed; '{TABLE_NAME}' was left untouched.")
+        print(f"Reason: {e}")
+        drop_staging_tables(engine)
+        return
+
+    print(f"SUCCESS: Reloaded {inserted} of {total_rows} rows (load {load_elapsed:.1f}s, index build {index_elapsed:.1f}s).")
+    print(f"--- Zero-Downtime Reload Finished ---")
+
+def iter_new_chunks(csv_path, chunk_size, position, use_snapshot=True):
+    # Returns the chunks to append and the position to record after them: only
+    # the records after the stored position if the CSV still starts with the
+    # bytes read then, otherwise the whole file. Either way uq_row_hash drops
+    # rows already stored, so late-arriving stops are kept whatever their date.
+    if position is not None and source_digest(csv_path, position[0]) == position[2]:
+        new_position = csv_source_position(csv_path, position[0], position[1])
+        print(f"Reading '{csv_path}' from record {position[1]} (byte {position[0]}).")
+        return iter_appended_chunks(csv_path, chunk_size, position, new_position), new_position
+    if position is not None:
+        print(f"NOTE: '{csv_path}' changed before byte {position[0]}; reading it from the start.")
+    new_position = csv_source_position(csv_path)
+    return iter_clean_chunks(csv_path, chunk_size, use_snapshot), new_position
+
+def append_incremental(csv_path=CSV_PATH, chunk_size=INGEST_CHUNK_SIZE, use_snapshot=True):
+    print(f"--- Starting Incremental Append ---")
+    if not ensure_database():
+        return
+
+    engine = get_db_connection()
+    start = time.perf_counter()
+
+    try:
+        with engine.connect() as connection:
+            if not table_exists(connection, TABLE_NAME):
+                connection.execute(text(create_table_query(TABLE_NAME)))
+                connection.commit()
+                print(f"SUCCESS: Table '{TABLE_NAME}' created with indexes in '{MYSQL_DATABASE}'.")
+
+            chunks, position = iter_new_chunks(csv_path, chunk_size, load_source_position(connection), use_snapshot)
+            total_rows, inserted, last_stop_at = load_chunks(connection, chunks, verb="new")
+            save_watermark(connection, last_stop_at, inserted, reset=False)
+            save_source_position(connection, position)
+            refresh_rollup(connection)
+            update_trigram_index(connection)
+            update_vehicle_profiles(connection)
+            bump_data_version(connection)
+            connection.commit()
+    except FileNotFoundError:
+        print(f"ERROR: '{csv_path}' not found. Please ensure the file is in the same directory.")
+        return
+    except Exception as e:
+        print(f"ERROR: Incremental append into '{TABLE_NAME}' failed.")
+        print(f"Reason: {e}")
+        return
+
+    elapsed = time.perf_counter() - start
+    print(f"SUCCESS: Appended {inserted} new rows ({total_rows - inserted} read were already stored) in {elapsed:.1f}s.")
+    print(f"--- Incremental Append Finished ---")
+
+def export_duckdb(csv_path=CSV_PATH, db_path=DUCKDB_PATH, period=STANDIN_PARTITION_PERIOD):
+    # Builds the embedded columnar copy straight from the cleaned Parquet
+    # snapshot, with the same rows, columns, derived columns and stop_id order
+    # as the MySQL table. With a period, the rows go into one table per period behind a
+    # traffic_stops view, the stand-in's version of MySQL's partitions.
+    import duckdb
+
+    print(f"--- Starting DuckDB Export ---")
+    start = time.perf_counter()
+    snapshot_file = snapshot_path(csv_path)
+    if not os.path.exists(snapshot_file):
+        for _ in iter_clean_chunks(csv_path):
+            pass
+    source_columns = ", ".join(TABLE_COLUMNS)
+    tmp_path = db_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    connection = duckdb.connect(tmp_path)
+    try:
+        target = f"TEMP TABLE {TABLE_NAME}_all" if period else f"TABLE {TABLE_NAME}"
+        # Sorting the combined rows by period first lets each period's copy skip
+        # the others' row groups.
+        order = f"date_trunc('{period}', stop_date), file_row" if period else "file_row"
+        connection.execute(f"""
+        CREATE {target} AS
+        WITH source AS (
+            SELECT {source_columns}, source_row AS file_row
+            FROM read_parquet('{snapshot_file}')
+        ), typed AS (
+            -- The snapshot stores stop_time as a duration in microseconds.
+            SELECT * REPLACE (
+                CAST(stop_date AS DATE) AS stop_date,
+                CAST(TIME '00:00:00' + to_microseconds(stop_time) AS TIME) AS stop_time
+            )
+            FROM source
+        )
+        SELECT
+            CAST(row_number() OVER (ORDER BY file_row) AS BIGINT) AS stop_id,
+            {source_columns},
+            CAST(year(stop_date) AS SMALLINT) AS stop_year,
+            CAST(month(stop_date) AS TINYINT) AS stop_month,
+            CAST(hour(stop_time) AS TINYINT) AS stop_hour,
+            CAST({duration_minutes_sql()} AS DECIMAL(4,1)) AS duration_minutes
+        FROM typed
+        ORDER BY {order};
+        """)
+        if period:
+            split_duckdb_periods(connection, f"{TABLE_NAME}_all", period)
+        build_standin_profiles(connection)
+        bump_standin_data_version(connection)
+        rows = connection.execute(f"SELECT COUNT(*) FROM {TABLE_NAME};").fetchone()[0]
+    finally:
+        connection.close()
+    os.replace(tmp_path, db_path)
+    print(f"SUCCESS: Exported {rows} rows to '{db_path}' in {time.perf_counter() - start:.1f}s.")
+    print(f"--- DuckDB Export Finished ---")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load traffic stop data into MySQL.")
+    parser.add_argument("--mode", choices=["full", "stream", "parallel", "reload", "incremental", "memory-report",
+                                           "schema-report", "duckdb"],
+                        default="full",
+                        help="'full' loads the whole CSV in memory; 'stream' loads it chunk by chunk with flat memory; "
+                             "'parallel' streams it with cleaning in worker processes and concurrent inserts; "
+                             "'reload' streams into a staging table and atomically swaps it in; "
+                             "'incremental' appends the rows added to the CSV since the last load; "
+                             "'memory-report' prints bytes per row before and after cleaning; "
+                             "'schema-report' compares table size and report latency with the legacy schema; "
+                             "'duckdb' exports the cleaned data to the embedded columnar database.")
+    parser.add_argument("--csv", default=CSV_PATH, help="Path to the traffic stops CSV file.")
+    parser.add_argument("--chunk-size", type=int, default=INGEST_CHUNK_SIZE,
+                        help="Rows per chunk in streaming mode.")
+    parser.add_argument("--workers", type=int, help="Worker processes in parallel mode (default: one per core).")
+    parser.add_argument("--inserters", type=int, default=PARALLEL_INSERTERS,
+                        help="Concurrent insert connections in parallel mode.")
+    parser.add_argument("--partition-period", choices=["month", "year", "none"], default=STANDIN_PARTITION_PERIOD,
+                        help="Period of the DuckDB stand-in's per-period tables in duckdb mode; 'none' keeps one table.")
+    parser.add_argument("--no-snapshot", action="store_true",
+                        help="Re-parse the CSV even if a cleaned Parquet snapshot for it exists.")
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
     print("--- Starting Data Processor Script ---")
+    # Every mode ends with exit(), so the timing summary runs at exit.
+    atexit.register(print_summary)
+
+    use_snapshot = not args.no_snapshot
+
+    if args.mode == "memory-report":
+        report_memory(args.csv, args.chunk_size)
+        exit()
+    if args.mode == "schema-report":
+        report_schema()
+        exit()
+    if args.mode == "duckdb":
+        export_duckdb(args.csv, period=None if args.partition_period == "none" else args.partition_period)
+        exit()
+    if args.mode == "stream":
+        stream_and_populate_db(args.csv, args.chunk_size, use_snapshot)
+        print("--- Data Processor Script Finished ---")
+        exit()
+    if args.mode == "parallel":
+        parallel_populate_db(args.csv, args.chunk_size, use_snapshot, args.workers, args.inserters)
+        print("--- Data Processor Script Finished ---")
+        exit()
+    if args.mode == "reload":
+        reload_db(args.csv, args.chunk_size, use_snapshot)
+        print("--- Data Processor Script Finished ---")
+        exit()
+    if args.mode == "incremental":
+        append_incremental(args.csv, args.chunk_size, use_snapshot)
+        print("--- Data Processor Script Finished ---")
+        exit()
+
     try:
-        df = pd.read_csv("traffic_stops.csv")
-        print("SUCCESS: Dataset 'traffic_stops.csv' loaded successfully.")
+        position = csv_source_position(args.csv)
+        if use_snapshot:
+            cleaned_df = load_clean_data(args.csv)
+        else:
+            df = pd.read_csv(args.csv)
+            print(f"SUCCESS: Dataset '{args.csv}' loaded successfully.")
+            print("Cleaning data...")
+            cleaned_df = clean_data(df.copy())
+        print("Data cleaning complete.")
     except FileNotFoundError:
-        print("ERROR: 'traffic_stops.csv' not found. Please ensure the file is in the same directory.")
+        print(f"ERROR: '{args.csv}' not found. Please ensure the file is in the same directory.")
         exit()
+    print(f"MEMORY: cleaned data uses {memory_per_row(cleaned_df):,.0f} bytes/row.")
 
-    print("Cleaning data...")
-    cleaned_df = clean_data(df.copy())
-    print("Data cleaning complete.")
-
-    create_and_populate_db(cleaned_df)
-    print("--- Data Processor Script Finished ---")
\ No newline at end of file
+    create_and_populate_db(cleaned_df, position)
+    print("--- Data Processor Script Finished ---")
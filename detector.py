@@ -1,148 +1,709 @@
 
-import pandas as pd
-from sqlalchemy import create_engine, text
-from datetime import datetime, timedelta
+from sqlalchemy import text
 
-MYSQL_USER = "root"
-MYSQL_PASSWORD = "venkat"
-MYSQL_HOST = "localhost"
-MYSQL_DATABASE = "cdta_db"
+import backend
+from instrumentation import caller_scope, print_summary
+from query_cache import bump_data_version
+from vehicle_profiles import create_profile_table, sync_flagged_since, sync_profile_flags
+import argparse
+import hashlib
+import time
+from datetime import datetime, timedelta
 
 TRAFFIC_STOPS_TABLE = "traffic_stops"
 FLAGGED_VEHICLES_TABLE = "flagged_vehicles"
+FLAG_ARCHIVE_TABLE = f"{FLAGGED_VEHICLES_TABLE}_archive"
+INGEST_WATERMARKS_TABLE = "ingest_watermarks"
+DETECTOR_STATE_TABLE = "detector_state"
+# Full mode's own row in detector_state: the last stop_id its 'new_stops'
+# rules looked at.
+FULL_STATE_KEY = f"{TRAFFIC_STOPS_TABLE}:full"
+DRIVER_STATE_TABLE = "detector_driver_state"
+VEHICLE_DAILY_STATE_TABLE = "detector_vehicle_daily"
+DRIVER_AGGREGATES_TABLE = "detector_driver_aggregates"
+NEW_STOP_AGGREGATES_TABLE = "detector_new_stop_aggregates"
+
+DRIVER_KEY_COLUMNS = ['vehicle_number', 'driver_gender', 'driver_race']
+# Resolved flags stay in flagged_vehicles this long, then move to the archive.
+FLAG_ARCHIVE_AFTER_DAYS = 7
+FLAG_ARCHIVE_BATCH = 5000
+FLAG_COLUMNS = ['flag_id', 'vehicle_number', 'rule_id', 'params_hash', 'flag_reason', 'flag_timestamp', 'resolved_at']
+# Flags written before rule ids existed are matched to their rule by reason.
+LEGACY_FLAG_REASONS = {
+    'speeding_30d': 'Multiple Speeding Violations%',
+    'drug_related_stop': 'Involved in Drug-Related Stop',
+    'high_arrest_rate': 'High Arrest Rate Driver%',
+}
+
+# Each rule is a set of measures (row predicates counted per group), a
+# threshold over those measures and the flag reason to write. 'key' picks the
+# grouping: 'driver' is (vehicle_number, driver_gender, driver_race) and
+# 'vehicle' is vehicle_number alone. 'scope' picks which stops are counted:
+# 'lifetime' counts every stop, 'window' only stops in the last 'window_days'
+# (vehicle-keyed rules only) and 'new_stops' only stops added since the
+# previous detector run. All active rules share one scan of traffic_stops in
+# full mode and one pass over the new stops in incremental mode. The optional
+# 'stream' entry restates the rule in Python for the streaming detector
+# (stream_detector.py), which evaluates stops one at a time in memory.
+DETECTION_RULES = [
+    {
+        'rule_id': 'speeding_30d',
+        'active': True,
+        'key': 'vehicle',
+        'scope': 'window',
+        'window_days': 30,
+        'measures': {
+            'speeding_stops': "violation = 'Speeding'",
+        },
+        'threshold': "speeding_stops > 2",
+        'reason': "CONCAT('Multiple Speeding Violations (', speeding_stops, ' in last 30 days)')",
+        'stream': {
+            'measures': {'speeding_stops': lambda stop: stop['violation'] == 'Speeding'},
+            'threshold': lambda m, stop: m['speeding_stops'] > 2,
+            'reason': lambda m, stop: f"Multiple Speeding Violations ({m['speeding_stops']} in last 30 days)",
+        },
+    },
+    {
+        'rule_id': 'drug_related_stop',
+        'active': True,
+        'key': 'vehicle',
+        'scope': 'new_stops',
+        'measures': {
+            'drug_stops': "drugs_related_stop = TRUE",
+        },
+        'threshold': "drug_stops > 0",
+        'reason': "'Involved in Drug-Related Stop'",
+        'stream': {
+            'measures': {'drug_stops': lambda stop: bool(stop['drugs_related_stop'])},
+            'threshold': lambda m, stop: m['drug_stops'] > 0,
+            'reason': lambda m, stop: "Involved in Drug-Related Stop",
+        },
+    },
+    {
+        'rule_id': 'high_arrest_rate',
+        'active': True,
+        'key': 'driver',
+        'scope': 'lifetime',
+        'measures': {
+            'driver_stops': "TRUE",
+            'driver_arrests': "is_arrested = TRUE",
+        },
+        'threshold': "driver_gender != 'Unknown' AND driver_race != 'Unknown' AND driver_arrests * 100.0 / driver_stops > 50",
+        'reason': "CONCAT('High Arrest Rate Driver (Race: ', driver_race, ', Gender: ', driver_gender, ')')",
+        'stream': {
+            'measures': {
+                'driver_stops': lambda stop: True,
+                'driver_arrests': lambda stop: bool(stop['is_arrested']),
+            },
+            'threshold': lambda m, stop: (
+                stop['driver_gender'] != 'Unknown' and stop['driver_race'] != 'Unknown'
+                and m['driver_arrests'] * 100.0 / m['driver_stops'] > 50
+            ),
+            'reason': lambda m, stop: f"High Arrest Rate Driver (Race: {stop['driver_race']}, Gender: {stop['driver_gender']})",
+        },
+    },
+]
 
 def get_db_connection():
-    db_connection_str = (
-        f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}/{MYSQL_DATABASE}"
-    )
-    engine = create_engine(db_connection_str)
-    return engine
+    # The detector maintains flags and state in MySQL whichever backend the
+    # dashboard reads from.
+    return backend.get_engine("mysql")
 
 def fetch_data(query, params=None):
-    engine = get_db_connection()
-    with engine.connect() as connection:
-        df = pd.read_sql(text(query), connection, params=params)
-    return df
+    return backend.fetch_data(query, params, "mysql")
 
 def execute_query(query, params=None):
-    engine = get_db_connection()
-    with engine.connect() as connection:
-        connection.execute(text(query), params)
-        connection.commit()
+    backend.execute_query(query, params, "mysql")
 
-def create_flagged_vehicles_table():
+def create_flagged_vehicles_table(connection, table_name=FLAGGED_VEHICLES_TABLE):
+    # active_rule_id is only set while a flag is unresolved, so the unique key
+    # allows one active flag per (vehicle, rule) and any number of resolved
+    # ones. params_hash identifies the rule definition that raised the flag.
     create_table_query = f"""
-    CREATE TABLE IF NOT EXISTS {FLAGGED_VEHICLES_TABLE} (
+    CREATE TABLE IF NOT EXISTS {table_name} (
         flag_id INT AUTO_INCREMENT PRIMARY KEY,
         vehicle_number VARCHAR(255) NOT NULL,
+        rule_id VARCHAR(64) NOT NULL,
+        params_hash CHAR(16) NOT NULL,
         flag_reason TEXT,
         flag_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
         resolved BOOLEAN DEFAULT FALSE,
-        INDEX(vehicle_number)
+        resolved_at DATETIME NULL,
+        active_rule_id VARCHAR(64) AS (IF(resolved, NULL, rule_id)) STORED,
+        INDEX(vehicle_number),
+        INDEX idx_resolved_timestamp (resolved, flag_timestamp),
+        UNIQUE KEY uq_active_flag (vehicle_number, active_rule_id)
     );
     """
-    try:
-        execute_query(create_table_query)
-    except Exception as e:
-        pass 
-
-def run_detection_rules():
-    create_flagged_vehicles_table()
-
-    last_flag_time_query = f"SELECT MAX(flag_timestamp) FROM {FLAGGED_VEHICLES_TABLE};"
-    last_flag_time_df = fetch_data(last_flag_time_query)
-    last_flag_time = last_flag_time_df.iloc[0,0] if not last_flag_time_df.empty and last_flag_time_df.iloc[0,0] is not None else (datetime.now() - timedelta(days=365))
-
-    speeding_query = f"""
-    SELECT
-        ts.vehicle_number,
-        COUNT(*) as violation_count
-    FROM {TRAFFIC_STOPS_TABLE} ts
-    WHERE
-        ts.violation = 'Speeding' AND ts.vehicle_number != 'Unknown'
-        AND ts.stop_date >= :time_window_30_days
-    GROUP BY ts.vehicle_number
-    HAVING COUNT(*) > 2;
+    connection.execute(text(create_table_query))
+    ensure_flag_rule_key(connection, table_name)
+    if table_name == FLAGGED_VEHICLES_TABLE:
+        create_flag_archive_table(connection)
+        # Flag writers keep the vehicle profiles' flag columns in step.
+        create_profile_table(connection)
+
+def create_flag_archive_table(connection, table_name=FLAG_ARCHIVE_TABLE):
+    connection.execute(text(f"""
+    CREATE TABLE IF NOT EXISTS {table_name} (
+        flag_id INT PRIMARY KEY,
+        vehicle_number VARCHAR(255) NOT NULL,
+        rule_id VARCHAR(64) NOT NULL,
+        params_hash CHAR(16) NOT NULL,
+        flag_reason TEXT,
+        flag_timestamp DATETIME,
+        resolved_at DATETIME,
+        archived_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        INDEX(vehicle_number),
+        INDEX idx_flag_timestamp (flag_timestamp)
+    );
+    """))
+
+def flag_columns(connection, table_name):
+    return {row[0] for row in connection.execute(text("""
+        SELECT COLUMN_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table_name;
+    """), {'table_name': table_name})}
+
+def ensure_flag_rule_key(connection, table_name=FLAGGED_VEHICLES_TABLE):
+    columns = flag_columns(connection, table_name)
+    if 'active_rule_id' in columns:
+        return
+
+    # Tables from before rule ids: the rule is recovered from the reason text.
+    if 'rule_id' not in columns:
+        connection.execute(text(f"""
+            ALTER TABLE {table_name}
+            ADD COLUMN rule_id VARCHAR(64) NOT NULL DEFAULT '' AFTER vehicle_number,
+            ADD COLUMN params_hash CHAR(16) NOT NULL DEFAULT '' AFTER rule_id,
+            ADD COLUMN resolved_at DATETIME NULL AFTER resolved;
+        """))
+        cases = " ".join(f"WHEN flag_reason LIKE '{pattern}' THEN '{rule_id}'"
+                         for rule_id, pattern in LEGACY_FLAG_REASONS.items())
+        connection.execute(text(f"UPDATE {table_name} SET rule_id = CASE {cases} ELSE 'legacy' END;"))
+
+    # Only one active flag per (vehicle, rule) may remain; keep the oldest.
+    connection.execute(text(f"""
+        UPDATE {table_name} fv
+        JOIN (
+            SELECT vehicle_number, rule_id, MIN(flag_id) AS keep_id
+            FROM {table_name}
+            WHERE resolved = FALSE
+            GROUP BY vehicle_number, rule_id
+            HAVING COUNT(*) > 1
+        ) dup ON dup.vehicle_number = fv.vehicle_number AND dup.rule_id = fv.rule_id
+        SET fv.resolved = TRUE, fv.resolved_at = NOW()
+        WHERE fv.resolved = FALSE AND fv.flag_id <> dup.keep_id;
+    """))
+    drop_old_key = "DROP INDEX uq_active_flag, DROP COLUMN active_flag_key," if 'active_flag_key' in columns else ""
+    connection.execute(text(f"""
+        ALTER TABLE {table_name}
+        {drop_old_key}
+        ADD COLUMN active_rule_id VARCHAR(64) AS (IF(resolved, NULL, rule_id)) STORED,
+        ADD INDEX idx_resolved_timestamp (resolved, flag_timestamp),
+        ADD UNIQUE KEY uq_active_flag (vehicle_number, active_rule_id);
+    """))
+
+def rule_params_hash(rule):
+    # Changes whenever the rule's SQL definition does, so flags raised under
+    # different thresholds or windows can be told apart.
+    definition = {key: rule[key] for key in ('key', 'scope', 'window_days', 'measures', 'threshold', 'reason') if key in rule}
+    return hashlib.sha1(repr(sorted(definition.items())).encode()).hexdigest()[:16]
+
+def insert_flags(connection, rule, candidates_query, params=None):
+    # candidates_query yields (vehicle_number, flag_reason), possibly several
+    # rows per vehicle for driver-keyed rules; each vehicle gets one flag. The
+    # anti-join on uq_active_flag skips vehicles already holding an active
+    # flag for the rule, and INSERT IGNORE covers a concurrent writer.
+    insert_flags_query = f"""
+    INSERT IGNORE INTO {FLAGGED_VEHICLES_TABLE} (vehicle_number, rule_id, params_hash, flag_reason)
+    SELECT c.vehicle_number, :flag_rule_id, :flag_params_hash, MIN(c.flag_reason)
+    FROM ({candidates_query}) AS c
+    LEFT JOIN {FLAGGED_VEHICLES_TABLE} fv
+        ON fv.vehicle_number = c.vehicle_number AND fv.active_rule_id = :flag_rule_id
+    WHERE fv.flag_id IS NULL
+    GROUP BY c.vehicle_number;
     """
-    time_window_30_days = datetime.now() - timedelta(days=30)
-    speeding_flags_df = fetch_data(speeding_query, {'time_window_30_days': time_window_30_days})
-
-    for index, row in speeding_flags_df.iterrows():
-        vehicle = row['vehicle_number']
-        reason = f"Multiple Speeding Violations ({row['violation_count']} in last 30 days)"
-        
-        check_existing_flag_query = f"""
-        SELECT COUNT(*) FROM {FLAGGED_VEHICLES_TABLE}
-        WHERE vehicle_number = :vehicle_num AND flag_reason = :reason_text AND resolved = FALSE;
-        """
-        existing_flags_df = fetch_data(check_existing_flag_query, {'vehicle_num': vehicle, 'reason_text': reason})
-        if existing_flags_df.iloc[0,0] == 0:
-            insert_flag_query = f"""
-            INSERT INTO {FLAGGED_VEHICLES_TABLE} (vehicle_number, flag_reason)
-            VALUES (:vehicle_num, :reason_text);
-            """
-            execute_query(insert_flag_query, {'vehicle_num': vehicle, 'reason_text': reason})
-        else:
-            pass 
-
-    drug_stop_query = f"""
-    SELECT DISTINCT ts.vehicle_number
-    FROM {TRAFFIC_STOPS_TABLE} ts
-    WHERE ts.drugs_related_stop = TRUE AND ts.vehicle_number != 'Unknown'
-    AND ts.stop_date >= :last_flag_date;
+    flag_params = dict(params or {}, flag_rule_id=rule['rule_id'], flag_params_hash=rule_params_hash(rule))
+    result = connection.execute(text(insert_flags_query), flag_params)
+    return result.rowcount
+
+def resolve_flags(connection, flag_ids=None, where=None, params=None, table_name=FLAGGED_VEHICLES_TABLE):
+    # One UPDATE for any number of flags: the listed ids, or every active flag
+    # matching where. The plates' vehicle profiles drop the resolved flags.
+    # Returns the number resolved; the caller commits.
+    if flag_ids is not None:
+        ids = sorted({int(flag_id) for flag_id in flag_ids})
+        if not ids:
+            return 0
+        condition = f"flag_id IN ({', '.join(str(flag_id) for flag_id in ids)})"
+    elif where:
+        condition = where
+    else:
+        raise ValueError("Pass flag ids or a filter to resolve.")
+    plates = [row[0] for row in connection.execute(text(f"""
+        SELECT DISTINCT vehicle_number FROM {table_name} WHERE resolved = FALSE AND ({condition});
+    """), params or {})]
+    result = connection.execute(text(f"""
+        UPDATE {table_name} SET resolved = TRUE, resolved_at = NOW()
+        WHERE resolved = FALSE AND ({condition});
+    """), params or {})
+    if result.rowcount:
+        if table_name == FLAGGED_VEHICLES_TABLE:
+            sync_profile_flags(connection, plates)
+        bump_data_version(connection)
+    return result.rowcount
+
+def archive_resolved_flags(connection, older_than_days=FLAG_ARCHIVE_AFTER_DAYS, batch_size=FLAG_ARCHIVE_BATCH):
+    # Moves flags resolved more than older_than_days ago to the archive in
+    # batches, each its own transaction, so the live table only holds open
+    # and recently resolved flags.
+    create_flagged_vehicles_table(connection)
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+    columns = ", ".join(FLAG_COLUMNS)
+    archived = 0
+    while True:
+        ids = [row[0] for row in connection.execute(text(f"""
+            SELECT flag_id FROM {FLAGGED_VEHICLES_TABLE}
+            WHERE resolved = TRUE AND COALESCE(resolved_at, flag_timestamp) < :cutoff
+            ORDER BY flag_id LIMIT {int(batch_size)};
+        """), {'cutoff': cutoff})]
+        if not ids:
+            break
+        id_list = ", ".join(str(int(flag_id)) for flag_id in ids)
+        connection.execute(text(f"""
+            INSERT IGNORE INTO {FLAG_ARCHIVE_TABLE} ({columns})
+            SELECT {columns} FROM {FLAGGED_VEHICLES_TABLE} WHERE flag_id IN ({id_list});
+        """))
+        connection.execute(text(f"DELETE FROM {FLAGGED_VEHICLES_TABLE} WHERE flag_id IN ({id_list});"))
+        connection.commit()
+        archived += len(ids)
+    if archived:
+        bump_data_version(connection)
+        connection.commit()
+    print(f"Archived {archived} flags resolved before {cutoff:%Y-%m-%d %H:%M}.")
+    return archived
+
+def active_rules(rule_ids=None):
+    return [
+        rule for rule in DETECTION_RULES
+        if rule['active'] and (rule_ids is None or rule['rule_id'] in rule_ids)
+    ]
+
+def collect_measures(rules, scope=None):
+    measures = {}
+    for rule in rules:
+        if scope is not None and rule['scope'] != scope:
+            continue
+        for name, predicate in rule['measures'].items():
+            if measures.setdefault(name, predicate) != predicate:
+                raise ValueError(f"Measure '{name}' is defined differently by two rules.")
+    return measures
+
+def count_when(predicate):
+    return f"SUM(CASE WHEN {predicate} THEN 1 ELSE 0 END)"
+
+def window_param(rule):
+    return f"window_start_{rule['window_days']}d"
+
+def rule_params(rules, last_stop_id, max_stop_id, new_stops_after=None):
+    now = datetime.now()
+    params = {
+        'last_stop_id': last_stop_id,
+        'max_stop_id': max_stop_id,
+        'new_stops_after': last_stop_id if new_stops_after is None else new_stops_after,
+    }
+    for rule in rules:
+        if rule['scope'] == 'window':
+            params[window_param(rule)] = now - timedelta(days=rule['window_days'])
+    return params
+
+def oldest_window_start(rules, params):
+    window_starts = [params[window_param(rule)] for rule in rules if rule['scope'] == 'window']
+    return min(window_starts) if window_starts else None
+
+def keyed_source(rule, table_name, measure_columns):
+    # measure_columns maps each of the rule's measures to the column (or
+    # expression) holding its per-driver count in table_name.
+    if rule['key'] == 'driver':
+        columns = ", ".join(f"{column} AS {name}" for name, column in measure_columns.items())
+        return f"SELECT {', '.join(DRIVER_KEY_COLUMNS)}, {columns} FROM {table_name}"
+    columns = ", ".join(f"SUM({column}) AS {name}" for name, column in measure_columns.items())
+    return f"SELECT vehicle_number, {columns} FROM {table_name} GROUP BY vehicle_number"
+
+def rule_candidates_query(rule, source_query):
+    return f"""
+    SELECT vehicle_number, {rule['reason']} AS flag_reason
+    FROM ({source_query}) AS src
+    WHERE {rule['threshold']}
     """
-    drug_stop_flags_df = fetch_data(drug_stop_query, {'last_flag_date': last_flag_time.date()})
-
-    for index, row in drug_stop_flags_df.iterrows():
-        vehicle = row['vehicle_number']
-        reason = "Involved in Drug-Related Stop"
-
-        check_existing_flag_query = f"""
-        SELECT COUNT(*) FROM {FLAGGED_VEHICLES_TABLE}
-        WHERE vehicle_number = :vehicle_num AND flag_reason = :reason_text AND resolved = FALSE;
-        """
-        existing_flags_df = fetch_data(check_existing_flag_query, {'vehicle_num': vehicle, 'reason_text': reason})
-        if existing_flags_df.iloc[0,0] == 0:
-            insert_flag_query = f"""
-            INSERT INTO {FLAGGED_VEHICLES_TABLE} (vehicle_number, flag_reason)
-            VALUES (:vehicle_num, :reason_text);
-            """
-            execute_query(insert_flag_query, {'vehicle_num': vehicle, 'reason_text': reason})
-        else:
-            pass 
-
-    high_arrest_driver_query = f"""
-    SELECT
-        ts.vehicle_number,
-        ts.driver_gender,
-        ts.driver_race,
-        (SUM(CASE WHEN ts.is_arrested = TRUE THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) AS arrest_rate_percentage
-    FROM {TRAFFIC_STOPS_TABLE} ts
-    WHERE ts.vehicle_number != 'Unknown' AND ts.driver_gender != 'Unknown' AND ts.driver_race != 'Unknown'
-    GROUP BY ts.vehicle_number, ts.driver_gender, ts.driver_race
-    HAVING arrest_rate_percentage > 50;
+
+def validate_rules(rules):
+    for rule in rules:
+        if rule['scope'] == 'window' and rule['key'] != 'vehicle':
+            raise ValueError(f"Rule '{rule['rule_id']}': window rules must be keyed by vehicle.")
+        if rule['scope'] not in ('lifetime', 'window', 'new_stops'):
+            raise ValueError(f"Rule '{rule['rule_id']}': unknown scope '{rule['scope']}'.")
+
+# --- Full recompute: one grouped scan of traffic_stops -----------------------
+
+def full_scan_column(rule, name):
+    if rule['scope'] == 'window':
+        return f"w{rule['window_days']}_{name}"
+    return f"{rule['scope']}_{name}"
+
+def full_scan_predicate(rule, predicate):
+    if rule['scope'] == 'window':
+        return f"({predicate}) AND stop_date >= :{window_param(rule)}"
+    if rule['scope'] == 'new_stops':
+        return f"({predicate}) AND stop_id > :new_stops_after"
+    return predicate
+
+def full_aggregates_query(rules):
+    collect_measures(rules)
+    columns = {}
+    for rule in rules:
+        for name, predicate in rule['measures'].items():
+            columns[full_scan_column(rule, name)] = count_when(full_scan_predicate(rule, predicate))
+    measure_columns = ",\n            ".join(f"{expression} AS {column}" for column, expression in columns.items())
+    return f"""
+        SELECT
+            {', '.join(DRIVER_KEY_COLUMNS)},
+            {measure_columns}
+        FROM {TRAFFIC_STOPS_TABLE}
+        WHERE vehicle_number != 'Unknown' AND stop_id <= :max_stop_id
+        GROUP BY {', '.join(DRIVER_KEY_COLUMNS)}
     """
-    high_arrest_flags_df = fetch_data(high_arrest_driver_query)
-
-    for index, row in high_arrest_flags_df.iterrows():
-        vehicle = row['vehicle_number']
-        reason = f"High Arrest Rate Driver (Race: {row['driver_race']}, Gender: {row['driver_gender']})"
-        
-        check_existing_flag_query = f"""
-        SELECT COUNT(*) FROM {FLAGGED_VEHICLES_TABLE}
-        WHERE vehicle_number = :vehicle_num AND flag_reason = :reason_text AND resolved = FALSE;
-        """
-        existing_flags_df = fetch_data(check_existing_flag_query, {'vehicle_num': vehicle, 'reason_text': reason})
-        if existing_flags_df.iloc[0,0] == 0:
-            insert_flag_query = f"""
-            INSERT INTO {FLAGGED_VEHICLES_TABLE} (vehicle_number, flag_reason)
-            VALUES (:vehicle_num, :reason_text);
-            """
-            execute_query(insert_flag_query, {'vehicle_num': vehicle, 'reason_text': reason})
-        else:
-            pass 
+
+def build_full_aggregates(connection, rules, params):
+    connection.execute(text(f"DROP TEMPORARY TABLE IF EXISTS {DRIVER_AGGREGATES_TABLE};"))
+    connection.execute(text(f"CREATE TEMPORARY TABLE {DRIVER_AGGREGATES_TABLE} AS {full_aggregates_query(rules)};"), params)
+
+def full_candidates_query(rule):
+    measure_columns = {name: full_scan_column(rule, name) for name in rule['measures']}
+    return rule_candidates_query(rule, keyed_source(rule, DRIVER_AGGREGATES_TABLE, measure_columns))
+
+# --- Incremental: persistent per-vehicle state plus the new stops ------------
+
+def rules_signature(rules):
+    # State columns depend on the lifetime and window measures; any change to
+    # them means the stored state no longer matches and must be rebuilt.
+    stateful = sorted(
+        (rule['scope'], name, predicate)
+        for rule in rules if rule['scope'] in ('lifetime', 'window')
+        for name, predicate in rule['measures'].items()
+    )
+    max_window = max([rule['window_days'] for rule in rules if rule['scope'] == 'window'], default=0)
+    return hashlib.sha1(repr((stateful, max_window)).encode()).hexdigest()
+
+def create_detector_state_table(connection):
+    connection.execute(text(f"""
+    CREATE TABLE IF NOT EXISTS {DETECTOR_STATE_TABLE} (
+        state_key VARCHAR(64) PRIMARY KEY,
+        last_stop_id BIGINT NOT NULL DEFAULT 0,
+        load_generation BIGINT NOT NULL DEFAULT 0,
+        rules_signature CHAR(40),
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    );
+    """))
+
+def load_detector_state(connection, state_key=TRAFFIC_STOPS_TABLE):
+    return connection.execute(text(f"""
+        SELECT last_stop_id, load_generation, rules_signature
+        FROM {DETECTOR_STATE_TABLE} WHERE state_key = :state_key;
+    """), {'state_key': state_key}).first()
+
+def save_detector_state(connection, last_stop_id, load_generation, signature, state_key=TRAFFIC_STOPS_TABLE):
+    connection.execute(text(f"""
+        INSERT INTO {DETECTOR_STATE_TABLE} (state_key, last_stop_id, load_generation, rules_signature)
+        VALUES (:state_key, :last_stop_id, :load_generation, :rules_signature)
+        ON DUPLICATE KEY UPDATE
+            last_stop_id = VALUES(last_stop_id),
+            load_generation = VALUES(load_generation),
+            rules_signature = VALUES(rules_signature);
+    """), {
+        'state_key': state_key,
+        'last_stop_id': last_stop_id,
+        'load_generation': load_generation,
+        'rules_signature': signature,
+    })
+
+def current_load_generation(connection):
+    table_exists = connection.execute(text("""
+        SELECT COUNT(*) FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table_name;
+    """), {'table_name': INGEST_WATERMARKS_TABLE}).scalar()
+    if not table_exists:
+        return 0
+    generation = connection.execute(text(f"""
+        SELECT load_generation FROM {INGEST_WATERMARKS_TABLE} WHERE table_name = :table_name;
+    """), {'table_name': TRAFFIC_STOPS_TABLE}).scalar()
+    return generation or 0
+
+def reset_detector_state(connection, rules):
+    lifetime_columns = "".join(
+        f"{name} BIGINT NOT NULL DEFAULT 0,\n            " for name in collect_measures(rules, 'lifetime')
+    )
+    window_columns = "".join(
+        f"{name} BIGINT NOT NULL DEFAULT 0,\n            " for name in collect_measures(rules, 'window')
+    )
+    connection.execute(text(f"DROP TABLE IF EXISTS {DRIVER_STATE_TABLE}, {VEHICLE_DAILY_STATE_TABLE};"))
+    connection.execute(text(f"""
+        CREATE TABLE {DRIVER_STATE_TABLE} (
+            vehicle_number VARCHAR(255) NOT NULL,
+            driver_gender VARCHAR(50) NOT NULL,
+            driver_race VARCHAR(50) NOT NULL,
+            {lifetime_columns}PRIMARY KEY (vehicle_number, driver_gender, driver_race)
+        );
+    """))
+    connection.execute(text(f"""
+        CREATE TABLE {VEHICLE_DAILY_STATE_TABLE} (
+            vehicle_number VARCHAR(255) NOT NULL,
+            stop_date DATE NOT NULL,
+            {window_columns}PRIMARY KEY (vehicle_number, stop_date),
+            INDEX idx_stop_date (stop_date)
+        );
+    """))
+    connection.execute(text(f"DELETE FROM {DETECTOR_STATE_TABLE} WHERE state_key = :state_key;"),
+                       {'state_key': TRAFFIC_STOPS_TABLE})
+    print("Detector state reset; the next pass rebuilds it from every stop.")
+
+def new_stops_after(marks, load_generation):
+    # 'new_stops' rules look only at stops that no earlier run of either mode
+    # has looked at, so a resolved flag is not raised again by the other mode.
+    # marks are (last_stop_id, load_generation) pairs; one from before a full
+    # load no longer means anything, as stop ids were reassigned.
+    return max([last_stop_id for last_stop_id, generation in marks if generation == load_generation], default=0)
+
+def new_stops_filter(after='last_stop_id'):
+    return f"stop_id > :{after} AND stop_id <= :max_stop_id AND vehicle_number != 'Unknown'"
+
+def upsert_measures(connection, table_name, key_columns, measures, where_clause, params, having=None):
+    if not measures:
+        return 0
+    insert_columns = ", ".join(key_columns + list(measures))
+    select_columns = ", ".join(key_columns + [count_when(predicate) for predicate in measures.values()])
+    updates = ", ".join(f"{name} = {name} + VALUES({name})" for name in measures)
+    having_clause = f"HAVING {having}" if having else ""
+    result = connection.execute(text(f"""
+        INSERT INTO {table_name} ({insert_columns})
+        SELECT {select_columns}
+        FROM {TRAFFIC_STOPS_TABLE}
+        WHERE {where_clause}
+        GROUP BY {', '.join(key_columns)}
+        {having_clause}
+        ON DUPLICATE KEY UPDATE {updates};
+    """), params)
+    return result.rowcount
+
+def update_detector_state(connection, rules, params):
+    upsert_measures(
+        connection, DRIVER_STATE_TABLE, DRIVER_KEY_COLUMNS,
+        collect_measures(rules, 'lifetime'), new_stops_filter(), params,
+    )
+
+    window_measures = collect_measures(rules, 'window')
+    window_start = oldest_window_start(rules, params)
+    if window_measures:
+        # Only days that still fall inside the longest window and hold at least
+        # one counted stop are kept, so this table stays small.
+        day_params = dict(params, oldest_window_start=window_start)
+        upsert_measures(
+            connection, VEHICLE_DAILY_STATE_TABLE, ['vehicle_number', 'stop_date'],
+            window_measures, f"{new_stops_filter()} AND stop_date >= :oldest_window_start", day_params,
+            having=" OR ".join(f"{count_when(predicate)} > 0" for predicate in window_measures.values()),
+        )
+        connection.execute(text(f"DELETE FROM {VEHICLE_DAILY_STATE_TABLE} WHERE stop_date < :oldest_window_start;"),
+                           {'oldest_window_start': window_start})
+
+    new_stop_measures = collect_measures(rules, 'new_stops')
+    if new_stop_measures:
+        measure_columns = ",\n            ".join(
+            f"{count_when(predicate)} AS {name}" for name, predicate in new_stop_measures.items()
+        )
+        connection.execute(text(f"DROP TEMPORARY TABLE IF EXISTS {NEW_STOP_AGGREGATES_TABLE};"))
+        connection.execute(text(f"""
+            CREATE TEMPORARY TABLE {NEW_STOP_AGGREGATES_TABLE} AS
+            SELECT
+                {', '.join(DRIVER_KEY_COLUMNS)},
+                {measure_columns}
+            FROM {TRAFFIC_STOPS_TABLE}
+            WHERE {new_stops_filter('new_stops_after')}
+            GROUP BY {', '.join(DRIVER_KEY_COLUMNS)};
+        """), params)
+
+def incremental_candidates_query(rule):
+    if rule['scope'] == 'lifetime':
+        source = keyed_source(rule, DRIVER_STATE_TABLE, {name: name for name in rule['measures']})
+    elif rule['scope'] == 'new_stops':
+        source = keyed_source(rule, NEW_STOP_AGGREGATES_TABLE, {name: name for name in rule['measures']})
+    else:
+        window_columns = ", ".join(
+            f"SUM(CASE WHEN stop_date >= :{window_param(rule)} THEN {name} ELSE 0 END) AS {name}"
+            for name in rule['measures']
+        )
+        source = f"SELECT vehicle_number, {window_columns} FROM {VEHICLE_DAILY_STATE_TABLE} GROUP BY vehicle_number"
+    return rule_candidates_query(rule, source)
+
+# --- Runs --------------------------------------------------------------------
+
+def apply_rules(connection, rules, candidates_query_for, params):
+    rule_stats = {}
+    for rule in rules:
+        rule_start = time.perf_counter()
+        candidates_query = candidates_query_for(rule)
+        with caller_scope(f"detector:{rule['rule_id']}"):
+            hits = connection.execute(text(f"SELECT COUNT(*) FROM ({candidates_query}) AS hits;"), params).scalar()
+            new_flags = insert_flags(connection, rule, candidates_query, params)
+        rule_stats[rule['rule_id']] = {
+            'hits': hits,
+            'new_flags': new_flags,
+            'seconds': time.perf_counter() - rule_start,
+        }
+        print(f"Rule '{rule['rule_id']}': {hits} hits, {new_flags} new flags in {rule_stats[rule['rule_id']]['seconds']:.3f}s.")
+    return rule_stats
+
+def prepare_run(connection, rules):
+    validate_rules(rules)
+    create_flagged_vehicles_table(connection)
+    create_detector_state_table(connection)
+    max_stop_id = connection.execute(text(f"SELECT COALESCE(MAX(stop_id), 0) FROM {TRAFFIC_STOPS_TABLE};")).scalar()
+    state = load_detector_state(connection)
+    return state, max_stop_id
+
+def stop_marks(connection, state):
+    # The incremental state's mark (state may be None) and full mode's.
+    marks = [(state.last_stop_id, state.load_generation)] if state is not None else []
+    full_state = load_detector_state(connection, FULL_STATE_KEY)
+    if full_state is not None:
+        marks.append((full_state.last_stop_id, full_state.load_generation))
+    return marks
+
+def run_detection_rules(rule_ids=None):
+    # Full recompute straight from traffic_stops. 'new_stops' rules look past
+    # both modes' marks, and full mode advances only its own, never the
+    # incremental watermark or per-vehicle state, so it can run alongside
+    # incremental mode.
+    engine = get_db_connection()
+    rules = active_rules(rule_ids)
+
+    with engine.begin() as connection:
+        state, max_stop_id = prepare_run(connection, rules)
+        load_generation = current_load_generation(connection)
+        last_stop_id = new_stops_after(stop_marks(connection, state), load_generation)
+        params = rule_params(rules, last_stop_id, max_stop_id)
+
+        scan_start = time.perf_counter()
+        build_full_aggregates(connection, rules, params)
+        print(f"Scanned {TRAFFIC_STOPS_TABLE} once for {len(rules)} rules in {time.perf_counter() - scan_start:.2f}s.")
+
+        flags_since = connection.execute(text("SELECT NOW();")).scalar()
+        rule_stats = apply_rules(connection, rules, full_candidates_query, params)
+        if any(rule['scope'] == 'new_stops' for rule in rules):
+            save_detector_state(connection, max_stop_id, load_generation, rules_signature(rules), FULL_STATE_KEY)
+        if any(stats['new_flags'] for stats in rule_stats.values()):
+            sync_flagged_since(connection, flags_since)
+            bump_data_version(connection)
+
+    return rule_stats
+
+def advance_detector_state(connection, rules, state, max_stop_id):
+    signature = rules_signature(rules)
+    load_generation = current_load_generation(connection)
+    last_stop_id = state.last_stop_id if state is not None else 0
+    if (
+        state is None
+        or state.load_generation != load_generation
+        or state.rules_signature != signature
+        or last_stop_id > max_stop_id
+    ):
+        reset_detector_state(connection, rules)
+        last_stop_id = 0
+
+    marks = [(last_stop_id, load_generation)] + stop_marks(connection, None)
+    params = rule_params(rules, last_stop_id, max_stop_id, new_stops_after(marks, load_generation))
+    update_start = time.perf_counter()
+    update_detector_state(connection, rules, params)
+    print(f"Processed stops {last_stop_id + 1}..{max_stop_id} into detector state in {time.perf_counter() - update_start:.2f}s.")
+    return params, load_generation, signature
+
+def run_incremental_detection(rule_ids=None):
+    engine = get_db_connection()
+    rules = active_rules(rule_ids)
+
+    with engine.begin() as connection:
+        state, max_stop_id = prepare_run(connection, rules)
+        params, load_generation, signature = advance_detector_state(connection, rules, state, max_stop_id)
+        flags_since = connection.execute(text("SELECT NOW();")).scalar()
+        rule_stats = apply_rules(connection, rules, incremental_candidates_query, params)
+        save_detector_state(connection, max_stop_id, load_generation, signature)
+        if any(stats['new_flags'] for stats in rule_stats.values()):
+            sync_flagged_since(connection, flags_since)
+            bump_data_version(connection)
+
+    return rule_stats
+
+def candidate_set(connection, candidates_query, params):
+    rows = connection.execute(text(candidates_query), params)
+    return {(row.vehicle_number, row.flag_reason) for row in rows}
+
+def verify_incremental_detection(rule_ids=None):
+    # Applies the pending state update, compares every rule's candidates with a
+    # full recompute and rolls everything back.
+    engine = get_db_connection()
+    rules = active_rules(rule_ids)
+    mismatched_rules = []
+
+    with engine.connect() as connection:
+        state, max_stop_id = prepare_run(connection, rules)
+        connection.commit()
+        params, _, _ = advance_detector_state(connection, rules, state, max_stop_id)
+        build_full_aggregates(connection, rules, params)
+
+        for rule in rules:
+            with caller_scope(f"detector:{rule['rule_id']}"):
+                incremental = candidate_set(connection, incremental_candidates_query(rule), params)
+                full = candidate_set(connection, full_candidates_query(rule), params)
+            if incremental == full:
+                print(f"Rule '{rule['rule_id']}': OK ({len(full)} candidates).")
+            else:
+                mismatched_rules.append(rule['rule_id'])
+                print(f"Rule '{rule['rule_id']}': MISMATCH - {len(incremental - full)} only incremental, "
+                      f"{len(full - incremental)} only full recompute.")
+        connection.rollback()
+
+    return not mismatched_rules
+
+def archive_flags(older_than_days=FLAG_ARCHIVE_AFTER_DAYS):
+    with get_db_connection().connect() as connection:
+        return archive_resolved_flags(connection, older_than_days)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Flag high-risk vehicles from traffic stop data.")
+    parser.add_argument("--mode", choices=["incremental", "full", "verify", "archive-flags"], default="incremental",
+                        help="'incremental' reads only stops added since the last run; 'full' recomputes every rule "
+                             "from traffic_stops; 'verify' checks the incremental state against a full recompute; "
+                             "'archive-flags' only moves old resolved flags to the archive. "
+                             "Incremental and full runs archive too.")
+    parser.add_argument("--rules", help="Comma-separated rule ids to run (default: all active rules).")
+    parser.add_argument("--archive-after-days", type=float, default=FLAG_ARCHIVE_AFTER_DAYS,
+                        help="Days a resolved flag stays in flagged_vehicles before it is archived.")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    run_detection_rules()
-    
-    print("--- Detector Script Finished ---")
\ No newline at end of file
+    args = parse_args()
+    rule_ids = set(args.rules.split(",")) if args.rules else None
+
+    if args.mode == "full":
+        run_detection_rules(rule_ids)
+        archive_flags(args.archive_after_days)
+    elif args.mode == "verify":
+        if not verify_incremental_detection(rule_ids):
+            print("VERIFICATION FAILED: incremental state differs from a full recompute.")
+    elif args.mode == "archive-flags":
+        archive_flags(args.archive_after_days)
+    else:
+        run_incremental_detection(rule_ids)
+        archive_flags(args.archive_after_days)
+
+    print_summary()
+    print("--- Detector Script Finished ---")
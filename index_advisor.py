@@ -0,0 +1,374 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import create_engine, event, text
+
+TRAFFIC_STOPS_TABLE = "traffic_stops"
+WORKLOAD_LOG_ENV = "SECURECHECK_WORKLOAD_LOG"
+WORKLOAD_LOG = "workload.jsonl"
+STANDIN_DB = "traffic_stops_standin.sqlite"
+STANDIN_ROWS = 500000
+STATS_SAMPLE_ROWS = 100000
+MAX_INDEX_COLUMNS = 6
+LOW_CARDINALITY_LIMIT = 3
+BENCHMARK_REPEATS = 3
+
+STOP_COLUMNS = [
+    'stop_id', 'stop_date', 'stop_time', 'country_name', 'driver_gender', 'driver_age_raw',
+    'driver_age', 'driver_race', 'violation_raw', 'violation', 'search_conducted',
+    'search_type', 'stop_outcome', 'is_arrested', 'stop_duration',
+    'drugs_related_stop', 'vehicle_number', 'stop_year', 'stop_month', 'stop_hour', 'duration_minutes'
+]
+
+_COLUMN_PATTERN = "|".join(sorted(STOP_COLUMNS, key=len, reverse=True))
+_EQUALITY = re.compile(rf"\b({_COLUMN_PATTERN})\s*(?:=|\bin\s*\()", re.IGNORECASE)
+_RANGE = re.compile(rf"\b({_COLUMN_PATTERN})\s*(?:\bbetween\b|<=|>=|<|>)", re.IGNORECASE)
+_COLUMN = re.compile(rf"\b({_COLUMN_PATTERN})\b", re.IGNORECASE)
+_CLAUSE_END = r"(?=\bgroup\s+by\b|\border\s+by\b|\blimit\b|\bhaving\b|\bunion\b|\)\s*\w*\s*$|;|$)"
+
+_log_lock = threading.Lock()
+
+def record_statement(conn, cursor, statement, parameters, context, executemany):
+    # SQLAlchemy before_cursor_execute hook. Only reads of traffic_stops are
+    # worth advising on, so bulk inserts and catalog queries are skipped.
+    path = os.environ.get(WORKLOAD_LOG_ENV)
+    lowered = statement.lower()
+    if not path or executemany or TRAFFIC_STOPS_TABLE not in lowered or "select" not in lowered:
+        return
+    if "information_schema" in lowered:
+        return
+    entry = {
+        'ts': datetime.now().isoformat(timespec="seconds"),
+        'dialect': conn.dialect.name,
+        'statement': statement,
+        'params': parameters if isinstance(parameters, dict) else list(parameters or ()),
+    }
+    with _log_lock:
+        with open(path, "a") as log_file:
+            log_file.write(json.dumps(entry, default=str) + "\n")
+
+def attach_workload_recorder(engine):
+    # Recording is off unless SECURECHECK_WORKLOAD_LOG names a log file.
+    if os.environ.get(WORKLOAD_LOG_ENV) and not event.contains(engine, "before_cursor_execute", record_statement):
+        event.listen(engine, "before_cursor_execute", record_statement)
+    return engine
+
+def load_workload(path=WORKLOAD_LOG):
+    # Identical statements collapse into one entry with a count.
+    counts = Counter()
+    entries = {}
+    with open(path) as log_file:
+        for line in log_file:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            key = (entry['statement'], json.dumps(entry['params'], sort_keys=True))
+            counts[key] += 1
+            entries.setdefault(key, entry)
+    return [dict(entries[key], count=count) for key, count in counts.most_common()]
+
+def select_part(statement):
+    # INSERT ... SELECT and CREATE ... AS SELECT read traffic_stops through
+    # their SELECT; the upsert tail is not part of the read. A WITH query is
+    # a read already and keeps its CTEs.
+    match = re.search(r"\bselect\b", statement, re.IGNORECASE)
+    if re.match(r"\s*(WITH|SELECT)\b", statement, re.IGNORECASE) or not match:
+        query = statement
+    else:
+        query = statement[match.start():]
+    return re.split(r"\bon\s+duplicate\s+key\s+update\b", query, flags=re.IGNORECASE)[0].strip().rstrip(";")
+
+def to_sqlite(statement, params):
+    # Replays a statement captured from the MySQL driver on the SQLite stand-in.
+    if isinstance(params, dict):
+        statement = re.sub(r"%\((\w+)\)s", r":\1", statement)
+    elif params:
+        statement = statement.replace("%s", "?")
+    if params:
+        statement = statement.replace("%%", "%")
+    statement = re.sub(r"\bTRUE\b", "1", statement, flags=re.IGNORECASE)
+    statement = re.sub(r"\bFALSE\b", "0", statement, flags=re.IGNORECASE)
+    return statement, params
+
+def run_statement(connection, statement, params):
+    if connection.dialect.name == "sqlite":
+        statement, params = to_sqlite(statement, params)
+    if isinstance(params, dict):
+        return connection.exec_driver_sql(statement, params)
+    return connection.exec_driver_sql(statement, tuple(params or ()))
+
+def clause(query, keyword):
+    match = re.search(rf"\b{keyword}\b(.*?){_CLAUSE_END}", query, re.IGNORECASE | re.DOTALL)
+    return match.group(1) if match else ""
+
+def ordered_columns(text_part):
+    seen = []
+    for column in _COLUMN.findall(text_part):
+        if column.lower() not in seen:
+            seen.append(column.lower())
+    return seen
+
+def statement_shape(query):
+    where = clause(query, "where")
+    select_list = re.split(r"\bfrom\b", clause(query, "select"), maxsplit=1, flags=re.IGNORECASE)[0]
+    return {
+        'equality': ordered_columns(" ".join(_EQUALITY.findall(where))),
+        'range': [column for column in ordered_columns(" ".join(_RANGE.findall(where)))
+                  if column not in ordered_columns(" ".join(_EQUALITY.findall(where)))],
+        'group_by': ordered_columns(clause(query, r"group\s+by")),
+        'order_by': ordered_columns(clause(query, r"order\s+by")),
+        'selected': STOP_COLUMNS if re.search(r"select\s+\*", query, re.IGNORECASE) else ordered_columns(select_list),
+    }
+
+def column_cardinality(connection, columns):
+    # Distinct values over a sample; enough to order index keys and spot
+    # boolean-like indexes without a full scan of a large table.
+    cardinality = {}
+    for column in columns:
+        cardinality[column] = connection.execute(text(
+            f"SELECT COUNT(DISTINCT {column}) FROM (SELECT {column} FROM {TRAFFIC_STOPS_TABLE} LIMIT {STATS_SAMPLE_ROWS}) sample_rows"
+        )).scalar() or 0
+    return cardinality
+
+def existing_indexes(connection):
+    # {index_name: [columns]} for the non-unique secondary indexes.
+    indexes = defaultdict(list)
+    if connection.dialect.name == "sqlite":
+        for row in connection.exec_driver_sql(f"PRAGMA index_list({TRAFFIC_STOPS_TABLE})"):
+            if not row[2]:
+                for info in connection.exec_driver_sql(f"PRAGMA index_info({row[1]})"):
+                    indexes[row[1]].append(info[2])
+    else:
+        for row in connection.execute(text("""
+            SELECT INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table_name AND NON_UNIQUE = 1
+            ORDER BY INDEX_NAME, SEQ_IN_INDEX;
+        """), {'table_name': TRAFFIC_STOPS_TABLE}):
+            indexes[row[0]].append(row[1])
+    return dict(indexes)
+
+def explain(connection, statement, params):
+    # Returns (full_scan, indexes used) for traffic_stops in the plan.
+    query = select_part(statement)
+    if connection.dialect.name == "sqlite":
+        rows = run_statement(connection, "EXPLAIN QUERY PLAN " + query, params).fetchall()
+        details = [row[-1] for row in rows if TRAFFIC_STOPS_TABLE in row[-1]]
+        used = {match.group(1) for detail in details for match in [re.search(r"USING (?:COVERING )?INDEX (\w+)", detail)] if match}
+        full_scan = any(detail.startswith("SCAN") and "INDEX" not in detail for detail in details)
+        return full_scan, used
+    rows = run_statement(connection, "EXPLAIN " + query, params).mappings().fetchall()
+    used = {row['key'] for row in rows if row['key']}
+    full_scan = any(row['type'] == "ALL" for row in rows)
+    return full_scan, used
+
+def propose_index(shape, cardinality):
+    # Equality columns first (most selective first), then the GROUP BY or
+    # ORDER BY columns so the index delivers rows pre-sorted, else one range
+    # column. The remaining referenced columns are added to make it covering
+    # when they still fit.
+    keys = sorted(shape['equality'], key=lambda column: -cardinality.get(column, 0))
+    if shape['group_by']:
+        keys += [column for column in shape['group_by'] if column not in keys]
+    elif shape['order_by']:
+        keys += [column for column in shape['order_by'] if column not in keys]
+    elif shape['range']:
+        keys.append(shape['range'][0])
+    if not keys or len(keys) > MAX_INDEX_COLUMNS:
+        return None
+    extra = [column for column in shape['range'] + shape['selected'] if column not in keys and column != 'stop_id']
+    extra = list(dict.fromkeys(extra))
+    if len(keys) + len(extra) <= MAX_INDEX_COLUMNS:
+        keys += extra
+    return tuple(keys)
+
+def is_prefix(shorter, longer):
+    return len(shorter) <= len(longer) and tuple(longer[:len(shorter)]) == tuple(shorter)
+
+def index_name(columns):
+    name = "idx_adv_" + "_".join(column.replace("driver_", "").replace("_name", "") for column in columns)
+    return name[:64]
+
+def analyze(connection, workload):
+    indexes = existing_indexes(connection)
+    used_indexes = set()
+    report = []
+
+    for entry in workload:
+        try:
+            full_scan, used = explain(connection, entry['statement'], entry['params'])
+        except Exception as e:
+            report.append({'entry': entry, 'error': str(e).splitlines()[0]})
+            continue
+        used_indexes |= used
+        shape = statement_shape(select_part(entry['statement']))
+        report.append({'entry': entry, 'full_scan': full_scan, 'used': used, 'shape': shape})
+
+    referenced = {column for item in report if 'shape' in item for columns in item['shape'].values() for column in columns}
+    referenced |= {columns[0].lower() for columns in indexes.values()}
+    cardinality = column_cardinality(connection, sorted(referenced - {'stop_id'}))
+
+    candidates = Counter()
+    for item in report:
+        if 'shape' in item:
+            item['proposal'] = propose_index(item['shape'], cardinality)
+            if item['proposal']:
+                candidates[item['proposal']] += item['entry']['count']
+
+    # A candidate that is a prefix of another candidate or of an existing
+    # index adds nothing.
+    proposals = []
+    for columns, weight in candidates.most_common():
+        if any(is_prefix(columns, other) for other in list(indexes.values()) + proposals):
+            continue
+        proposals = [other for other in proposals if not is_prefix(other, columns)]
+        proposals.append(columns)
+
+    drops = []
+    for name, columns in indexes.items():
+        if name in used_indexes:
+            continue
+        low_cardinality = cardinality.get(columns[0].lower(), 0) <= LOW_CARDINALITY_LIMIT
+        covered = any(is_prefix(tuple(c.lower() for c in columns), proposal) for proposal in proposals)
+        if low_cardinality or covered:
+            drops.append(name)
+    return report, proposals, drops
+
+def create_index_sql(columns):
+    return f"CREATE INDEX {index_name(columns)} ON {TRAFFIC_STOPS_TABLE} ({', '.join(columns)});"
+
+def drop_index_sql(connection, name):
+    if connection.dialect.name == "sqlite":
+        return f"DROP INDEX {name};"
+    return f"DROP INDEX {name} ON {TRAFFIC_STOPS_TABLE};"
+
+def benchmark_workload(connection, workload, repeats=BENCHMARK_REPEATS):
+    # Median seconds per distinct read statement, weighted by how often the
+    # workload issued it.
+    timings = {}
+    for position, entry in enumerate(workload):
+        runs = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            try:
+                run_statement(connection, select_part(entry['statement']), entry['params']).fetchall()
+            except Exception:
+                runs = None
+                break
+            runs.append(time.perf_counter() - start)
+        if runs:
+            timings[position] = sorted(runs)[len(runs) // 2]
+    return timings
+
+def print_report(report):
+    for item in report:
+        entry = item['entry']
+        summary = " ".join(select_part(entry['statement']).split())[:110]
+        if 'error' in item:
+            print(f"  [skip] x{entry['count']} {summary}\n         {item['error']}")
+            continue
+        plan = "FULL SCAN" if item['full_scan'] else ("index " + ", ".join(sorted(item['used'])) if item['used'] else "no index")
+        print(f"  x{entry['count']} {plan}: {summary}")
+
+def run_advisor(workload_path=WORKLOAD_LOG, engine=None, apply=False, repeats=BENCHMARK_REPEATS):
+    workload = load_workload(workload_path)
+    print(f"Loaded {sum(entry['count'] for entry in workload)} statements ({len(workload)} distinct) from '{workload_path}'.")
+    with engine.connect() as connection:
+        report, proposals, drops = analyze(connection, workload)
+        print("--- Current plans ---")
+        print_report(report)
+        print("--- Proposed changes ---")
+        statements = [create_index_sql(columns) for columns in proposals] + [drop_index_sql(connection, name) for name in drops]
+        for statement in statements or ["(none)"]:
+            print(f"  {statement}")
+        if not apply or not statements:
+            return statements
+
+        before = benchmark_workload(connection, workload, repeats)
+        for statement in statements:
+            connection.exec_driver_sql(statement)
+        connection.commit()
+        after = benchmark_workload(connection, workload, repeats)
+
+        print("--- Benchmark (median ms per statement) ---")
+        total_before = total_after = 0.0
+        for position, entry in enumerate(workload):
+            if position in before and position in after:
+                total_before += before[position] * entry['count']
+                total_after += after[position] * entry['count']
+                summary = " ".join(select_part(entry['statement']).split())[:80]
+                print(f"  {before[position] * 1000:9.1f} -> {after[position] * 1000:9.1f}  {summary}")
+        print(f"Workload total: {total_before:.2f}s -> {total_after:.2f}s")
+        print("--- Plans after changes ---")
+        print_report(analyze(connection, workload)[0])
+    return statements
+
+def register_sqlite_functions(dbapi_connection, connection_record):
+    # The MySQL date functions the reports and detector rely on.
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function("YEAR", 1, lambda value: int(value[:4]) if value else None)
+        dbapi_connection.create_function("MONTH", 1, lambda value: int(value[5:7]) if value else None)
+        dbapi_connection.create_function("HOUR", 1, lambda value: int(value[:2]) if value else None)
+        dbapi_connection.create_function("GREATEST", 2, lambda a, b: None if a is None or b is None else max(a, b))
+
+def sqlite_engine(path):
+    engine = create_engine(f"sqlite:///{path}")
+    event.listen(engine, "connect", register_sqlite_functions)
+    return engine
+
+def build_standin(path=STANDIN_DB, rows=STANDIN_ROWS, csv_path=None):
+    # Copies the first rows of the cleaned data into SQLite with the same
+    # secondary indexes as the MySQL table. row_hash is left out: it only
+    # dedups re-read data, and SQLite cannot store an unsigned 64-bit value.
+    from data_processor import CSV_PATH, SECONDARY_INDEXES, STOP_DURATION_MINUTES, load_clean_data, to_sql_frame
+
+    df = to_sql_frame(load_clean_data(csv_path or CSV_PATH).head(rows))
+    # The MySQL table's stored generated columns, which the reports group on.
+    df['stop_year'] = df['stop_date'].dt.year.astype('Int64')
+    df['stop_month'] = df['stop_date'].dt.month.astype('Int64')
+    df['stop_hour'] = pd.to_numeric(df['stop_time'].str[:2], errors='coerce').astype('Int64')
+    df['duration_minutes'] = df['stop_duration'].astype(object).map(STOP_DURATION_MINUTES).fillna(0).astype(float)
+    df['stop_date'] = df['stop_date'].dt.strftime('%Y-%m-%d')
+    df.insert(0, 'stop_id', range(1, len(df) + 1))
+    if os.path.exists(path):
+        os.remove(path)
+    engine = sqlite_engine(path)
+    with engine.connect() as connection:
+        df.to_sql(TRAFFIC_STOPS_TABLE, connection, index=False, chunksize=50000)
+        for name, columns in SECONDARY_INDEXES.items():
+            connection.exec_driver_sql(f"CREATE INDEX {name} ON {TRAFFIC_STOPS_TABLE} ({columns});")
+        connection.commit()
+    print(f"SUCCESS: Stand-in '{path}' built with {len(df)} rows and {len(SECONDARY_INDEXES)} secondary indexes.")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Propose traffic_stops indexes from a recorded workload.")
+    parser.add_argument("--log", default=WORKLOAD_LOG,
+                        help=f"Workload log written while {WORKLOAD_LOG_ENV} was set.")
+    parser.add_argument("--sqlite", help="Analyze a SQLite stand-in instead of MySQL.")
+    parser.add_argument("--build-standin", action="store_true",
+                        help="Build the SQLite stand-in from the cleaned data and exit.")
+    parser.add_argument("--rows", type=int, default=STANDIN_ROWS, help="Rows copied into the stand-in.")
+    parser.add_argument("--csv", help="CSV the stand-in is built from (default traffic_stops.csv).")
+    parser.add_argument("--apply", action="store_true",
+                        help="Apply the proposals and benchmark the workload before and after.")
+    parser.add_argument("--repeats", type=int, default=BENCHMARK_REPEATS, help="Runs per statement when benchmarking.")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.build_standin:
+        build_standin(args.sqlite or STANDIN_DB, args.rows, args.csv)
+    else:
+        if args.sqlite:
+            engine = sqlite_engine(args.sqlite)
+        else:
+            from data_processor import get_db_connection
+            engine = get_db_connection()
+        run_advisor(args.log, engine, args.apply, args.repeats)
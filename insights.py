@@ -0,0 +1,471 @@
+TRAFFIC_STOPS_TABLE = "traffic_stops"
+ROLLUP_TABLE = "traffic_stops_rollup"
+
+# The reports group on the stored stop_year, stop_month, stop_hour and
+# duration_minutes columns rather than deriving them per row.
+
+INSIGHTS = {
+    "Top 10 Drug-Related Vehicles": f"""
+        SELECT vehicle_number, COUNT(*) as stop_count
+        FROM {TRAFFIC_STOPS_TABLE}
+        WHERE drugs_related_stop = TRUE AND vehicle_number != 'Unknown'
+        GROUP BY vehicle_number
+        ORDER BY stop_count DESC
+        LIMIT 10;
+    """,
+    "Most Frequently Searched Vehicles": f"""
+        SELECT vehicle_number, COUNT(*) as search_count
+        FROM {TRAFFIC_STOPS_TABLE}
+        WHERE search_conducted = TRUE AND vehicle_number != 'Unknown'
+        GROUP BY vehicle_number
+        ORDER BY search_count DESC
+        LIMIT 10;
+    """,
+    "Driver Age Group with Highest Arrest Rate": f"""
+        SELECT
+            CASE
+                WHEN driver_age BETWEEN 15 AND 20 THEN '15-20'
+                WHEN driver_age BETWEEN 21 AND 25 THEN '21-25'
+                WHEN driver_age BETWEEN 26 AND 35 THEN '26-35'
+                WHEN driver_age BETWEEN 36 AND 50 THEN '36-50'
+                WHEN driver_age > 50 THEN '50+'
+                ELSE 'Unknown'
+            END as age_group,
+            (SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) as arrest_rate
+        FROM {TRAFFIC_STOPS_TABLE}
+        WHERE driver_age > 0
+        GROUP BY age_group
+        ORDER BY arrest_rate DESC;
+    """,
+    "Gender Distribution of Drivers Stopped by Country": f"""
+        SELECT country_name, driver_gender, COUNT(*) as stop_count
+        FROM {TRAFFIC_STOPS_TABLE}
+        WHERE country_name != 'Unknown' AND driver_gender != 'Unknown'
+        GROUP BY country_name, driver_gender
+        ORDER BY country_name, driver_gender;
+    """,
+    "Race and Gender Combination with Highest Search Rate": f"""
+        SELECT
+            driver_race,
+            driver_gender,
+            (SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) as search_rate
+        FROM {TRAFFIC_STOPS_TABLE}
+        WHERE driver_race != 'Unknown' AND driver_gender != 'Unknown'
+        GROUP BY driver_race, driver_gender
+        ORDER BY search_rate DESC
+        LIMIT 10;
+    """,
+    "Time of Day with Most Traffic Stops": f"""
+        SELECT
+            stop_hour AS hour_of_day,
+            COUNT(*) AS stop_count
+        FROM {TRAFFIC_STOPS_TABLE}
+        GROUP BY hour_of_day
+        ORDER BY stop_count DESC;
+    """,
+    "Average Stop Duration for Different Violations": f"""
+        SELECT violation, AVG(duration_minutes) as average_duration_minutes
+        FROM {TRAFFIC_STOPS_TABLE}
+        WHERE violation != 'Unknown'
+        GROUP BY violation
+        ORDER BY average_duration_minutes DESC;
+    """,
+    "Night Stops More Likely to Lead to Arrests?": f"""
+        SELECT
+            CASE
+                WHEN stop_hour >= 20 OR stop_hour < 6
+                THEN 'Night'
+                ELSE 'Day'
+            END as time_of_day_category,
+            (SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) as arrest_rate
+        FROM {TRAFFIC_STOPS_TABLE}
+        GROUP BY time_of_day_category
+        ORDER BY arrest_rate DESC;
+    """,
+    "Violations Most Associated with Searches or Arrests": f"""
+        SELECT
+            violation,
+            (SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) as search_rate,
+            (SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) as arrest_rate
+        FROM {TRAFFIC_STOPS_TABLE}
+        WHERE violation != 'Unknown'
+        GROUP BY violation
+        ORDER BY search_rate DESC, arrest_rate DESC;
+    """,
+    "Violations Most Common Among Younger Drivers (<25)": f"""
+        SELECT violation, COUNT(*) as stop_count
+        FROM {TRAFFIC_STOPS_TABLE}
+        WHERE driver_age > 0 AND driver_age < 25 AND violation != 'Unknown'
+        GROUP BY violation
+        ORDER BY stop_count DESC
+        LIMIT 10;
+    """,
+    "Violation That Rarely Results in Search or Arrest": f"""
+        SELECT
+            violation,
+            (SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) as search_rate,
+            (SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) as arrest_rate
+        FROM {TRAFFIC_STOPS_TABLE}
+        WHERE violation != 'Unknown'
+        GROUP BY violation
+        HAVING search_rate < 5 AND arrest_rate < 5
+        ORDER BY search_rate ASC, arrest_rate ASC
+        LIMIT 5;
+    """,
+    "Countries with Highest Rate of Drug-Related Stops": f"""
+        SELECT country_name,
+               (SUM(CASE WHEN drugs_related_stop = TRUE THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) as drug_related_stop_rate
+        FROM {TRAFFIC_STOPS_TABLE}
+        WHERE country_name != 'Unknown'
+        GROUP BY country_name
+        ORDER BY drug_related_stop_rate DESC
+        LIMIT 10;
+    """,
+    "Arrest Rate by Country and Violation": f"""
+        SELECT country_name, violation,
+               (SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) as arrest_rate
+        FROM {TRAFFIC_STOPS_TABLE}
+        WHERE country_name != 'Unknown' AND violation != 'Unknown'
+        GROUP BY country_name, violation
+        HAVING COUNT(*) > 10
+        ORDER BY country_name, arrest_rate DESC;
+    """,
+    "Country with Most Stops with Search Conducted": f"""
+        SELECT country_name, COUNT(*) as search_conducted_stops_count
+        FROM {TRAFFIC_STOPS_TABLE}
+        WHERE search_conducted = TRUE AND country_name != 'Unknown'
+        GROUP BY country_name
+        ORDER BY search_conducted_stops_count DESC
+        LIMIT 5;
+    """,
+    "Yearly Breakdown of Stops and Arrests by Country": f"""
+        SELECT
+            stop_year,
+            country_name,
+            COUNT(*) AS total_stops,
+            SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) AS total_arrests,
+            (SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) AS arrest_rate_percentage
+        FROM {TRAFFIC_STOPS_TABLE}
+        WHERE country_name != 'Unknown' AND stop_date IS NOT NULL
+        GROUP BY stop_year, country_name
+        ORDER BY stop_year, country_name;
+    """,
+    "Driver Violation Trends Based on Age and Race": f"""
+        SELECT
+            ts.driver_race,
+            ts.driver_age,
+            ts.violation,
+            COUNT(*) AS violation_count
+        FROM {TRAFFIC_STOPS_TABLE} AS ts
+        WHERE ts.driver_race != 'Unknown' AND ts.violation != 'Unknown' AND ts.driver_age > 0
+        GROUP BY ts.driver_race, ts.driver_age, ts.violation
+        ORDER BY ts.driver_race, ts.driver_age, violation_count DESC
+        LIMIT 100;
+    """,
+    "Time Period Analysis of Stops (Year, Month, Hour)": f"""
+        SELECT
+            stop_year,
+            stop_month,
+            stop_hour,
+            COUNT(*) AS number_of_stops
+        FROM {TRAFFIC_STOPS_TABLE}
+        WHERE stop_date IS NOT NULL AND stop_time IS NOT NULL
+        GROUP BY stop_year, stop_month, stop_hour
+        ORDER BY stop_year, stop_month, stop_hour;
+    """,
+    "Violations with High Search and Arrest Rates": f"""
+        WITH ViolationStats AS (
+            SELECT
+                violation,
+                COUNT(*) AS total_stops,
+                SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END) AS total_searches,
+                SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) AS total_arrests
+            FROM {TRAFFIC_STOPS_TABLE}
+            WHERE violation != 'Unknown'
+            GROUP BY violation
+        )
+        SELECT
+            violation,
+            total_stops,
+            total_searches,
+            total_arrests,
+            (total_searches * 100.0 / total_stops) AS search_rate_percentage,
+            (total_arrests * 100.0 / total_stops) AS arrest_rate_percentage
+        FROM ViolationStats
+        WHERE total_stops > 50
+        ORDER BY search_rate_percentage DESC, arrest_rate_percentage DESC
+        LIMIT 10;
+    """,
+    "Driver Demographics by Country (Age, Gender, and Race)": f"""
+        SELECT
+            country_name,
+            driver_gender,
+            driver_race,
+            COUNT(*) AS total_stops,
+            AVG(driver_age) AS average_driver_age
+        FROM {TRAFFIC_STOPS_TABLE}
+        WHERE country_name != 'Unknown' AND driver_gender != 'Unknown' AND driver_race != 'Unknown' AND driver_age > 0
+        GROUP BY country_name, driver_gender, driver_race
+        ORDER BY country_name, total_stops DESC
+        LIMIT 100;
+    """,
+    "Top 5 Violations with Highest Arrest Rates": f"""
+        SELECT
+            violation,
+            (SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) as arrest_rate
+        FROM {TRAFFIC_STOPS_TABLE}
+        WHERE violation != 'Unknown'
+        GROUP BY violation
+        ORDER BY arrest_rate DESC
+        LIMIT 5;
+    """
+}
+
+
+# Rollup equivalents of the INSIGHTS reports, answered from the pre-aggregated
+# traffic_stops_rollup table that data_processor.py maintains. Reports that
+# need per-vehicle or exact-age detail have no entry and always run live.
+# age_bucket is the lower bound of an age band (-1 unknown, 1, 15, 21, 25, 26,
+# 36, 51) and stop_hour is -1 when the stop time is missing.
+ROLLUP_INSIGHTS = {
+    "Driver Age Group with Highest Arrest Rate": f"""
+        SELECT
+            CASE
+                WHEN age_bucket BETWEEN 15 AND 20 THEN '15-20'
+                WHEN age_bucket BETWEEN 21 AND 25 THEN '21-25'
+                WHEN age_bucket BETWEEN 26 AND 35 THEN '26-35'
+                WHEN age_bucket BETWEEN 36 AND 50 THEN '36-50'
+                WHEN age_bucket > 50 THEN '50+'
+                ELSE 'Unknown'
+            END as age_group,
+            (SUM(arrests) * 100.0 / SUM(stops)) as arrest_rate
+        FROM {ROLLUP_TABLE}
+        WHERE age_bucket > 0
+        GROUP BY age_group
+        ORDER BY arrest_rate DESC;
+    """,
+    "Gender Distribution of Drivers Stopped by Country": f"""
+        SELECT country_name, driver_gender, CAST(SUM(stops) AS SIGNED) as stop_count
+        FROM {ROLLUP_TABLE}
+        WHERE country_name != 'Unknown' AND driver_gender != 'Unknown'
+        GROUP BY country_name, driver_gender
+        ORDER BY country_name, driver_gender;
+    """,
+    "Race and Gender Combination with Highest Search Rate": f"""
+        SELECT
+            driver_race,
+            driver_gender,
+            (SUM(searches) * 100.0 / SUM(stops)) as search_rate
+        FROM {ROLLUP_TABLE}
+        WHERE driver_race != 'Unknown' AND driver_gender != 'Unknown'
+        GROUP BY driver_race, driver_gender
+        ORDER BY search_rate DESC
+        LIMIT 10;
+    """,
+    "Time of Day with Most Traffic Stops": f"""
+        SELECT
+            NULLIF(stop_hour, -1) AS hour_of_day,
+            CAST(SUM(stops) AS SIGNED) AS stop_count
+        FROM {ROLLUP_TABLE}
+        GROUP BY hour_of_day
+        ORDER BY stop_count DESC;
+    """,
+    "Average Stop Duration for Different Violations": f"""
+        SELECT violation, SUM(
+            CASE stop_duration
+                WHEN '0-15 Min' THEN 7.5
+                WHEN '16-30 Min' THEN 23
+                WHEN '30+ Min' THEN 45
+                ELSE 0
+            END * stops
+        ) / SUM(stops) as average_duration_minutes
+        FROM {ROLLUP_TABLE}
+        WHERE violation != 'Unknown'
+        GROUP BY violation
+        ORDER BY average_duration_minutes DESC;
+    """,
+    "Night Stops More Likely to Lead to Arrests?": f"""
+        SELECT
+            CASE
+                WHEN stop_hour >= 20 OR (stop_hour >= 0 AND stop_hour < 6)
+                THEN 'Night'
+                ELSE 'Day'
+            END as time_of_day_category,
+            (SUM(arrests) * 100.0 / SUM(stops)) as arrest_rate
+        FROM {ROLLUP_TABLE}
+        GROUP BY time_of_day_category
+        ORDER BY arrest_rate DESC;
+    """,
+    "Violations Most Associated with Searches or Arrests": f"""
+        SELECT
+            violation,
+            (SUM(searches) * 100.0 / SUM(stops)) as search_rate,
+            (SUM(arrests) * 100.0 / SUM(stops)) as arrest_rate
+        FROM {ROLLUP_TABLE}
+        WHERE violation != 'Unknown'
+        GROUP BY violation
+        ORDER BY search_rate DESC, arrest_rate DESC;
+    """,
+    "Violations Most Common Among Younger Drivers (<25)": f"""
+        SELECT violation, CAST(SUM(stops) AS SIGNED) as stop_count
+        FROM {ROLLUP_TABLE}
+        WHERE age_bucket > 0 AND age_bucket < 25 AND violation != 'Unknown'
+        GROUP BY violation
+        ORDER BY stop_count DESC
+        LIMIT 10;
+    """,
+    "Violation That Rarely Results in Search or Arrest": f"""
+        SELECT
+            violation,
+            (SUM(searches) * 100.0 / SUM(stops)) as search_rate,
+            (SUM(arrests) * 100.0 / SUM(stops)) as arrest_rate
+        FROM {ROLLUP_TABLE}
+        WHERE violation != 'Unknown'
+        GROUP BY violation
+        HAVING search_rate < 5 AND arrest_rate < 5
+        ORDER BY search_rate ASC, arrest_rate ASC
+        LIMIT 5;
+    """,
+    "Countries with Highest Rate of Drug-Related Stops": f"""
+        SELECT country_name,
+               (SUM(drug_stops) * 100.0 / SUM(stops)) as drug_related_stop_rate
+        FROM {ROLLUP_TABLE}
+        WHERE country_name != 'Unknown'
+        GROUP BY country_name
+        ORDER BY drug_related_stop_rate DESC
+        LIMIT 10;
+    """,
+    "Arrest Rate by Country and Violation": f"""
+        SELECT country_name, violation,
+               (SUM(arrests) * 100.0 / SUM(stops)) as arrest_rate
+        FROM {ROLLUP_TABLE}
+        WHERE country_name != 'Unknown' AND violation != 'Unknown'
+        GROUP BY country_name, violation
+        HAVING SUM(stops) > 10
+        ORDER BY country_name, arrest_rate DESC;
+    """,
+    "Country with Most Stops with Search Conducted": f"""
+        SELECT country_name, CAST(SUM(searches) AS SIGNED) as search_conducted_stops_count
+        FROM {ROLLUP_TABLE}
+        WHERE country_name != 'Unknown'
+        GROUP BY country_name
+        HAVING SUM(searches) > 0
+        ORDER BY search_conducted_stops_count DESC
+        LIMIT 5;
+    """,
+    "Yearly Breakdown of Stops and Arrests by Country": f"""
+        SELECT
+            stop_year,
+            country_name,
+            CAST(SUM(stops) AS SIGNED) AS total_stops,
+            CAST(SUM(arrests) AS SIGNED) AS total_arrests,
+            (SUM(arrests) * 100.0 / SUM(stops)) AS arrest_rate_percentage
+        FROM {ROLLUP_TABLE}
+        WHERE country_name != 'Unknown'
+        GROUP BY stop_year, country_name
+        ORDER BY stop_year, country_name;
+    """,
+    "Time Period Analysis of Stops (Year, Month, Hour)": f"""
+        SELECT
+            stop_year,
+            stop_month,
+            stop_hour,
+            CAST(SUM(stops) AS SIGNED) AS number_of_stops
+        FROM {ROLLUP_TABLE}
+        WHERE stop_hour >= 0
+        GROUP BY stop_year, stop_month, stop_hour
+        ORDER BY stop_year, stop_month, stop_hour;
+    """,
+    "Violations with High Search and Arrest Rates": f"""
+        WITH ViolationStats AS (
+            SELECT
+                violation,
+                SUM(stops) AS total_stops,
+                SUM(searches) AS total_searches,
+                SUM(arrests) AS total_arrests
+            FROM {ROLLUP_TABLE}
+            WHERE violation != 'Unknown'
+            GROUP BY violation
+        )
+        SELECT
+            violation,
+            CAST(total_stops AS SIGNED) AS total_stops,
+            CAST(total_searches AS SIGNED) AS total_searches,
+            CAST(total_arrests AS SIGNED) AS total_arrests,
+            (total_searches * 100.0 / total_stops) AS search_rate_percentage,
+            (total_arrests * 100.0 / total_stops) AS arrest_rate_percentage
+        FROM ViolationStats
+        WHERE total_stops > 50
+        ORDER BY search_rate_percentage DESC, arrest_rate_percentage DESC
+        LIMIT 10;
+    """,
+    "Driver Demographics by Country (Age, Gender, and Race)": f"""
+        SELECT
+            country_name,
+            driver_gender,
+            driver_race,
+            CAST(SUM(stops) AS SIGNED) AS total_stops,
+            SUM(driver_age_sum) / SUM(stops) AS average_driver_age
+        FROM {ROLLUP_TABLE}
+        WHERE country_name != 'Unknown' AND driver_gender != 'Unknown' AND driver_race != 'Unknown' AND age_bucket > 0
+        GROUP BY country_name, driver_gender, driver_race
+        ORDER BY country_name, total_stops DESC
+        LIMIT 100;
+    """,
+    "Top 5 Violations with Highest Arrest Rates": f"""
+        SELECT
+            violation,
+            (SUM(arrests) * 100.0 / SUM(stops)) as arrest_rate
+        FROM {ROLLUP_TABLE}
+        WHERE violation != 'Unknown'
+        GROUP BY violation
+        ORDER BY arrest_rate DESC
+        LIMIT 5;
+    """
+}
+
+# The three headline KPIs come from one conditional-aggregate pass instead of
+# three separate scans.
+OVERVIEW_QUERIES = {
+    "recent_stops": f"SELECT * FROM {TRAFFIC_STOPS_TABLE} ORDER BY stop_date DESC, stop_time DESC LIMIT 20;",
+    "key_statistics": f"""
+        SELECT
+            COUNT(*) AS total_stops,
+            CAST(COALESCE(SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END), 0) AS SIGNED) AS total_arrests,
+            CAST(COALESCE(SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END), 0) AS SIGNED) AS total_searches
+        FROM {TRAFFIC_STOPS_TABLE};
+    """,
+    "violation_counts": f"SELECT violation, COUNT(*) as count FROM {TRAFFIC_STOPS_TABLE} WHERE violation != 'Unknown' GROUP BY violation ORDER BY count DESC;",
+    "country_counts": f"SELECT country_name, COUNT(*) as count FROM {TRAFFIC_STOPS_TABLE} WHERE country_name != 'Unknown' GROUP BY country_name ORDER BY count DESC;",
+}
+
+# The rollup doubles as the maintained counters: its few thousand rows sum to
+# the KPIs without touching the stops table.
+ROLLUP_OVERVIEW_QUERIES = {
+    "recent_stops": OVERVIEW_QUERIES["recent_stops"],
+    "key_statistics": f"""
+        SELECT
+            CAST(COALESCE(SUM(stops), 0) AS SIGNED) AS total_stops,
+            CAST(COALESCE(SUM(arrests), 0) AS SIGNED) AS total_arrests,
+            CAST(COALESCE(SUM(searches), 0) AS SIGNED) AS total_searches
+        FROM {ROLLUP_TABLE};
+    """,
+    "violation_counts": f"SELECT violation, CAST(SUM(stops) AS SIGNED) as count FROM {ROLLUP_TABLE} WHERE violation != 'Unknown' GROUP BY violation ORDER BY count DESC;",
+    "country_counts": f"SELECT country_name, CAST(SUM(stops) AS SIGNED) as count FROM {ROLLUP_TABLE} WHERE country_name != 'Unknown' GROUP BY country_name ORDER BY count DESC;",
+}
+
+def keyset_predicate(cursor):
+    # Rows that sort after the cursor in "stop_date DESC, stop_time DESC,
+    # stop_id DESC" order. MySQL sorts NULL stop_time lowest, i.e. last within a
+    # day when descending, so a NULL cursor time only continues among NULLs.
+    stop_date, stop_time, stop_id = cursor
+    if stop_time is None:
+        return (
+            "AND (stop_date < %s OR (stop_date = %s AND stop_time IS NULL AND stop_id < %s))",
+            [stop_date, stop_date, stop_id],
+        )
+    return (
+        "AND (stop_date < %s OR (stop_date = %s AND (stop_time < %s OR stop_time IS NULL"
+        " OR (stop_time = %s AND stop_id < %s))))",
+        [stop_date, stop_date, stop_time, stop_time, stop_id],
+    )
@@ -0,0 +1,281 @@
+import atexit
+import contextvars
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import event
+
+from query_cache import normalize_sql
+
+LATENCY_BUCKETS_SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SLOW_QUERY_SECONDS = float(os.environ.get("SECURECHECK_SLOW_QUERY_SECONDS", "1.0"))
+SLOW_QUERY_LOG = os.environ.get("SECURECHECK_SLOW_QUERY_LOG", "slow_queries.jsonl")
+SLOW_QUERY_MEMORY = 200
+SLOW_QUERY_MAX_CHARS = 4000
+# When set, the metrics are written there when the process exits: JSON for a
+# .json path, Prometheus text format otherwise.
+METRICS_FILE_ENV = "SECURECHECK_METRICS_FILE"
+METRIC_PREFIX = "securecheck"
+
+_PLACEHOLDER = re.compile(r"'(?:[^'\\]|\\.|'')*'|%\(\w+\)s|%s|(?<![\w:]):\w+|\$\w+|\?|\b\d+(?:\.\d+)?\b")
+_READ = re.compile(r"\s*(SELECT|WITH|EXPLAIN|SHOW|DESCRIBE)\b", re.IGNORECASE)
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+# The page, rule or script a database call is made for. Scripts default to
+# their own name; the dashboard and the detector set it per page and rule.
+_caller = contextvars.ContextVar("caller", default=os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0])
+
+def set_caller(name):
+    _caller.set(name)
+
+def current_caller():
+    return _caller.get()
+
+@contextmanager
+def caller_scope(name):
+    token = _caller.set(name)
+    try:
+        yield
+    finally:
+        _caller.reset(token)
+
+def fingerprint(query):
+    # Literals and every placeholder style become '?', so one statement shape
+    # shares a row whatever its parameters or the driver's paramstyle.
+    shape = _PLACEHOLDER.sub("?", normalize_sql(str(query)))
+    return _IN_LIST.sub("(?)", shape)
+
+def query_id(shape):
+    return hashlib.sha1(shape.encode()).hexdigest()[:12]
+
+class QueryMetrics:
+    # Per (caller, statement shape) counters and a latency histogram for every
+    # database call in this process, plus a bounded slow-query log.
+
+    def __init__(self, slow_seconds=SLOW_QUERY_SECONDS, slow_log_path=SLOW_QUERY_LOG):
+        self.slow_seconds = slow_seconds
+        self.slow_log_path = slow_log_path
+        self.entries = {}
+        self.slow_queries = deque(maxlen=SLOW_QUERY_MEMORY)
+        self.started_at = datetime.now()
+        self.lock = threading.Lock()
+
+    def entry(self, caller, shape):
+        key = (caller, shape)
+        if key not in self.entries:
+            self.entries[key] = {
+                'caller': caller,
+                'query_id': query_id(shape),
+                'query': shape,
+                'calls': 0,
+                'errors': 0,
+                'seconds': 0.0,
+                'max_seconds': 0.0,
+                'buckets': [0] * (len(LATENCY_BUCKETS_SECONDS) + 1),
+                'rows': 0,
+                'bytes': 0,
+                'cache_hits': 0,
+                'cache_misses': 0,
+                'uncached': 0,
+            }
+        return self.entries[key]
+
+    def record_call(self, statement, seconds, rows=None, error=None, caller=None):
+        caller = caller or current_caller()
+        shape = fingerprint(statement)
+        bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS_SECONDS) if seconds <= bound), len(LATENCY_BUCKETS_SECONDS))
+        with self.lock:
+            entry = self.entry(caller, shape)
+            entry['calls'] += 1
+            entry['seconds'] += seconds
+            entry['max_seconds'] = max(entry['max_seconds'], seconds)
+            entry['buckets'][bucket] += 1
+            if error is not None:
+                entry['errors'] += 1
+            if rows is not None and rows >= 0:
+                entry['rows'] += rows
+        if seconds >= self.slow_seconds:
+            self.log_slow_query(caller, statement, seconds, rows, error)
+
+    def record_result(self, query, cache, rows=None, nbytes=None, caller=None):
+        # Called by the layers that turn reads into results: cache is 'hit',
+        # 'miss' or None for reads that bypass the cache (streamed custom
+        # queries). Rows read are counted here, rows written by record_call.
+        with self.lock:
+            entry = self.entry(caller or current_caller(), fingerprint(query))
+            if cache == "hit":
+                entry['cache_hits'] += 1
+            elif cache == "miss":
+                entry['cache_misses'] += 1
+            else:
+                entry['uncached'] += 1
+            if rows is not None:
+                entry['rows'] += rows
+            if nbytes is not None:
+                entry['bytes'] += nbytes
+
+    def log_slow_query(self, caller, statement, seconds, rows, error):
+        slow_query = {
+            'ts': datetime.now().isoformat(timespec="seconds"),
+            'caller': caller,
+            'seconds': round(seconds, 4),
+            'rows': rows if rows is not None and rows >= 0 else None,
+            'error': str(error) if error is not None else None,
+            'query_id': query_id(fingerprint(statement)),
+            'statement': str(statement)[:SLOW_QUERY_MAX_CHARS],
+        }
+        with self.lock:
+            self.slow_queries.append(slow_query)
+            if self.slow_log_path:
+                try:
+                    with open(self.slow_log_path, "a") as log_file:
+                        log_file.write(json.dumps(slow_query) + "\n")
+                except OSError:
+                    pass
+
+    def snapshot(self):
+        with self.lock:
+            entries = [dict(entry, buckets=list(entry['buckets'])) for entry in self.entries.values()]
+            slow_queries = list(self.slow_queries)
+        for entry in entries:
+            entry['mean_seconds'] = entry['seconds'] / entry['calls'] if entry['calls'] else 0.0
+            entry['p50_seconds'] = histogram_quantile(entry['buckets'], 0.5)
+            entry['p95_seconds'] = histogram_quantile(entry['buckets'], 0.95)
+        entries.sort(key=lambda entry: -entry['seconds'])
+        return {
+            'started_at': self.started_at.isoformat(timespec="seconds"),
+            'generated_at': datetime.now().isoformat(timespec="seconds"),
+            'slow_query_seconds': self.slow_seconds,
+            'bucket_bounds': list(LATENCY_BUCKETS_SECONDS),
+            'queries': entries,
+            'slow_queries': slow_queries,
+        }
+
+    def reset(self):
+        with self.lock:
+            self.entries.clear()
+            self.slow_queries.clear()
+            self.started_at = datetime.now()
+
+def histogram_quantile(buckets, quantile):
+    # Linear interpolation inside the bucket holding the quantile, as
+    # Prometheus does; the open-ended last bucket reports its lower bound.
+    total = sum(buckets)
+    if not total:
+        return 0.0
+    target = quantile * total
+    seen = 0
+    for i, count in enumerate(buckets):
+        if count and seen + count >= target:
+            lower = LATENCY_BUCKETS_SECONDS[i - 1] if i > 0 else 0.0
+            if i == len(LATENCY_BUCKETS_SECONDS):
+                return lower
+            return lower + (LATENCY_BUCKETS_SECONDS[i] - lower) * (target - seen) / count
+        seen += count
+    return LATENCY_BUCKETS_SECONDS[-1]
+
+METRICS = QueryMetrics()
+
+def before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+def after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    # Rows written come from the driver; rows read are counted by whoever
+    # consumes them (streamed cursors do not know their count up front).
+    rows = None if _READ.match(statement) else getattr(cursor, "rowcount", None)
+    METRICS.record_call(statement, time.perf_counter() - started, rows)
+
+def on_error(exception_context):
+    conn = exception_context.connection
+    if conn is None or not conn.info.get('query_started'):
+        return
+    started = conn.info['query_started'].pop()
+    METRICS.record_call(exception_context.statement or "", time.perf_counter() - started,
+                        error=exception_context.original_exception)
+
+def attach_instrumentation(engine):
+    if not event.contains(engine, "before_cursor_execute", before_execute):
+        event.listen(engine, "before_cursor_execute", before_execute)
+        event.listen(engine, "after_cursor_execute", after_execute)
+        event.listen(engine, "handle_error", on_error)
+    return engine
+
+def label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def prometheus_text(snapshot=None):
+    snapshot = snapshot or METRICS.snapshot()
+    lines = [
+        f"# HELP {METRIC_PREFIX}_query_duration_seconds Database call latency.",
+        f"# TYPE {METRIC_PREFIX}_query_duration_seconds histogram",
+    ]
+    counters = {
+        'query_errors_total': ("errors", "Database calls that raised an error."),
+        'query_rows_total': ("rows", "Rows returned or affected."),
+        'query_result_bytes_total': ("bytes", "In-memory size of results fetched from the database."),
+    }
+    for entry in snapshot['queries']:
+        labels = f'caller="{label_value(entry["caller"])}",query_id="{entry["query_id"]}"'
+        cumulative = 0
+        for bound, count in zip(snapshot['bucket_bounds'], entry['buckets']):
+            cumulative += count
+            lines.append(f'{METRIC_PREFIX}_query_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{METRIC_PREFIX}_query_duration_seconds_bucket{{{labels},le="+Inf"}} {entry["calls"]}')
+        lines.append(f'{METRIC_PREFIX}_query_duration_seconds_sum{{{labels}}} {entry["seconds"]:.6f}')
+        lines.append(f'{METRIC_PREFIX}_query_duration_seconds_count{{{labels}}} {entry["calls"]}')
+    for name, (field, help_text) in counters.items():
+        lines += [f"# HELP {METRIC_PREFIX}_{name} {help_text}", f"# TYPE {METRIC_PREFIX}_{name} counter"]
+        for entry in snapshot['queries']:
+            labels = f'caller="{label_value(entry["caller"])}",query_id="{entry["query_id"]}"'
+            lines.append(f"{METRIC_PREFIX}_{name}{{{labels}}} {entry[field]}")
+    lines += [f"# HELP {METRIC_PREFIX}_result_cache_requests_total Result cache lookups by outcome.",
+              f"# TYPE {METRIC_PREFIX}_result_cache_requests_total counter"]
+    for entry in snapshot['queries']:
+        labels = f'caller="{label_value(entry["caller"])}",query_id="{entry["query_id"]}"'
+        for status, field in (("hit", "cache_hits"), ("miss", "cache_misses"), ("bypass", "uncached")):
+            if entry[field]:
+                lines.append(f'{METRIC_PREFIX}_result_cache_requests_total{{{labels},status="{status}"}} {entry[field]}')
+    # The statement behind each query_id, as an info-style series.
+    lines += [f"# HELP {METRIC_PREFIX}_query_info Statement shape for each query_id.",
+              f"# TYPE {METRIC_PREFIX}_query_info gauge"]
+    for query_id_, shape in sorted({(entry['query_id'], entry['query']) for entry in snapshot['queries']}):
+        lines.append(f'{METRIC_PREFIX}_query_info{{query_id="{query_id_}",query="{label_value(shape[:500])}"}} 1')
+    return "\n".join(lines) + "\n"
+
+def write_dump(path, fmt=None):
+    # fmt is 'json' or 'prometheus'; by default it follows the file extension.
+    fmt = fmt or ("json" if path.endswith(".json") else "prometheus")
+    snapshot = METRICS.snapshot()
+    body = json.dumps(snapshot, indent=2) if fmt == "json" else prometheus_text(snapshot)
+    with open(path + ".tmp", "w") as dump_file:
+        dump_file.write(body)
+    os.replace(path + ".tmp", path)
+    return path
+
+def print_summary(limit=10):
+    snapshot = METRICS.snapshot()
+    if not snapshot['queries']:
+        return
+    print(f"--- Slowest statements by total time (of {len(snapshot['queries'])}) ---")
+    for entry in snapshot['queries'][:limit]:
+        print(f"{entry['seconds']:8.3f}s total  {entry['calls']:6d} calls  p95 {entry['p95_seconds'] * 1000:8.1f} ms  "
+              f"{entry['caller']}: {entry['query'][:100]}")
+    if snapshot['slow_queries']:
+        print(f"{len(snapshot['slow_queries'])} statements took over {snapshot['slow_query_seconds']}s"
+              f"{f'; see {SLOW_QUERY_LOG}' if SLOW_QUERY_LOG else ''}.")
+
+def dump_on_exit():
+    path = os.environ.get(METRICS_FILE_ENV)
+    if path and METRICS.entries:
+        write_dump(path)
+
+atexit.register(dump_on_exit)
@@ -0,0 +1,357 @@
+import argparse
+import os
+import re
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+from sqlalchemy import text
+
+from backend import DUCKDB_PATH, get_engine
+from query_cache import bump_data_version, bump_standin_data_version
+from vehicle_profiles import (PROFILE_TABLE, build_standin_profiles, recompute_staged_profiles, stage_profile_plates,
+                              table_exists)
+
+TRAFFIC_STOPS_TABLE = "traffic_stops"
+ROLLUP_TABLE = f"{TRAFFIC_STOPS_TABLE}_rollup"
+ARCHIVE_PREFIX = f"{TRAFFIC_STOPS_TABLE}_archive"
+INGEST_WATERMARKS_TABLE = "ingest_watermarks"
+PARTITION_PERIODS = ("month", "year")
+PARTITION_PERIOD = os.environ.get("SECURECHECK_PARTITION_PERIOD", "month")
+# DuckDB reads whole row groups of ~122k rows and pays per UNION ALL branch,
+# so the stand-in splits by year: monthly tables make full scans slower.
+STANDIN_PARTITION_PERIOD = os.environ.get("SECURECHECK_STANDIN_PARTITION_PERIOD", "year")
+# Always empty: loads add period partitions ahead of the rows they insert, so
+# splitting this one never moves data.
+FUTURE_PARTITION = "p_future"
+WINDOW_DAYS = 30
+
+_PERIOD_NAME = re.compile(r"^p(\d{4})(\d{2})?$")
+
+def check_period(period):
+    if period not in PARTITION_PERIODS:
+        raise ValueError(f"Unknown partition period '{period}'; expected one of {', '.join(PARTITION_PERIODS)}.")
+
+def period_start(day, period=PARTITION_PERIOD):
+    check_period(period)
+    return date(day.year, day.month, 1) if period == "month" else date(day.year, 1, 1)
+
+def next_period(start, period=PARTITION_PERIOD):
+    if period == "year":
+        return date(start.year + 1, 1, 1)
+    return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+def periods_between(first, last, period=PARTITION_PERIOD):
+    starts = []
+    start = period_start(first, period)
+    while start <= last:
+        starts.append(start)
+        start = next_period(start, period)
+    return starts
+
+def partition_name(start, period=PARTITION_PERIOD):
+    return f"p{start:%Y%m}" if period == "month" else f"p{start:%Y}"
+
+def partition_period_start(name):
+    # p202001 -> 2020-01-01, p2020 -> 2020-01-01; None for p_future.
+    match = _PERIOD_NAME.match(name)
+    if match is None:
+        return None
+    return date(int(match.group(1)), int(match.group(2) or 1), 1)
+
+def name_period(name):
+    return "month" if len(name) == len("p202001") else "year"
+
+def parse_period(value, period=PARTITION_PERIOD):
+    # "2020-01" for a month, "2020" for a year.
+    check_period(period)
+    pattern = r"(\d{4})-(\d{2})" if period == "month" else r"(\d{4})"
+    match = re.fullmatch(pattern, value.strip())
+    if match is None:
+        raise ValueError(f"Period '{value}' must look like {'2020-01' if period == 'month' else '2020'}.")
+    return date(int(match.group(1)), int(match.group(2)) if period == "month" else 1, 1)
+
+def period_table(start, period=PARTITION_PERIOD, prefix=TRAFFIC_STOPS_TABLE):
+    return f"{prefix}_{partition_name(start, period)}"
+
+def partition_definition(start, period=PARTITION_PERIOD):
+    return f"PARTITION {partition_name(start, period)} VALUES LESS THAN ('{next_period(start, period).isoformat()}')"
+
+# --- MySQL: native RANGE COLUMNS partitions ----------------------------------
+
+def partition_clause():
+    # Period partitions are added by extend_partitions as rows arrive.
+    return f"PARTITION BY RANGE COLUMNS(stop_date) (PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE))"
+
+def table_partitions(connection, table_name=TRAFFIC_STOPS_TABLE):
+    # [(name, period start or None, estimated rows)] in range order; empty
+    # when the table is not partitioned.
+    rows = connection.execute(text("""
+        SELECT PARTITION_NAME, TABLE_ROWS FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table_name AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION;
+    """), {'table_name': table_name}).fetchall()
+    return [(name, partition_period_start(name), table_rows or 0) for name, table_rows in rows]
+
+def table_period(partitions):
+    # Month or year, read back from the partition names.
+    for name, start, _ in partitions:
+        if start is not None:
+            return name_period(name)
+    return PARTITION_PERIOD
+
+def extend_partitions(connection, table_name, chunk):
+    # Like new ENUM members, partitions for the chunk's periods are added
+    # before it is inserted. Later periods are split off the empty p_future;
+    # an earlier one is split off the lowest partition, which copies that
+    # partition's rows, so it only happens when old data arrives late.
+    partitions = table_partitions(connection, table_name)
+    if not partitions or chunk.empty or 'stop_date' not in chunk.columns:
+        return
+    period = table_period(partitions)
+    starts = [start for _, start, _ in partitions if start is not None]
+    first_day = pd.Timestamp(chunk['stop_date'].min()).date()
+    last_day = pd.Timestamp(chunk['stop_date'].max()).date()
+
+    later = [start for start in periods_between(first_day, last_day, period) if not starts or start > starts[-1]]
+    if starts and later:
+        later = periods_between(next_period(starts[-1], period), later[-1], period)
+    if later:
+        definitions = [partition_definition(start, period) for start in later]
+        connection.execute(text(
+            f"ALTER TABLE {table_name} REORGANIZE PARTITION {FUTURE_PARTITION} INTO "
+            f"({', '.join(definitions)}, PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE));"
+        ))
+        print(f"NOTE: Added {len(later)} partition(s) to '{table_name}' up to {partition_name(later[-1], period)}.")
+        starts += later
+
+    earlier = [start for start in periods_between(first_day, starts[0], period) if start < starts[0]]
+    if earlier:
+        lowest = partition_name(starts[0], period)
+        definitions = [partition_definition(start, period) for start in earlier]
+        connection.execute(text(
+            f"ALTER TABLE {table_name} REORGANIZE PARTITION {lowest} INTO "
+            f"({', '.join(definitions)}, {partition_definition(starts[0], period)});"
+        ))
+        print(f"NOTE: Added {len(earlier)} partition(s) to '{table_name}' from {partition_name(earlier[0], period)}.")
+    connection.commit()
+
+def delete_rollup_period(connection, start, period):
+    if period == "month":
+        where, params = "stop_year = :year AND stop_month = :month", {'year': start.year, 'month': start.month}
+    else:
+        where, params = "stop_year = :year", {'year': start.year}
+    connection.execute(text(f"DELETE FROM {ROLLUP_TABLE} WHERE {where};"), params)
+
+def profile_stop_id(connection):
+    # The stop_id the profiles cover, or None if there are no profiles.
+    if not table_exists(connection, PROFILE_TABLE) or not table_exists(connection, INGEST_WATERMARKS_TABLE):
+        return None
+    return connection.execute(
+        text(f"SELECT profile_stop_id FROM {INGEST_WATERMARKS_TABLE} WHERE table_name = :table_name;"),
+        {'table_name': TRAFFIC_STOPS_TABLE},
+    ).scalar()
+
+def retire_mysql_period(connection, value, archive=False):
+    # DROP PARTITION removes a period without touching other rows. Archiving
+    # first swaps the partition with an empty unpartitioned copy of the table
+    # (EXCHANGE PARTITION), so both are metadata changes. The rollup loses the
+    # period and the profiles of its plates are recomputed from their other
+    # stops; the trigram index and the detector's lifetime counters are left
+    # as they are (a plate with no stops left just matches nothing).
+    partitions = table_partitions(connection)
+    if not partitions:
+        raise ValueError(f"'{TRAFFIC_STOPS_TABLE}' is not partitioned; run a reload first.")
+    period = table_period(partitions)
+    start = parse_period(value, period)
+    name = partition_name(start, period)
+    if name not in {partition for partition, _, _ in partitions}:
+        raise ValueError(f"'{TRAFFIC_STOPS_TABLE}' has no partition {name}.")
+
+    profiles_stop_id = profile_stop_id(connection)
+    if profiles_stop_id is not None:
+        stage_profile_plates(connection, f"SELECT vehicle_number FROM {TRAFFIC_STOPS_TABLE} PARTITION ({name})")
+
+    archive_table = period_table(start, period, ARCHIVE_PREFIX)
+    if archive:
+        connection.execute(text(f"DROP TABLE IF EXISTS {archive_table};"))
+        connection.execute(text(f"CREATE TABLE {archive_table} LIKE {TRAFFIC_STOPS_TABLE};"))
+        connection.execute(text(f"ALTER TABLE {archive_table} REMOVE PARTITIONING;"))
+        connection.execute(text(f"ALTER TABLE {TRAFFIC_STOPS_TABLE} EXCHANGE PARTITION {name} WITH TABLE {archive_table};"))
+    connection.execute(text(f"ALTER TABLE {TRAFFIC_STOPS_TABLE} DROP PARTITION {name};"))
+    delete_rollup_period(connection, start, period)
+    if profiles_stop_id is not None:
+        recomputed = recompute_staged_profiles(connection, profiles_stop_id)
+        print(f"SUCCESS: Recomputed {recomputed} vehicle profiles without period {name}.")
+    bump_data_version(connection)
+    connection.commit()
+    return archive_table if archive else None
+
+def explain_partitions(connection, query):
+    # The partitions MySQL reads for a query, from EXPLAIN's partitions column.
+    touched = set()
+    for row in connection.execute(text(f"EXPLAIN {query}")).mappings():
+        if row.get('table') == TRAFFIC_STOPS_TABLE and row.get('partitions'):
+            touched.update(row['partitions'].split(","))
+    return sorted(touched)
+
+# --- DuckDB stand-in: one table per period behind a UNION ALL view ----------
+
+def duckdb_period_tables(connection, prefix=TRAFFIC_STOPS_TABLE):
+    # {period start: table name} for the stand-in's period tables.
+    names = [row[0] for row in connection.execute(
+        "SELECT table_name FROM duckdb_tables() WHERE table_name LIKE ?;", [f"{prefix}_p%"]
+    ).fetchall()]
+    tables = {}
+    for name in names:
+        start = partition_period_start(name[len(prefix) + 1:])
+        if start is not None:
+            tables[start] = name
+    return dict(sorted(tables.items()))
+
+def create_union_view(connection, period):
+    # Each branch repeats its period as a filter, so a date predicate on the
+    # view lets DuckDB skip the other tables without reading them.
+    tables = duckdb_period_tables(connection)
+    if not tables:
+        raise ValueError(f"No period tables left to build '{TRAFFIC_STOPS_TABLE}' from.")
+    branches = "\nUNION ALL\n".join(
+        f"SELECT * FROM {table} WHERE stop_date >= DATE '{start.isoformat()}' "
+        f"AND stop_date < DATE '{next_period(start, period).isoformat()}'"
+        for start, table in tables.items()
+    )
+    connection.execute(f"CREATE OR REPLACE VIEW {TRAFFIC_STOPS_TABLE} AS\n{branches};")
+
+def split_duckdb_periods(connection, source_table, period=PARTITION_PERIOD):
+    # Copies source_table into one table per period, in stop_id order, and
+    # puts the union view in front of them.
+    check_period(period)
+    first_day, last_day = connection.execute(f"SELECT MIN(stop_date), MAX(stop_date) FROM {source_table};").fetchone()
+    if first_day is None:
+        raise ValueError(f"'{source_table}' is empty; there is nothing to partition.")
+    for start in periods_between(first_day, last_day, period):
+        connection.execute(f"""
+            CREATE TABLE {period_table(start, period)} AS
+            SELECT * FROM {source_table}
+            WHERE stop_date >= DATE '{start.isoformat()}' AND stop_date < DATE '{next_period(start, period).isoformat()}'
+            ORDER BY stop_id;
+        """)
+    create_union_view(connection, period)
+
+def retire_duckdb_period(connection, value, archive=False):
+    # Dropping or renaming a period table and rebuilding the view; no rows move.
+    # The stand-in's profiles are rebuilt from what is left.
+    tables = duckdb_period_tables(connection)
+    if not tables:
+        raise ValueError(f"The stand-in's '{TRAFFIC_STOPS_TABLE}' is not partitioned; run --mode duckdb first.")
+    period = name_period(next(iter(tables.values()))[len(TRAFFIC_STOPS_TABLE) + 1:])
+    start = parse_period(value, period)
+    if start not in tables:
+        raise ValueError(f"The stand-in has no table for the period starting {start.isoformat()}.")
+    if len(tables) == 1:
+        raise ValueError("The last period cannot be removed; the view needs at least one table.")
+    archive_table = period_table(start, period, ARCHIVE_PREFIX)
+    if archive:
+        connection.execute(f"DROP TABLE IF EXISTS {archive_table};")
+        connection.execute(f"ALTER TABLE {tables[start]} RENAME TO {archive_table};")
+    else:
+        connection.execute(f"DROP TABLE {tables[start]};")
+    create_union_view(connection, period)
+    connection.execute(f"DROP TABLE IF EXISTS {PROFILE_TABLE};")
+    build_standin_profiles(connection)
+    bump_standin_data_version(connection)
+    return archive_table if archive else None
+
+# --- Windowed queries, for EXPLAIN and the benchmark -------------------------
+
+def windowed_queries(last_day, table_name=TRAFFIC_STOPS_TABLE):
+    # Date-bounded work the dashboard and detector do, anchored on the newest
+    # stop so the windows hold data on any data set.
+    window_start = (last_day - timedelta(days=WINDOW_DAYS)).isoformat()
+    month_start = date(last_day.year, last_day.month, 1)
+    month_end = next_period(month_start, "month").isoformat()
+    quarter_start = (last_day - timedelta(days=90)).isoformat()
+    return {
+        'window_speeding': f"""
+            SELECT vehicle_number, COUNT(*) AS stops FROM {table_name}
+            WHERE violation = 'Speeding' AND vehicle_number != 'Unknown' AND stop_date >= '{window_start}'
+            GROUP BY vehicle_number HAVING COUNT(*) >= 3
+        """,
+        'recent_activity': f"""
+            SELECT * FROM {table_name} WHERE stop_date >= '{window_start}'
+            ORDER BY stop_date DESC, stop_time DESC LIMIT 20
+        """,
+        'month_by_violation': f"""
+            SELECT violation, COUNT(*) AS stops FROM {table_name}
+            WHERE stop_date >= '{month_start.isoformat()}' AND stop_date < '{month_end}'
+            GROUP BY violation
+        """,
+        'quarter_arrest_rate': f"""
+            SELECT country_name, AVG(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) AS arrest_rate
+            FROM {table_name} WHERE stop_date >= '{quarter_start}'
+            GROUP BY country_name
+        """,
+    }
+
+def report_partitions(engine):
+    with engine.connect() as connection:
+        if connection.dialect.name == "duckdb":
+            raw = connection.connection.dbapi_connection
+            for start, table in duckdb_period_tables(raw).items():
+                rows = raw.execute(f"SELECT COUNT(*) FROM {table};").fetchone()[0]
+                print(f"    {table:<32} {rows:>12,}")
+            return
+        partitions = table_partitions(connection)
+        if not partitions:
+            print(f"'{TRAFFIC_STOPS_TABLE}' is not partitioned.")
+            return
+        for name, _, rows in partitions:
+            print(f"    {name:<12} ~{rows:>12,} rows")
+        last_day = connection.execute(text(f"SELECT MAX(stop_date) FROM {TRAFFIC_STOPS_TABLE};")).scalar()
+        if last_day is None:
+            return
+        print(f"PRUNING: partitions read per windowed query ({len(partitions)} in total)")
+        for name, query in windowed_queries(last_day).items():
+            touched = explain_partitions(connection, query)
+            print(f"    {name:<24} {len(touched):>4}  {', '.join(touched)}")
+
+def retire_period(value, archive=False, backend=None, db_path=DUCKDB_PATH):
+    action = "Archived" if archive else "Dropped"
+    start_time = time.perf_counter()
+    engine = get_engine(backend)
+    if engine.dialect.name == "duckdb":
+        # The shared engine is read-only; retention needs its own writer.
+        import duckdb
+
+        engine.dispose()
+        connection = duckdb.connect(db_path)
+        try:
+            archive_table = retire_duckdb_period(connection, value, archive)
+        finally:
+            connection.close()
+    else:
+        with engine.connect() as connection:
+            archive_table = retire_mysql_period(connection, value, archive)
+    destination = f" into '{archive_table}'" if archive_table else ""
+    print(f"SUCCESS: {action} period {value}{destination} in {time.perf_counter() - start_time:.2f}s.")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Inspect and retire stop_date partitions of traffic_stops.")
+    parser.add_argument("--mode", choices=["report", "drop", "archive"], default="report",
+                        help="'report' lists partitions and, on MySQL, which ones windowed queries read; "
+                             "'drop' removes a period; 'archive' moves it into its own table first.")
+    parser.add_argument("--period", help="Period to drop or archive: 2020-01 when partitioned by month, 2020 by year.")
+    parser.add_argument("--backend", choices=["mysql", "duckdb"], help="Database to work on (default SECURECHECK_BACKEND).")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.mode == "report":
+        report_partitions(get_engine(args.backend))
+    elif not args.period:
+        print("ERROR: --period is required to drop or archive a period.")
+    else:
+        try:
+            retire_period(args.period, args.mode == "archive", args.backend)
+        except ValueError as e:
+            print(f"ERROR: {e}")
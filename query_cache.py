@@ -0,0 +1,136 @@
+import re
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import text
+
+DATA_VERSION_TABLE = "data_version"
+RESULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+_QUOTED_OR_SPACE = re.compile(r"('(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\")|\s+")
+
+def create_data_version_table(connection):
+    connection.execute(text(f"""
+    CREATE TABLE IF NOT EXISTS {DATA_VERSION_TABLE} (
+        id TINYINT PRIMARY KEY,
+        version BIGINT NOT NULL,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    );
+    """))
+
+def bump_data_version(connection):
+    # Every writer (ingest, detector, flag resolution) bumps the counter so
+    # readers holding cached results know to drop them.
+    create_data_version_table(connection)
+    connection.execute(text(f"""
+        INSERT INTO {DATA_VERSION_TABLE} (id, version) VALUES (1, 1)
+        ON DUPLICATE KEY UPDATE version = version + 1;
+    """))
+
+def bump_standin_data_version(connection):
+    # The same counter in the DuckDB stand-in, on a raw duckdb connection. A
+    # new stand-in starts from the export time in milliseconds, so it never
+    # repeats the version of the copy it replaces.
+    connection.execute(f"""
+    CREATE TABLE IF NOT EXISTS {DATA_VERSION_TABLE} (
+        id TINYINT PRIMARY KEY,
+        version BIGINT NOT NULL,
+        updated_at TIMESTAMP
+    );
+    """)
+    connection.execute(f"""
+        INSERT INTO {DATA_VERSION_TABLE} VALUES (1, epoch_ms(now()), now())
+        ON CONFLICT (id) DO UPDATE SET version = version + 1, updated_at = now();
+    """)
+
+def read_data_version(connection):
+    try:
+        version = connection.execute(text(f"SELECT version FROM {DATA_VERSION_TABLE} WHERE id = 1;")).scalar()
+    except Exception:
+        connection.rollback()
+        return 0
+    return version or 0
+
+def normalize_sql(query):
+    # Collapses whitespace and drops the trailing semicolon, leaving quoted
+    # literals untouched, so formatting differences share one cache entry.
+    normalized = _QUOTED_OR_SPACE.sub(lambda match: match.group(1) or " ", query)
+    return normalized.strip().rstrip(";").strip()
+
+def cache_key(query, params=None):
+    if params is None:
+        frozen_params = None
+    elif isinstance(params, dict):
+        frozen_params = tuple(sorted(params.items()))
+    else:
+        frozen_params = tuple(params)
+    return (normalize_sql(str(query)), frozen_params)
+
+class QueryResultCache:
+    # LRU cache of query results bounded by the DataFrames' memory footprint.
+    # Entries belong to one data version and are dropped when it changes.
+
+    def __init__(self, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.data_version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def sync_version(self, data_version):
+        with self.lock:
+            if data_version != self.data_version:
+                if self.entries:
+                    self.invalidations += 1
+                self.entries.clear()
+                self.current_bytes = 0
+                self.data_version = data_version
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0].copy()
+
+    def put(self, key, df, data_version):
+        # Returns the DataFrame's size in bytes. data_version is the version
+        # the caller saw before reading; if it has moved on since, the result
+        # may hold old data and is not stored.
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            return size
+        with self.lock:
+            if data_version != self.data_version:
+                return size
+            if key in self.entries:
+                self.current_bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (df.copy(), size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+        return size
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self.entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'data_version': self.data_version,
+            }
@@ -0,0 +1,286 @@
+import contextvars
+import itertools
+import json
+import queue
+import re
+import threading
+import time
+
+from sqlalchemy import text
+
+import backend
+from instrumentation import METRICS
+
+DEFAULT_ROW_CAP = 100000
+EXPORT_ROW_CAP = 5000000
+STATEMENT_TIMEOUT_SECONDS = 60
+# EXPLAIN estimates: above WARN the query runs with a warning, above REJECT it
+# is refused. Rows are the largest intermediate result in the plan, so a cross
+# join is caught even when its final output would be small.
+WARN_ESTIMATED_ROWS = 1000000
+REJECT_ESTIMATED_ROWS = 100000000
+WARN_QUERY_COST = 1000000
+REJECT_QUERY_COST = 100000000
+MAX_QUERIES_PER_USER = 1
+# Kept below backend.MYSQL_POOL_SIZE so custom SQL can never take every pooled
+# connection away from the dashboard panels and the detector.
+MAX_CUSTOM_QUERIES = 3
+POLL_SECONDS = 0.5
+BATCH_QUEUE_SIZE = 2
+# Statements that write, whichever clause they hide behind (WITH ... DELETE).
+# INSERT( and REPLACE( are MySQL string functions, not statements.
+WRITE_KEYWORDS = (r"\b(DELETE|UPDATE|INSERT(?!\s*\()|REPLACE(?!\s*\()|MERGE|UPSERT|CREATE|DROP|ALTER|TRUNCATE|RENAME|"
+                  r"GRANT|REVOKE|CALL|LOAD|COPY|ATTACH|DETACH|INSTALL|PRAGMA|HANDLER|DO)\b")
+FORBIDDEN_CLAUSES = r"\b(INTO\s+(OUTFILE|DUMPFILE|@)|FOR\s+UPDATE|FOR\s+SHARE|LOCK\s+IN\s+SHARE\s+MODE|SLEEP\s*\(|BENCHMARK\s*\(|GET_LOCK\s*\()"
+
+class QueryRejected(ValueError):
+    pass
+
+_LITERAL_OR_COMMENT = re.compile(
+    r"('(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`)|--[^\n]*|#[^\n]*|/\*.*?(?:\*/|$)", flags=re.DOTALL
+)
+
+_running = {}
+_running_lock = threading.Lock()
+_query_ids = itertools.count(1)
+
+def strip_comments(query):
+    # Drops --, # and /* */ comments outside quoted strings and identifiers.
+    return _LITERAL_OR_COMMENT.sub(lambda match: match.group(1) or " ", query)
+
+def normalize_select(query):
+    # One read-only statement, without comments or trailing semicolons. A
+    # WITH query passes only if nothing in it writes.
+    query = strip_comments(query).strip().rstrip(";").strip()
+    if not re.match(r"(SELECT|WITH)\b", query, flags=re.IGNORECASE):
+        raise QueryRejected("Only SELECT queries are allowed.")
+    unquoted = _LITERAL_OR_COMMENT.sub("''", query)
+    if ";" in unquoted:
+        raise QueryRejected("Only one statement can be run at a time.")
+    match = re.search(FORBIDDEN_CLAUSES, unquoted, flags=re.IGNORECASE)
+    if match:
+        raise QueryRejected(f"'{match.group(0).strip()}' is not allowed in custom queries.")
+    match = re.search(WRITE_KEYWORDS, unquoted, flags=re.IGNORECASE)
+    if match:
+        raise QueryRejected(f"'{match.group(0).upper()}' is not allowed; only SELECT queries can run.")
+    return query
+
+def cap_rows(query, row_cap):
+    # Returns (query, capped). A trailing LIMIT above the cap is lowered; a
+    # query without one gets the cap appended.
+    match = re.search(r"\bLIMIT\s+(\d+)(\s*(?:,|OFFSET)\s*(\d+))?\s*$", query, flags=re.IGNORECASE)
+    if match is None:
+        return f"{query}\nLIMIT {row_cap}", True
+    if match.group(2) and "," in match.group(2):
+        # LIMIT offset, count
+        offset, count = int(match.group(1)), int(match.group(3))
+        if count <= row_cap:
+            return query, False
+        return query[:match.start()] + f"LIMIT {offset}, {row_cap}", True
+    if int(match.group(1)) <= row_cap:
+        return query, False
+    return query[:match.start()] + f"LIMIT {row_cap}" + (match.group(2) or ""), True
+
+def plan_values(node, key):
+    # Every value stored under key anywhere in MySQL's JSON plan.
+    if isinstance(node, dict):
+        for name, value in node.items():
+            if name == key:
+                yield value
+            else:
+                yield from plan_values(value, key)
+    elif isinstance(node, list):
+        for value in node:
+            yield from plan_values(value, key)
+
+def duckdb_node_rows(node):
+    # DuckDB leaves cross products unestimated; their size is the product of
+    # their inputs. Returns (rows this node produces, largest in its subtree).
+    children = [duckdb_node_rows(child) for child in node.get('children', [])]
+    estimate = node.get('extra_info', {}).get("Estimated Cardinality")
+    if estimate is not None:
+        rows = int(estimate)
+    elif node.get('name') == "CROSS_PRODUCT" and children:
+        rows = 1
+        for child_rows, _ in children:
+            rows *= child_rows
+    else:
+        rows = max((child_rows for child_rows, _ in children), default=0)
+    return rows, max([rows] + [largest for _, largest in children])
+
+def estimate(connection, query):
+    # Returns (estimated rows, query cost); either is None when the plan does
+    # not say. DuckDB has no cost figure, only per-operator row estimates.
+    if connection.dialect.name == "duckdb":
+        query, _ = backend.translate(query, None, "duckdb")
+        plan = json.loads(connection.exec_driver_sql("EXPLAIN (FORMAT JSON) " + query).fetchall()[0][-1])
+        rows = [duckdb_node_rows(node)[1] for node in plan]
+        return (max(rows) if rows else None), None
+    plan = json.loads(connection.exec_driver_sql("EXPLAIN FORMAT=JSON " + query).scalar())
+    rows = [float(value) for value in plan_values(plan, "rows_produced_per_join")]
+    rows += [float(value) for value in plan_values(plan, "rows_examined_per_scan")]
+    costs = [float(value) for value in plan_values(plan.get('query_block', {}).get('cost_info', {}), "query_cost")]
+    return (int(max(rows)) if rows else None), (costs[0] if costs else None)
+
+def review(query, row_cap=DEFAULT_ROW_CAP, engine=None):
+    # Checks a custom query before it runs. Raises QueryRejected, or returns
+    # the query to run plus the estimates and any warnings.
+    query = normalize_select(query)
+    capped_query, capped = cap_rows(query, row_cap)
+    engine = engine or backend.get_engine()
+    with engine.connect() as connection:
+        try:
+            estimated_rows, cost = estimate(connection, query)
+        except Exception as e:
+            # A query the planner cannot explain will not run either.
+            raise QueryRejected(f"Query could not be planned: {e}")
+
+    warnings = []
+    if capped:
+        warnings.append(f"Result limited to {row_cap:,} rows.")
+    if estimated_rows is not None and estimated_rows > REJECT_ESTIMATED_ROWS:
+        raise QueryRejected(f"Estimated {estimated_rows:,} rows exceeds the limit of {REJECT_ESTIMATED_ROWS:,}; "
+                            "add filters or a join condition.")
+    if cost is not None and cost > REJECT_QUERY_COST:
+        raise QueryRejected(f"Estimated cost {cost:,.0f} exceeds the limit of {REJECT_QUERY_COST:,}; "
+                            "add filters or a join condition.")
+    if estimated_rows is not None and estimated_rows > WARN_ESTIMATED_ROWS:
+        warnings.append(f"The plan estimates {estimated_rows:,} rows; this may take a while.")
+    elif cost is not None and cost > WARN_QUERY_COST:
+        warnings.append(f"The plan's estimated cost is {cost:,.0f}; this may take a while.")
+    return {
+        'query': capped_query,
+        'estimated_rows': estimated_rows,
+        'cost': cost,
+        'warnings': warnings,
+    }
+
+def active_queries(user=None):
+    with _running_lock:
+        return [
+            {'query_id': query_id, 'user': entry['user'], 'query': entry['query'],
+             'seconds': time.perf_counter() - entry['started']}
+            for query_id, entry in _running.items()
+            if user is None or entry['user'] == user
+        ]
+
+def register(user, query):
+    with _running_lock:
+        if sum(1 for entry in _running.values() if entry['user'] == user) >= MAX_QUERIES_PER_USER:
+            raise QueryRejected(f"You already have {MAX_QUERIES_PER_USER} custom "
+                                f"quer{'y' if MAX_QUERIES_PER_USER == 1 else 'ies'} running; cancel or wait for it.")
+        if len(_running) >= MAX_CUSTOM_QUERIES:
+            raise QueryRejected("Too many custom queries are running; try again shortly.")
+        query_id = next(_query_ids)
+        _running[query_id] = {
+            'user': user, 'query': query, 'started': time.perf_counter(),
+            'dialect': None, 'connection_id': None, 'raw': None, 'cancelled': False,
+        }
+        return query_id
+
+def unregister(query_id):
+    with _running_lock:
+        _running.pop(query_id, None)
+
+def cancel(query_id, engine=None):
+    # MySQL: KILL QUERY from a separate connection stops the statement but
+    # keeps its connection. DuckDB: interrupt the connection running it.
+    with _running_lock:
+        entry = _running.get(query_id)
+        if entry is None:
+            return False
+        entry['cancelled'] = True
+        dialect, connection_id, raw = entry['dialect'], entry['connection_id'], entry['raw']
+    if dialect == "duckdb" and raw is not None:
+        raw.interrupt()
+    elif connection_id is not None:
+        with (engine or backend.get_engine()).connect() as connection:
+            connection.execute(text(f"KILL QUERY {int(connection_id)};"))
+    return True
+
+def cancel_user_queries(user, engine=None):
+    return sum(1 for entry in active_queries(user) if cancel(entry['query_id'], engine))
+
+def stream_worker(engine, query_id, query, timeout_seconds, batches):
+    # Runs in its own thread and hands batches over through a bounded queue,
+    # so at most BATCH_QUEUE_SIZE batches are in memory while the page draws.
+    try:
+        with engine.connect() as connection:
+            entry = _running[query_id]
+            entry['dialect'] = connection.dialect.name
+            # The query runs read-only whatever got past normalize_select:
+            # MySQL refuses writes in a READ ONLY transaction, and DuckDB's
+            # transaction is always rolled back.
+            if connection.dialect.name == "duckdb":
+                entry['raw'] = connection.connection.dbapi_connection
+                entry['raw'].execute("BEGIN TRANSACTION;")
+            else:
+                entry['connection_id'] = connection.execute(text("SELECT CONNECTION_ID();")).scalar()
+                connection.execute(text(f"SET SESSION MAX_EXECUTION_TIME = {int(timeout_seconds * 1000)};"))
+                connection.commit()
+                connection.execute(text("START TRANSACTION READ ONLY;"))
+            try:
+                for batch in backend.stream_batches(connection, query):
+                    if entry['cancelled']:
+                        break
+                    batches.put(batch)
+            finally:
+                if connection.dialect.name == "duckdb":
+                    entry['raw'].execute("ROLLBACK;")
+                elif not connection.invalidated:
+                    connection.rollback()
+                    connection.execute(text("SET SESSION MAX_EXECUTION_TIME = 0;"))
+        batches.put(StopIteration())
+    except Exception as e:
+        batches.put(e)
+
+def run_governed(query, user, timeout_seconds=STATEMENT_TIMEOUT_SECONDS, engine=None):
+    # Yields RecordBatches of a reviewed query, and None every POLL_SECONDS
+    # while waiting so the caller can redraw progress (in Streamlit, that is
+    # also when a Cancel click interrupts the script). Leaving the loop early,
+    # for any reason, cancels the statement on the server.
+    engine = engine or backend.get_engine()
+    query_id = register(user, query)
+    batches = queue.Queue(maxsize=BATCH_QUEUE_SIZE)
+    # The worker runs in a copy of the caller's context so its statements are
+    # attributed to the page that started them.
+    worker = threading.Thread(target=contextvars.copy_context().run,
+                              args=(stream_worker, engine, query_id, query, timeout_seconds, batches), daemon=True)
+    started = time.perf_counter()
+    finished = False
+    rows = 0
+    nbytes = 0
+    try:
+        worker.start()
+        while True:
+            try:
+                item = batches.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                if time.perf_counter() - started > timeout_seconds:
+                    raise TimeoutError(f"Query exceeded the {timeout_seconds}s limit and was cancelled.")
+                yield None
+                continue
+            if isinstance(item, StopIteration):
+                finished = True
+                return
+            if isinstance(item, Exception):
+                finished = True
+                if "maximum statement execution time exceeded" in str(item).lower():
+                    raise TimeoutError(f"Query exceeded the {timeout_seconds}s limit and was cancelled.")
+                if _running.get(query_id, {}).get('cancelled'):
+                    raise QueryRejected("Query was cancelled.")
+                raise item
+            rows += item.num_rows
+            nbytes += item.nbytes
+            yield item
+    finally:
+        METRICS.record_result(query, None, rows, nbytes)
+        if not finished:
+            cancel(query_id, engine)
+            # Unblock a worker waiting on the full queue so it can exit.
+            while worker.is_alive():
+                try:
+                    batches.get(timeout=POLL_SECONDS)
+                except queue.Empty:
+                    pass
+        unregister(query_id)
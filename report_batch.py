@@ -0,0 +1,194 @@
+import argparse
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import text
+
+from backend import get_engine, read_frame
+from insights import INSIGHTS
+from query_cache import read_data_version
+
+BUNDLE_ROOT = "report_bundles"
+LATEST_POINTER = "LATEST"
+MANIFEST_NAME = "manifest.json"
+DEFAULT_WORKERS = 4
+DEFAULT_TIMEOUT_SECONDS = 300
+DEFAULT_KEEP_BUNDLES = 7
+BUNDLE_FORMATS = ("parquet", "csv")
+
+def report_slug(name):
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+
+def run_report(engine, name, query, timeout_seconds):
+    # MAX_EXECUTION_TIME makes MySQL abort the SELECT itself, so a runaway
+    # report does not keep holding a worker and a connection after it times out.
+    # The embedded engine relies on the batch's wall-clock guard alone.
+    started = time.perf_counter()
+    with engine.connect() as connection:
+        if connection.dialect.name != "mysql":
+            return read_frame(connection, query), time.perf_counter() - started
+        connection.execute(text(f"SET SESSION MAX_EXECUTION_TIME = {int(timeout_seconds * 1000)};"))
+        try:
+            df = read_frame(connection, query)
+        finally:
+            connection.execute(text("SET SESSION MAX_EXECUTION_TIME = 0;"))
+    return df, time.perf_counter() - started
+
+def write_report(bundle_dir, name, df, formats):
+    files = {}
+    slug = report_slug(name)
+    if "parquet" in formats:
+        files['parquet'] = f"{slug}.parquet"
+        df.to_parquet(os.path.join(bundle_dir, files['parquet']), index=False)
+    if "csv" in formats:
+        files['csv'] = f"{slug}.csv"
+        df.to_csv(os.path.join(bundle_dir, files['csv']), index=False)
+    return files
+
+def run_all_reports(report_names=None, workers=DEFAULT_WORKERS, timeout_seconds=DEFAULT_TIMEOUT_SECONDS,
+                    bundle_root=BUNDLE_ROOT, formats=BUNDLE_FORMATS):
+    names = report_names or list(INSIGHTS.keys())
+    unknown = [name for name in names if name not in INSIGHTS]
+    if unknown:
+        raise ValueError(f"Unknown reports: {', '.join(unknown)}")
+
+    engine = get_engine()
+    with engine.connect() as connection:
+        data_version = read_data_version(connection)
+
+    created_at = datetime.now()
+    bundle_id = f"{created_at:%Y%m%dT%H%M%S}_v{data_version}"
+    bundle_dir = os.path.join(bundle_root, bundle_id)
+    # The bundle is written under a temporary name and renamed when complete,
+    # so readers never see a half-written bundle.
+    tmp_dir = bundle_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    print(f"Running {len(names)} reports with {workers} workers (timeout {timeout_seconds}s per report)...")
+    batch_started = time.perf_counter()
+    reports = {}
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {
+            executor.submit(run_report, engine, name, INSIGHTS[name], timeout_seconds): name
+            for name in names
+        }
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=timeout_seconds)
+            if not done:
+                # The server-side limit should have fired by now; give up on
+                # whatever is still running rather than hang the batch.
+                for future in pending:
+                    future.cancel()
+                    reports[futures[future]] = {'status': "timeout", 'error': f"no result after {timeout_seconds}s"}
+                    print(f"  TIMEOUT {futures[future]}")
+                break
+            for future in done:
+                name = futures[future]
+                try:
+                    df, seconds = future.result()
+                except Exception as e:
+                    status = "timeout" if "maximum statement execution time exceeded" in str(e).lower() else "error"
+                    reports[name] = {'status': status, 'error': str(e)}
+                    print(f"  {status.upper()} {name}: {e}")
+                    continue
+                files = write_report(tmp_dir, name, df, formats)
+                reports[name] = {
+                    'status': "ok",
+                    'rows': len(df),
+                    'columns': list(df.columns),
+                    'seconds': round(seconds, 3),
+                    'files': files,
+                }
+                print(f"  {name}: {len(df)} rows in {seconds:.2f}s")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    manifest = {
+        'bundle_id': bundle_id,
+        'created_at': created_at.isoformat(timespec="seconds"),
+        'data_version': data_version,
+        'workers': workers,
+        'timeout_seconds': timeout_seconds,
+        'total_seconds': round(time.perf_counter() - batch_started, 3),
+        'reports': {name: reports[name] for name in names if name in reports},
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_NAME), "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.rename(tmp_dir, bundle_dir)
+    set_latest_bundle(bundle_root, bundle_id)
+
+    failed = [name for name, report in manifest['reports'].items() if report['status'] != "ok"]
+    print(f"Bundle {bundle_id} written to {bundle_dir} in {manifest['total_seconds']:.2f}s "
+          f"({len(names) - len(failed)} ok, {len(failed)} failed).")
+    return manifest
+
+def set_latest_bundle(bundle_root, bundle_id):
+    pointer_path = os.path.join(bundle_root, LATEST_POINTER)
+    with open(pointer_path + ".tmp", "w") as pointer_file:
+        pointer_file.write(bundle_id + "\n")
+    os.replace(pointer_path + ".tmp", pointer_path)
+
+def latest_bundle(bundle_root=BUNDLE_ROOT):
+    # Returns (bundle_dir, manifest) for the newest complete bundle, or None.
+    try:
+        with open(os.path.join(bundle_root, LATEST_POINTER)) as pointer_file:
+            bundle_id = pointer_file.read().strip()
+        bundle_dir = os.path.join(bundle_root, bundle_id)
+        with open(os.path.join(bundle_dir, MANIFEST_NAME)) as manifest_file:
+            return bundle_dir, json.load(manifest_file)
+    except (OSError, ValueError):
+        return None
+
+def load_bundle_report(bundle_dir, manifest, name):
+    report = manifest['reports'].get(name)
+    if report is None or report['status'] != "ok":
+        return None
+    files = report['files']
+    if 'parquet' in files:
+        return pd.read_parquet(os.path.join(bundle_dir, files['parquet']))
+    return pd.read_csv(os.path.join(bundle_dir, files['csv']))
+
+def prune_bundles(bundle_root=BUNDLE_ROOT, keep=DEFAULT_KEEP_BUNDLES):
+    latest = latest_bundle(bundle_root)
+    latest_id = latest[1]['bundle_id'] if latest else None
+    bundle_ids = sorted(
+        entry for entry in os.listdir(bundle_root)
+        if os.path.isdir(os.path.join(bundle_root, entry)) and not entry.endswith(".tmp")
+    )
+    for bundle_id in bundle_ids[:-keep] if keep > 0 else []:
+        if bundle_id != latest_id:
+            shutil.rmtree(os.path.join(bundle_root, bundle_id))
+            print(f"Removed old bundle {bundle_id}.")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run every INSIGHTS report and export a versioned bundle.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Reports run concurrently.")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT_SECONDS,
+                        help="Per-report execution time limit in seconds.")
+    parser.add_argument("--output", default=BUNDLE_ROOT, help="Directory holding the bundles.")
+    parser.add_argument("--formats", default=",".join(BUNDLE_FORMATS),
+                        help="Comma-separated file formats to write (parquet, csv).")
+    parser.add_argument("--reports", help="Comma-separated report names to run instead of all of them.")
+    parser.add_argument("--keep", type=int, default=DEFAULT_KEEP_BUNDLES,
+                        help="Number of bundles to keep; older ones are deleted (0 keeps all).")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    formats = tuple(fmt.strip() for fmt in args.formats.split(",") if fmt.strip())
+    unsupported = set(formats) - set(BUNDLE_FORMATS)
+    if not formats or unsupported:
+        raise SystemExit(f"Unsupported formats: {', '.join(sorted(unsupported)) or '(none)'}")
+    report_names = args.reports.split(",") if args.reports else None
+
+    run_all_reports(report_names, args.workers, args.timeout, args.output, formats)
+    prune_bundles(args.output, args.keep)
@@ -0,0 +1,406 @@
+import argparse
+import bisect
+import json
+import random
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from datetime import date, datetime, time as dt_time, timedelta
+
+from sqlalchemy import text
+
+from query_cache import bump_data_version
+from vehicle_profiles import sync_profile_flags
+
+import detector
+from detector import (
+    DETECTOR_STATE_TABLE,
+    DRIVER_STATE_TABLE,
+    FLAGGED_VEHICLES_TABLE,
+    TRAFFIC_STOPS_TABLE,
+    VEHICLE_DAILY_STATE_TABLE,
+    create_flagged_vehicles_table,
+    get_db_connection,
+)
+
+POLL_INTERVAL_SECONDS = 1.0
+POLL_BATCH_SIZE = 5000
+CHECKPOINT_INTERVAL_SECONDS = 300
+FLAG_REWRITE_SECONDS = 60
+BENCHMARK_FLAGS_TABLE = "flagged_vehicles_benchmark"
+BENCHMARK_STOPS_TABLE = "traffic_stops_benchmark"
+BENCHMARK_INSERT_BATCH = 500
+
+STOP_COLUMNS = [
+    'stop_id', 'stop_date', 'vehicle_number', 'driver_gender', 'driver_race',
+    'violation', 'is_arrested', 'drugs_related_stop'
+]
+
+def stream_rules(rule_ids=None):
+    rules = [rule for rule in detector.active_rules(rule_ids) if 'stream' in rule]
+    skipped = [rule['rule_id'] for rule in detector.active_rules(rule_ids) if 'stream' not in rule]
+    if skipped:
+        print(f"WARNING: Rules without a 'stream' definition are not evaluated live: {', '.join(skipped)}")
+    return rules
+
+def new_state():
+    # driver_counts / vehicle_counts: key -> measure -> lifetime count
+    # windows: (vehicle, measure) -> sorted deque of stop datetimes in the window
+    # recent_flags: (vehicle, rule_id) -> time.monotonic() of the last write,
+    #   oldest write first
+    return {
+        'driver_counts': defaultdict(lambda: defaultdict(int)),
+        'vehicle_counts': defaultdict(lambda: defaultdict(int)),
+        'windows': defaultdict(deque),
+        'recent_flags': OrderedDict(),
+    }
+
+def stop_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, dt_time())
+    return datetime.fromisoformat(str(value))
+
+def warm_start(connection, state, rules):
+    # Loads the counters the incremental detector persisted, so live
+    # evaluation continues from the same history a full recompute would see.
+    lifetime = detector.collect_measures(rules, 'lifetime')
+    if lifetime:
+        rows = connection.execute(text(
+            f"SELECT vehicle_number, driver_gender, driver_race, {', '.join(lifetime)} FROM {DRIVER_STATE_TABLE};"
+        ))
+        for row in rows:
+            driver = (row.vehicle_number, row.driver_gender, row.driver_race)
+            for name in lifetime:
+                count = getattr(row, name)
+                state['driver_counts'][driver][name] += count
+                state['vehicle_counts'][row.vehicle_number][name] += count
+
+    windowed = detector.collect_measures(rules, 'window')
+    if windowed:
+        rows = connection.execute(text(
+            f"SELECT vehicle_number, stop_date, {', '.join(windowed)} FROM {VEHICLE_DAILY_STATE_TABLE} ORDER BY stop_date;"
+        ))
+        for row in rows:
+            for name in windowed:
+                state['windows'][(row.vehicle_number, name)].extend([stop_datetime(row.stop_date)] * getattr(row, name))
+
+def stream_measures(rules, scope):
+    measures = {}
+    for rule in rules:
+        if rule['scope'] == scope:
+            measures.update(rule['stream']['measures'])
+    return measures
+
+def evaluate_stop(state, rules, stop, now):
+    if stop['vehicle_number'] in (None, 'Unknown'):
+        return []
+
+    # Counters are updated once per measure, then every rule reads them, so
+    # rules sharing a measure never double-count a stop.
+    driver = (stop['vehicle_number'], stop['driver_gender'], stop['driver_race'])
+    for name, match in stream_measures(rules, 'lifetime').items():
+        if match(stop):
+            state['driver_counts'][driver][name] += 1
+            state['vehicle_counts'][stop['vehicle_number']][name] += 1
+
+    window_days = [rule['window_days'] for rule in rules if rule['scope'] == 'window']
+    if window_days:
+        oldest_start = now - timedelta(days=max(window_days))
+        stop_at = stop_datetime(stop['stop_date'])
+        for name, match in stream_measures(rules, 'window').items():
+            window = state['windows'][(stop['vehicle_number'], name)]
+            if match(stop) and stop_at >= oldest_start:
+                bisect.insort(window, stop_at)
+            while window and window[0] < oldest_start:
+                window.popleft()
+
+    flags = []
+    for rule in rules:
+        stream = rule['stream']
+        if rule['scope'] == 'new_stops':
+            measures = {name: int(match(stop)) for name, match in stream['measures'].items()}
+        elif rule['scope'] == 'window':
+            window_start = now - timedelta(days=rule['window_days'])
+            measures = {}
+            for name in stream['measures']:
+                window = state['windows'][(stop['vehicle_number'], name)]
+                measures[name] = len(window) - bisect.bisect_left(window, window_start)
+        elif rule['key'] == 'driver':
+            measures = state['driver_counts'][driver]
+        else:
+            measures = state['vehicle_counts'][stop['vehicle_number']]
+
+        if stream['threshold'](measures, stop):
+            flags.append((stop['vehicle_number'], rule['rule_id'], stream['reason'](measures, stop)))
+    return flags
+
+def expire_recent_flags(recent_flags, now):
+    # Entries are kept oldest first, so the expired ones are at the front.
+    while recent_flags and now - next(iter(recent_flags.values())) > FLAG_REWRITE_SECONDS:
+        recent_flags.popitem(last=False)
+
+def write_flags(connection, state, flags, table_name=FLAGGED_VEHICLES_TABLE):
+    # flags are (vehicle, rule_id, reason). uq_active_flag turns repeats of an
+    # active (vehicle, rule) flag into no-ops; the short in-memory memo only
+    # saves the round-trip for flags written moments ago.
+    now = time.monotonic()
+    recent_flags = state['recent_flags']
+    expire_recent_flags(recent_flags, now)
+    params_hashes = {rule['rule_id']: detector.rule_params_hash(rule) for rule in detector.DETECTION_RULES}
+    pending = []
+    for vehicle_number, rule_id, reason in flags:
+        flag = (vehicle_number, rule_id)
+        if flag not in recent_flags:
+            pending.append({'vehicle_num': vehicle_number, 'rule_id': rule_id,
+                            'params_hash': params_hashes[rule_id], 'reason_text': reason})
+            recent_flags[flag] = now
+    if not pending:
+        return 0
+    result = connection.execute(text(f"""
+        INSERT IGNORE INTO {table_name} (vehicle_number, rule_id, params_hash, flag_reason)
+        VALUES (:vehicle_num, :rule_id, :params_hash, :reason_text);
+    """), pending)
+    if result.rowcount and table_name == FLAGGED_VEHICLES_TABLE:
+        sync_profile_flags(connection, [flag['vehicle_num'] for flag in pending])
+        bump_data_version(connection)
+    connection.commit()
+    return result.rowcount
+
+def process_batch(connection, state, rules, stops, table_name=FLAGGED_VEHICLES_TABLE):
+    now = datetime.now()
+    flags = []
+    for stop in stops:
+        flags.extend(evaluate_stop(state, rules, stop, now))
+    return write_flags(connection, state, flags, table_name), len(flags)
+
+# --- Sources: each yields lists of stop dicts, possibly empty while idle ------
+
+def poll_table(engine, last_stop_id, interval=POLL_INTERVAL_SECONDS, batch_size=POLL_BATCH_SIZE,
+               table_name=TRAFFIC_STOPS_TABLE):
+    poll_query = text(f"""
+        SELECT {', '.join(STOP_COLUMNS)} FROM {table_name}
+        WHERE stop_id > :last_stop_id
+        ORDER BY stop_id
+        LIMIT :batch_size;
+    """)
+    while True:
+        with engine.connect() as connection:
+            rows = connection.execute(poll_query, {'last_stop_id': last_stop_id, 'batch_size': batch_size})
+            stops = [dict(row._mapping) for row in rows]
+        if stops:
+            last_stop_id = stops[-1]['stop_id']
+        yield stops
+        if len(stops) < batch_size:
+            time.sleep(interval)
+
+def tail_feed(path, interval=POLL_INTERVAL_SECONDS):
+    # One JSON object per line with the traffic_stops column names; lines are
+    # picked up as they are appended.
+    with open(path, 'a+') as feed:
+        feed.seek(0)
+        buffer = ""
+        while True:
+            chunk = feed.read()
+            if not chunk:
+                yield []
+                time.sleep(interval)
+                continue
+            buffer += chunk
+            lines = buffer.split("\n")
+            buffer = lines.pop()
+            yield [json.loads(line) for line in lines if line.strip()]
+
+def run_daemon(source="table", feed_path=None, rule_ids=None):
+    engine = get_db_connection()
+    rules = stream_rules(rule_ids)
+
+    print("Catching up with the incremental detector before going live...")
+    detector.run_incremental_detection(rule_ids)
+
+    state = new_state()
+    with engine.connect() as connection:
+        create_flagged_vehicles_table(connection)
+        warm_start(connection, state, rules)
+        last_stop_id = connection.execute(
+            text(f"SELECT last_stop_id FROM {DETECTOR_STATE_TABLE} WHERE state_key = :state_key;"),
+            {'state_key': TRAFFIC_STOPS_TABLE},
+        ).scalar() or 0
+        connection.commit()
+
+    if source == "feed":
+        batches = tail_feed(feed_path)
+    else:
+        batches = poll_table(engine, last_stop_id)
+    print(f"--- Streaming detector live ({source}) with {len(rules)} rules ---")
+
+    last_checkpoint = time.monotonic()
+    with engine.connect() as connection:
+        for stops in batches:
+            if stops:
+                new_flags, hits = process_batch(connection, state, rules, stops)
+                print(f"{datetime.now():%H:%M:%S} processed {len(stops)} stops, {hits} hits, {new_flags} new flags.")
+            # Stops read from traffic_stops are folded into the persisted
+            # detector state now and then, so a restart resumes from there.
+            if source == "table" and time.monotonic() - last_checkpoint > CHECKPOINT_INTERVAL_SECONDS:
+                detector.run_incremental_detection(rule_ids)
+                last_checkpoint = time.monotonic()
+
+# --- Benchmark ----------------------------------------------------------------
+
+def synthetic_stop(stop_id, plates):
+    return {
+        'stop_id': stop_id,
+        'stop_date': date.today(),
+        'vehicle_number': random.choice(plates),
+        'driver_gender': random.choice(['M', 'F']),
+        'driver_race': random.choice(['Asian', 'Black', 'Hispanic', 'Other', 'White']),
+        'violation': random.choices(['Speeding', 'Moving violation', 'Equipment', 'Other'], [0.5, 0.2, 0.2, 0.1])[0],
+        'is_arrested': random.random() < 0.05,
+        'drugs_related_stop': random.random() < 0.01,
+    }
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def create_benchmark_stops_table(connection):
+    connection.execute(text(f"DROP TABLE IF EXISTS {BENCHMARK_STOPS_TABLE};"))
+    connection.execute(text(f"""
+    CREATE TABLE {BENCHMARK_STOPS_TABLE} (
+        stop_id BIGINT PRIMARY KEY,
+        stop_date DATE,
+        vehicle_number VARCHAR(255),
+        driver_gender VARCHAR(50),
+        driver_race VARCHAR(50),
+        violation VARCHAR(255),
+        is_arrested BOOLEAN,
+        drugs_related_stop BOOLEAN
+    );
+    """))
+    connection.commit()
+
+def run_benchmark(total_stops=100000, rate=None, plate_count=5000):
+    # Inserts synthetic stops into a scratch stops table and measures until
+    # the daemon's path has read them with poll_table, evaluated them and
+    # committed their flag rows. Stops and flags go to scratch tables so
+    # traffic_stops and the real review queue are untouched.
+    engine = get_db_connection()
+    rules = stream_rules()
+    state = new_state()
+    plates = [f"BM{n:06d}" for n in range(plate_count)]
+    inserted_at = {}
+    producer_errors = []
+
+    def produce():
+        # Inserts the stops due by now, at most BENCHMARK_INSERT_BATCH per
+        # statement. Each batch's time is noted just before its commit, so it
+        # is set before the poller can see the rows; latencies include the
+        # commit itself.
+        insert_stop = text(f"""
+            INSERT INTO {BENCHMARK_STOPS_TABLE} ({', '.join(STOP_COLUMNS)})
+            VALUES ({', '.join(':' + column for column in STOP_COLUMNS)});
+        """)
+        try:
+            with engine.connect() as connection:
+                start = time.perf_counter()
+                next_id = 1
+                while next_id <= total_stops:
+                    due = total_stops if not rate else min(total_stops, int((time.perf_counter() - start) * rate))
+                    if due < next_id:
+                        time.sleep((next_id / rate) - (time.perf_counter() - start))
+                        continue
+                    last_id = min(due, next_id + BENCHMARK_INSERT_BATCH - 1)
+                    connection.execute(insert_stop, [synthetic_stop(stop_id, plates) for stop_id in range(next_id, last_id + 1)])
+                    committing_at = time.perf_counter()
+                    for stop_id in range(next_id, last_id + 1):
+                        inserted_at[stop_id] = committing_at
+                    connection.commit()
+                    next_id = last_id + 1
+        except Exception as e:
+            producer_errors.append(e)
+
+    with engine.connect() as connection:
+        create_benchmark_stops_table(connection)
+        create_flagged_vehicles_table(connection, BENCHMARK_FLAGS_TABLE)
+        connection.execute(text(f"DELETE FROM {BENCHMARK_FLAGS_TABLE};"))
+        connection.commit()
+
+        producer = threading.Thread(target=produce, daemon=True)
+        start = time.perf_counter()
+        producer.start()
+
+        stop_latencies = []
+        flag_latencies = []
+        untimed = 0
+        processed = 0
+        for stops in poll_table(engine, 0, table_name=BENCHMARK_STOPS_TABLE):
+            if producer_errors:
+                raise producer_errors[0]
+            if not stops:
+                continue
+            now = datetime.now()
+            read_at = time.perf_counter()
+            flagged_stops = []
+            flags = []
+            for stop in stops:
+                stop_flags = evaluate_stop(state, rules, stop, now)
+                if stop_flags:
+                    flagged_stops.append(stop)
+                    flags.extend(stop_flags)
+            write_flags(connection, state, flags, BENCHMARK_FLAGS_TABLE)
+            flagged_at = time.perf_counter()
+            # Stops without an insert time (not written by this run's
+            # producer) are counted apart rather than as zero latency.
+            untimed += sum(1 for stop in stops if stop['stop_id'] not in inserted_at)
+            stop_latencies.extend(read_at - inserted_at[stop['stop_id']] for stop in stops if stop['stop_id'] in inserted_at)
+            flag_latencies.extend(
+                flagged_at - inserted_at[stop['stop_id']] for stop in flagged_stops if stop['stop_id'] in inserted_at
+            )
+            processed += len(stops)
+            if processed >= total_stops:
+                break
+        elapsed = time.perf_counter() - start
+        producer.join()
+
+        flag_rows = connection.execute(text(f"SELECT COUNT(*) FROM {BENCHMARK_FLAGS_TABLE};")).scalar()
+        connection.execute(text(f"DROP TABLE {BENCHMARK_STOPS_TABLE};"))
+        connection.commit()
+
+    print(f"--- Streaming Detector Benchmark ---")
+    print(f"Stops processed:      {processed} in {elapsed:.2f}s ({processed / max(elapsed, 1e-9):,.0f} stops/sec sustained)")
+    print(f"Flags written:        {flag_rows} ({len(flag_latencies)} flagging stops)")
+    if untimed:
+        print(f"NOTE: {untimed} stops had no insert time and are left out of the latencies.")
+    print(f"Insert -> polled ms:  p50 {percentile(stop_latencies, 0.5) * 1000:.1f}, "
+          f"p95 {percentile(stop_latencies, 0.95) * 1000:.1f}, p99 {percentile(stop_latencies, 0.99) * 1000:.1f}")
+    print(f"Insert -> flag ms:    p50 {percentile(flag_latencies, 0.5) * 1000:.1f}, "
+          f"p95 {percentile(flag_latencies, 0.95) * 1000:.1f}, p99 {percentile(flag_latencies, 0.99) * 1000:.1f}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Near-real-time detector for checkpoint stop feeds.")
+    parser.add_argument("--source", choices=["table", "feed"], default="table",
+                        help="'table' polls traffic_stops for new stop_ids; 'feed' tails a JSON-lines file.")
+    parser.add_argument("--feed", help="Path of the JSON-lines feed file for --source feed.")
+    parser.add_argument("--rules", help="Comma-separated rule ids to run (default: all active rules).")
+    parser.add_argument("--benchmark", type=int, metavar="STOPS",
+                        help="Run the latency/throughput benchmark with this many synthetic stops instead.")
+    parser.add_argument("--rate", type=float, help="Benchmark arrival rate in stops/sec (default: as fast as possible).")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.benchmark:
+        run_benchmark(args.benchmark, args.rate)
+    else:
+        if args.source == "feed" and not args.feed:
+            print("ERROR: --source feed needs --feed <path>.")
+            exit()
+        rule_ids = set(args.rules.split(",")) if args.rules else None
+        try:
+            run_daemon(args.source, args.feed, rule_ids)
+        except KeyboardInterrupt:
+            print("--- Streaming detector stopped ---")
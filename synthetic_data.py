@@ -0,0 +1,188 @@
+import argparse
+import os
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from data_processor import TABLE_COLUMNS
+
+SYNTHETIC_CSV = "synthetic_stops.csv"
+DEFAULT_ROWS = 1000000
+GENERATE_CHUNK_ROWS = 1000000
+DEFAULT_DAYS = 3 * 365
+ROWS_PER_PLATE = 20
+MAX_PLATES = 5000000
+# Plate popularity follows a Zipf-like law: the rank-r plate gets weight
+# 1 / r**PLATE_SKEW, so a few vehicles account for many stops.
+PLATE_SKEW = 0.7
+# Repeat offenders: OFFENDER_PLATE_SHARE of all plates receive
+# OFFENDER_STOP_SHARE of all stops, concentrated in the last OFFENDER_DAYS,
+# mostly speeding and with high arrest and drug rates, so every detector rule
+# has something to find.
+OFFENDER_PLATE_SHARE = 0.002
+OFFENDER_STOP_SHARE = 0.03
+OFFENDER_DAYS = 30
+MISSING_SHARE = 0.01
+
+COUNTRIES = (['Canada', 'India', 'USA'], [0.3, 0.25, 0.45])
+GENDERS = (['M', 'F'], [0.68, 0.32])
+RACES = (['White', 'Black', 'Hispanic', 'Asian', 'Other'], [0.6, 0.15, 0.15, 0.07, 0.03])
+# violation_raw values and the violation group each one belongs to.
+VIOLATIONS = {
+    'Speeding': ('Speeding', 0.55),
+    'Other Traffic Violation': ('Moving violation', 0.17),
+    'Equipment/Inspection Violation': ('Equipment', 0.12),
+    'Registration Violation': ('Registration/plates', 0.05),
+    'Seatbelt Violation': ('Seat belt', 0.03),
+    'Call for Service': ('Other', 0.08),
+}
+SEARCH_TYPES = (['Incident to Arrest', 'Probable Cause', 'Inventory', 'Reasonable Suspicion', 'Protective Frisk'],
+                [0.35, 0.3, 0.15, 0.1, 0.1])
+OUTCOMES = (['Citation', 'Warning', 'No Action', 'N/D'], [0.75, 0.17, 0.05, 0.03])
+ARREST_OUTCOMES = ['Arrest Driver', 'Arrest Passenger']
+DURATIONS = (['0-15 Min', '16-30 Min', '30+ Min'], [0.8, 0.15, 0.05])
+# Stops per hour of day, busiest in the morning commute and early evening.
+HOUR_WEIGHTS = np.array([2, 1.5, 1, 1, 1, 1.5, 3, 5, 6, 6, 6, 6, 5.5, 5.5, 5, 5, 5.5, 6, 5, 4.5, 4, 3.5, 3, 2.5])
+
+LETTERS = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+PLATE_SPACE = 26 * 26 * 100 * 26 * 26 * 10000
+TIMES_OF_DAY = np.array([f"{minute // 60:02d}:{minute % 60:02d}" for minute in range(24 * 60)], dtype=object)
+
+def format_plates(codes):
+    # Plate codes become "AB12CD3456" plates.
+    parts = []
+    for base in (26, 26, 100, 26, 26, 10000):
+        parts.append(codes % base)
+        codes = codes // base
+    return (
+        pd.Series(LETTERS[parts[0]]) + LETTERS[parts[1]] + pd.Series(parts[2]).astype(str).str.zfill(2)
+        + LETTERS[parts[3]] + LETTERS[parts[4]] + pd.Series(parts[5]).astype(str).str.zfill(4)
+    ).to_numpy(dtype=object)
+
+def plate_numbers(plate_codes, plate_ids):
+    # Only the distinct plates of a chunk are formatted.
+    unique_ids, inverse = np.unique(plate_ids, return_inverse=True)
+    return format_plates(plate_codes[unique_ids])[inverse]
+
+def pick(rng, choices, size):
+    values, weights = choices
+    return np.array(values, dtype=object)[rng.choice(len(values), size=size, p=np.array(weights) / sum(weights))]
+
+def with_missing(rng, values, share=MISSING_SHARE):
+    values = values.astype(object)
+    values[rng.random(len(values)) < share] = None
+    return values
+
+def plate_cdf(plate_count, skew=PLATE_SKEW):
+    weights = 1.0 / np.arange(1, plate_count + 1) ** skew
+    return np.cumsum(weights) / weights.sum()
+
+def generate_chunk(rng, rows, plate_codes, cdf, offender_ids, date_strings):
+    offender = rng.random(rows) < OFFENDER_STOP_SHARE
+    plate_ids = np.searchsorted(cdf, rng.random(rows))
+    plate_ids[offender] = rng.choice(offender_ids, size=offender.sum())
+
+    # date_strings runs backwards from the end date.
+    day_offsets = rng.integers(0, len(date_strings), size=rows)
+    day_offsets[offender] = rng.integers(0, min(OFFENDER_DAYS, len(date_strings)), size=offender.sum())
+    hours = rng.choice(24, size=rows, p=HOUR_WEIGHTS / HOUR_WEIGHTS.sum())
+    minutes = rng.integers(0, 60, size=rows)
+
+    # The same vehicle is usually driven by the same person: gender and race
+    # come from the plate for 90% of stops.
+    plate_rng_values = (plate_ids * 2246822519) % 1000 / 1000.0
+    own_driver = rng.random(rows) < 0.9
+    genders = pick(rng, GENDERS, rows)
+    races = pick(rng, RACES, rows)
+    genders[own_driver] = np.where(plate_rng_values[own_driver] < GENDERS[1][0], 'M', 'F')
+    race_cdf = np.cumsum(RACES[1]) / sum(RACES[1])
+    races[own_driver] = np.array(RACES[0], dtype=object)[
+        np.minimum(np.searchsorted(race_cdf, (plate_rng_values[own_driver] * 7.31) % 1.0), len(RACES[0]) - 1)
+    ]
+    ages = np.clip(rng.gamma(6.0, 6.5, size=rows) + 15, 15, 90).astype(int)
+
+    raw_violations = list(VIOLATIONS)
+    violation_weights = np.array([VIOLATIONS[name][1] for name in raw_violations])
+    violation_index = rng.choice(len(raw_violations), size=rows, p=violation_weights / violation_weights.sum())
+    violation_index[offender & (rng.random(rows) < 0.8)] = raw_violations.index('Speeding')
+    violation_raw = np.array(raw_violations, dtype=object)[violation_index]
+    violation = np.array([VIOLATIONS[name][0] for name in raw_violations], dtype=object)[violation_index]
+
+    arrested = rng.random(rows) < np.where(offender, 0.6, 0.035)
+    searched = arrested | (rng.random(rows) < 0.035)
+    drugs = searched & (rng.random(rows) < np.where(offender, 0.3, 0.2))
+    outcomes = pick(rng, OUTCOMES, rows)
+    outcomes[arrested] = np.array(ARREST_OUTCOMES, dtype=object)[(rng.random(arrested.sum()) < 0.1).astype(int)]
+    search_types = pick(rng, SEARCH_TYPES, rows)
+    search_types[~searched] = None
+    durations = pick(rng, DURATIONS, rows)
+    durations[arrested & (rng.random(rows) < 0.6)] = '30+ Min'
+
+    ages_raw = with_missing(rng, ages)
+    ages_out = ages_raw.copy()
+    return pd.DataFrame({
+        'stop_date': date_strings[day_offsets],
+        'stop_time': TIMES_OF_DAY[hours * 60 + minutes],
+        'country_name': pick(rng, COUNTRIES, rows),
+        'driver_gender': with_missing(rng, genders),
+        'driver_age_raw': ages_raw,
+        'driver_age': ages_out,
+        'driver_race': with_missing(rng, races),
+        'violation_raw': violation_raw,
+        'violation': violation,
+        'search_conducted': searched,
+        'search_type': search_types,
+        'stop_outcome': outcomes,
+        'is_arrested': arrested,
+        'stop_duration': durations,
+        'drugs_related_stop': drugs,
+        'vehicle_number': with_missing(rng, plate_numbers(plate_codes, plate_ids)),
+    }, columns=TABLE_COLUMNS)
+
+def generate_csv(path=SYNTHETIC_CSV, rows=DEFAULT_ROWS, seed=42, end_date=None, days=DEFAULT_DAYS,
+                 plates=None, plate_skew=PLATE_SKEW, chunk_rows=GENERATE_CHUNK_ROWS):
+    # Writes rows stops in the layout of traffic_stops.csv, chunk by chunk so
+    # memory stays flat at any size. The same seed always gives the same file.
+    end_date = end_date or date.today()
+    date_strings = np.array([(end_date - timedelta(days=offset)).isoformat() for offset in range(days)], dtype=object)
+    plate_count = plates or max(1, min(MAX_PLATES, rows // ROWS_PER_PLATE))
+    cdf = plate_cdf(plate_count, plate_skew)
+    rng = np.random.default_rng(seed)
+    plate_codes = rng.choice(PLATE_SPACE, size=plate_count, replace=False)
+    offender_ids = rng.choice(plate_count, size=max(1, int(plate_count * OFFENDER_PLATE_SHARE)), replace=False)
+
+    start = time.perf_counter()
+    tmp_path = path + ".tmp"
+    written = 0
+    with open(tmp_path, "w", newline="") as csv_file:
+        while written < rows:
+            chunk_size = min(chunk_rows, rows - written)
+            chunk_rng = np.random.default_rng([seed, written])
+            chunk = generate_chunk(chunk_rng, chunk_size, plate_codes, cdf, offender_ids, date_strings)
+            chunk.to_csv(csv_file, index=False, header=written == 0)
+            written += chunk_size
+            elapsed = time.perf_counter() - start
+            print(f"PROGRESS: {written:,}/{rows:,} rows ({written / max(elapsed, 1e-9):,.0f} rows/sec)")
+    os.replace(tmp_path, path)
+    elapsed = time.perf_counter() - start
+    print(f"SUCCESS: Wrote {rows:,} synthetic stops over {plate_count:,} plates "
+          f"({len(offender_ids):,} repeat offenders) to '{path}' in {elapsed:.1f}s.")
+    return elapsed
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Write synthetic traffic stops in the layout of traffic_stops.csv.")
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS, help="Stops to generate (1M-100M are typical).")
+    parser.add_argument("--output", default=SYNTHETIC_CSV, help="CSV file to write.")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed; the same seed gives the same file.")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS, help="Days of history ending at --end-date.")
+    parser.add_argument("--end-date", type=date.fromisoformat, help="Last stop date (default today).")
+    parser.add_argument("--plates", type=int, help=f"Distinct plates (default rows / {ROWS_PER_PLATE}).")
+    parser.add_argument("--plate-skew", type=float, default=PLATE_SKEW,
+                        help="Zipf exponent of plate popularity; 0 spreads stops evenly.")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    generate_csv(args.output, args.rows, args.seed, args.end_date, args.days, args.plates, args.plate_skew)
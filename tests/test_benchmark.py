@@ -0,0 +1,69 @@
+import json
+from datetime import date
+
+import pandas as pd
+
+from benchmark import MIN_REGRESSION_MS, compare_results, prepare_csv
+from data_processor import TABLE_COLUMNS
+from synthetic_data import generate_csv
+
+END_DATE = date(2024, 6, 30)
+
+
+def write_results(path, rows, metrics):
+    path.write_text(json.dumps({
+        'meta': {'rows': rows},
+        'metrics': {name: {'value': value, 'unit': unit, 'better': better} for name, (value, unit, better) in metrics.items()},
+    }))
+    return path
+
+
+def test_compare_results_flags_changes_past_the_threshold(tmp_path):
+    base = write_results(tmp_path / "base.json", 1000, {
+        'query.slow_ms': (100.0, "ms", "lower"),
+        'query.steady_ms': (100.0, "ms", "lower"),
+        'ingest.rows_per_s': (1000.0, "rows/s", "higher"),
+        'ingest.faster_rows_per_s': (1000.0, "rows/s", "higher"),
+        'meta.peak_mb': (100.0, "MB", None),
+    })
+    new = write_results(tmp_path / "new.json", 1000, {
+        'query.slow_ms': (120.0, "ms", "lower"),
+        'query.steady_ms': (105.0, "ms", "lower"),
+        'ingest.rows_per_s': (850.0, "rows/s", "higher"),
+        'ingest.faster_rows_per_s': (1500.0, "rows/s", "higher"),
+        'meta.peak_mb': (500.0, "MB", None),
+    })
+    assert compare_results(base, new) == ['ingest.rows_per_s', 'query.slow_ms']
+    assert compare_results(base, new, threshold=0.5) == []
+
+
+def test_compare_results_ignores_small_absolute_ms_changes(tmp_path):
+    base = write_results(tmp_path / "base.json", 1000, {'query.fast_ms': (2.0, "ms", "lower")})
+    below = write_results(tmp_path / "below.json", 1000, {'query.fast_ms': (2.0 + MIN_REGRESSION_MS - 1, "ms", "lower")})
+    above = write_results(tmp_path / "above.json", 1000, {'query.fast_ms': (2.0 + MIN_REGRESSION_MS + 1, "ms", "lower")})
+    assert compare_results(base, below) == []
+    assert compare_results(base, above) == ['query.fast_ms']
+
+
+def test_generate_csv_is_deterministic_per_seed(tmp_path):
+    paths = {}
+    for name, seed in [("a", 7), ("b", 7), ("c", 8)]:
+        paths[name] = tmp_path / f"{name}.csv"
+        generate_csv(str(paths[name]), 500, seed, end_date=END_DATE, chunk_rows=200)
+    assert paths['a'].read_bytes() == paths['b'].read_bytes()
+    assert paths['a'].read_bytes() != paths['c'].read_bytes()
+
+
+def test_generate_csv_matches_the_table_layout(tmp_path):
+    path = tmp_path / "stops.csv"
+    generate_csv(str(path), 300, end_date=END_DATE, chunk_rows=128)
+    frame = pd.read_csv(path, dtype=str, keep_default_na=False)
+    assert list(frame.columns) == TABLE_COLUMNS
+    assert len(frame) == 300
+
+
+def test_prepare_csv_regenerates_on_a_row_count_mismatch(tmp_path):
+    path = tmp_path / "stops.csv"
+    generate_csv(str(path), 100, end_date=END_DATE)
+    assert prepare_csv(str(path), 250, 42) == 250
+    assert len(pd.read_csv(path, dtype=str)) == 250
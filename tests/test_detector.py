@@ -0,0 +1,31 @@
+from detector import active_rules, full_aggregates_query, new_stops_after, rule_params
+
+
+def test_new_stops_start_after_the_newest_mark_of_either_mode():
+    assert new_stops_after([], 3) == 0
+    assert new_stops_after([(120, 3)], 3) == 120
+    assert new_stops_after([(120, 3), (250, 3)], 3) == 250
+    assert new_stops_after([(250, 3), (120, 3)], 3) == 250
+
+
+def test_marks_from_an_earlier_load_are_ignored():
+    assert new_stops_after([(500, 2)], 3) == 0
+    assert new_stops_after([(500, 2), (40, 3)], 3) == 40
+
+
+def test_full_rerun_does_not_rescan_stops_it_already_flagged():
+    # A first full run with no state looks at every stop and records its
+    # mark; resolving a flag and running again must not bring it back, so the
+    # second run's 'new_stops' rules start past the first run's max stop_id.
+    second = rule_params(active_rules(), new_stops_after([(1000, 1)], 1), 1000)
+    assert second['new_stops_after'] == 1000
+
+
+def test_new_stops_measures_use_their_own_lower_bound():
+    rules = active_rules()
+    query = full_aggregates_query(rules)
+    assert "stop_id > :new_stops_after" in query
+    assert ":last_stop_id" not in query
+    params = rule_params(rules, 10, 100, new_stops_after=40)
+    assert (params['last_stop_id'], params['new_stops_after']) == (10, 40)
+    assert rule_params(rules, 10, 100)['new_stops_after'] == 10
@@ -0,0 +1,85 @@
+import os
+
+import pandas as pd
+
+import data_processor
+from data_processor import (add_row_hash, csv_source_position, iter_clean_chunks, iter_csv_chunks, iter_new_chunks,
+                            snapshot_path)
+from synthetic_data import generate_csv
+
+CHUNK_SIZE = 40
+
+
+def split_csv(tmp_path, first_rows, name="stops.csv"):
+    # A synthetic CSV and a copy holding only its header and first records.
+    full = tmp_path / "full.csv"
+    generate_csv(str(full), rows=150, seed=3)
+    lines = full.read_bytes().splitlines(keepends=True)
+    path = tmp_path / name
+    path.write_bytes(b"".join(lines[:first_rows + 1]))
+    return path, lines
+
+
+def hashed(chunks):
+    return add_row_hash(pd.concat(list(chunks)))
+
+
+def test_second_run_reads_only_appended_rows(tmp_path):
+    path, lines = split_csv(tmp_path, 100)
+    chunks, position = iter_new_chunks(str(path), CHUNK_SIZE, None, use_snapshot=False)
+    first = hashed(chunks)
+    assert len(first) == 100
+    assert position[1] == 100
+
+    with open(path, 'ab') as f:
+        f.write(b"".join(lines[101:]))
+    chunks, new_position = iter_new_chunks(str(path), CHUNK_SIZE, position, use_snapshot=False)
+    second = hashed(chunks)
+
+    expected = hashed(iter_csv_chunks(str(path), CHUNK_SIZE))
+    assert list(second.index) == list(range(100, 150))
+    pd.testing.assert_frame_equal(second, expected.loc[100:])
+    assert new_position == csv_source_position(str(path))
+    # Nothing appended: nothing read.
+    chunks, _ = iter_new_chunks(str(path), CHUNK_SIZE, new_position, use_snapshot=False)
+    assert sum(len(chunk) for chunk in chunks) == 0
+
+
+def test_unfinished_last_line_waits_for_next_run(tmp_path):
+    path, lines = split_csv(tmp_path, 100)
+    _, position = iter_new_chunks(str(path), CHUNK_SIZE, None, use_snapshot=False)
+    partial = lines[101][:10]
+    with open(path, 'ab') as f:
+        f.write(partial)
+    chunks, new_position = iter_new_chunks(str(path), CHUNK_SIZE, position, use_snapshot=False)
+    assert sum(len(chunk) for chunk in chunks) == 0
+    assert new_position == position
+
+    with open(path, 'ab') as f:
+        f.write(lines[101][len(partial):])
+    chunks, _ = iter_new_chunks(str(path), CHUNK_SIZE, new_position, use_snapshot=False)
+    assert list(hashed(chunks).index) == [100]
+
+
+def test_rewritten_csv_is_read_from_the_start(tmp_path):
+    path, lines = split_csv(tmp_path, 100)
+    _, position = iter_new_chunks(str(path), CHUNK_SIZE, None, use_snapshot=False)
+    # Same row count, different stops.
+    path.write_bytes(b"".join(lines[:1] + lines[51:151]))
+    chunks, new_position = iter_new_chunks(str(path), CHUNK_SIZE, position, use_snapshot=False)
+    assert len(hashed(chunks)) == 100
+    assert new_position[1] == 100
+
+
+def test_new_snapshot_replaces_older_ones_of_the_same_csv(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_processor, 'SNAPSHOT_DIR', str(tmp_path / "snapshots"))
+    path, lines = split_csv(tmp_path, 100)
+    other, _ = split_csv(tmp_path, 20, "other.csv")
+    for csv_path in (path, other):
+        list(iter_clean_chunks(str(csv_path), CHUNK_SIZE))
+    with open(path, 'ab') as f:
+        f.write(lines[101])
+    list(iter_clean_chunks(str(path), CHUNK_SIZE))
+    assert sorted(os.listdir(data_processor.SNAPSHOT_DIR)) == sorted(
+        os.path.basename(snapshot_path(str(csv_path))) for csv_path in (path, other)
+    )
@@ -0,0 +1,85 @@
+import pytest
+from sqlalchemy import text
+
+import data_processor
+import index_advisor
+from insights import INSIGHTS
+from index_advisor import (TRAFFIC_STOPS_TABLE, WORKLOAD_LOG_ENV, analyze, attach_workload_recorder, build_standin,
+                           load_workload, propose_index, select_part, sqlite_engine, statement_shape)
+from synthetic_data import generate_csv
+
+WORKLOAD = [
+    f"SELECT violation, COUNT(*) FROM {TRAFFIC_STOPS_TABLE} WHERE country_name = 'India' GROUP BY violation",
+    f"SELECT violation, COUNT(*) FROM {TRAFFIC_STOPS_TABLE} WHERE country_name = 'India' GROUP BY violation",
+    f"SELECT stop_date, violation FROM {TRAFFIC_STOPS_TABLE} WHERE vehicle_number = 'AB12CD3456' ORDER BY stop_date DESC",
+]
+
+
+@pytest.fixture
+def standin(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_processor, 'SNAPSHOT_DIR', str(tmp_path / "snapshots"))
+    csv_path = tmp_path / "stops.csv"
+    generate_csv(str(csv_path), 3000, seed=5)
+    path = tmp_path / "standin.sqlite"
+    build_standin(str(path), 2000, str(csv_path))
+    return path
+
+
+def test_a_recorded_workload_gets_a_covering_index(standin, tmp_path, monkeypatch):
+    log_path = tmp_path / "workload.jsonl"
+    monkeypatch.setenv(WORKLOAD_LOG_ENV, str(log_path))
+    engine = attach_workload_recorder(sqlite_engine(str(standin)))
+    with engine.connect() as connection:
+        assert connection.execute(text(f"SELECT COUNT(*) FROM {TRAFFIC_STOPS_TABLE};")).scalar() == 2000
+        for statement in WORKLOAD:
+            connection.execute(text(statement)).fetchall()
+
+    workload = load_workload(str(log_path))
+    assert [entry['count'] for entry in workload] == [2, 1, 1]
+    with engine.connect() as connection:
+        report, proposals, drops = analyze(connection, workload)
+    assert not [item for item in report if 'error' in item]
+    assert ('country_name', 'violation') in proposals
+    # A two-valued column whose index no statement uses.
+    assert 'idx_drugs_related_stop' in drops
+    engine.dispose()
+
+
+def test_propose_index_orders_equality_then_grouping():
+    shape = statement_shape(
+        f"SELECT driver_race, COUNT(*) FROM {TRAFFIC_STOPS_TABLE} "
+        "WHERE country_name = %s AND driver_gender = %s AND stop_date >= %s GROUP BY driver_race"
+    )
+    assert shape['equality'] == ['country_name', 'driver_gender']
+    assert shape['range'] == ['stop_date']
+    cardinality = {'country_name': 3, 'driver_gender': 2}
+    assert propose_index(shape, cardinality) == ('country_name', 'driver_gender', 'driver_race', 'stop_date')
+    assert index_advisor.index_name(('country_name', 'driver_gender')) == "idx_adv_country_gender"
+
+
+def test_select_part_keeps_ctes_and_drops_write_heads():
+    with_query = f"WITH counts AS (SELECT violation FROM {TRAFFIC_STOPS_TABLE}) SELECT * FROM counts;"
+    assert select_part(with_query) == with_query.rstrip(";")
+    assert select_part(
+        f"INSERT INTO flags (plate) SELECT vehicle_number FROM {TRAFFIC_STOPS_TABLE} ON DUPLICATE KEY UPDATE plate = plate;"
+    ) == f"SELECT vehicle_number FROM {TRAFFIC_STOPS_TABLE}"
+
+
+def test_every_report_runs_on_the_standin(standin):
+    # The reports group on stop_year, stop_month, stop_hour and
+    # duration_minutes, which the stand-in derives like MySQL's generated columns.
+    workload = [{'statement': query, 'params': [], 'count': 1} for query in INSIGHTS.values()]
+    engine = sqlite_engine(str(standin))
+    with engine.connect() as connection:
+        report, _, _ = analyze(connection, workload)
+        assert [item['error'] for item in report if 'error' in item] == []
+        hours = connection.execute(text(
+            f"SELECT COUNT(*) FROM {TRAFFIC_STOPS_TABLE} WHERE stop_hour = CAST(substr(stop_time, 1, 2) AS INTEGER);"
+        )).scalar()
+        assert hours == connection.execute(text(
+            f"SELECT COUNT(*) FROM {TRAFFIC_STOPS_TABLE} WHERE stop_time IS NOT NULL;"
+        )).scalar()
+        assert connection.execute(text(
+            f"SELECT COUNT(*) FROM {TRAFFIC_STOPS_TABLE} WHERE stop_year IS NULL OR duration_minutes IS NULL;"
+        )).scalar() == 0
+    engine.dispose()
@@ -0,0 +1,54 @@
+import random
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+from backend import read_frame
+from insights import TRAFFIC_STOPS_TABLE, keyset_predicate
+
+ORDER = "ORDER BY stop_date DESC, stop_time DESC, stop_id DESC"
+
+
+@pytest.fixture
+def connection():
+    # Few dates and times, so ties and NULL times fall on page boundaries.
+    rng = random.Random(3)
+    rows = [
+        {'stop_id': stop_id, 'stop_date': f"2024-01-0{rng.randint(1, 3)}",
+         'stop_time': rng.choice([None, "08:00:00", "12:30:00", "17:45:00"])}
+        for stop_id in range(1, 61)
+    ]
+    engine = create_engine("duckdb:///:memory:")
+    with engine.connect() as connection:
+        connection.execute(text(f"CREATE TABLE {TRAFFIC_STOPS_TABLE} (stop_id INTEGER, stop_date DATE, stop_time TIME);"))
+        connection.execute(text(f"INSERT INTO {TRAFFIC_STOPS_TABLE} VALUES (:stop_id, :stop_date, :stop_time);"), rows)
+        yield connection
+    engine.dispose()
+
+
+@pytest.mark.parametrize("page_size", [1, 4, 7, 25])
+def test_keyset_pages_cover_every_row_once(connection, page_size):
+    expected = read_frame(connection, f"SELECT stop_id FROM {TRAFFIC_STOPS_TABLE} {ORDER};")['stop_id'].tolist()
+    seen, cursor = [], None
+    while True:
+        where, params = "WHERE 1=1", []
+        if cursor:
+            cursor_sql, params = keyset_predicate(cursor)
+            where += " " + cursor_sql
+        page = read_frame(
+            connection,
+            f"SELECT stop_id, stop_date, stop_time FROM {TRAFFIC_STOPS_TABLE} {where} {ORDER} LIMIT {page_size};",
+            params,
+        )
+        if page.empty:
+            break
+        seen += page['stop_id'].tolist()
+        last = page.iloc[-1]
+        # The same cursor app.row_cursor builds from the last row shown.
+        cursor = (
+            str(pd.Timestamp(last['stop_date']).date()),
+            None if pd.isna(last['stop_time']) else str(last['stop_time']),
+            int(last['stop_id']),
+        )
+    assert seen == expected
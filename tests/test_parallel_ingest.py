@@ -0,0 +1,53 @@
+import io
+
+import pandas as pd
+import pytest
+
+from data_processor import add_row_hash, csv_chunk_ranges, iter_csv_chunks, iter_parallel_csv_chunks
+from synthetic_data import generate_csv
+
+CHUNK_SIZE = 50
+
+
+def awkward_csv(tmp_path, line_ending):
+    # Synthetic stops with the cases the byte-range scan has to count the way
+    # read_csv does: quoted newlines, blank and whitespace-only lines
+    # (including one at the end), unparseable dates and a CRLF variant.
+    source = tmp_path / "source.csv"
+    generate_csv(str(source), rows=200, seed=7)
+    lines = source.read_text().splitlines()
+    lines[5] = lines[5].replace(",Speeding,Speeding,", ',"Speeding\nin a, school zone",Speeding,', 1)
+    lines[12] = "not-a-date" + lines[12][len("2026-01-01"):]
+    lines[40:40] = ["", "   ", "\t"]
+    lines[90:90] = [" \r", ""]
+    lines[120] = lines[120].replace(",Citation,", ',"Citation\n\nissued",', 1)
+    lines.append("  ")
+    path = tmp_path / f"awkward_{len(line_ending)}.csv"
+    path.write_bytes(line_ending.join(lines).encode() + line_ending.encode())
+    return str(path)
+
+
+@pytest.fixture(params=["\n", "\r\n"], ids=["lf", "crlf"])
+def csv_path(request, tmp_path):
+    return awkward_csv(tmp_path, request.param)
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 64, 1 << 20])
+def test_ranges_match_read_csv_chunks(csv_path, block_size):
+    expected = [len(chunk) for chunk in pd.read_csv(csv_path, chunksize=CHUNK_SIZE)]
+    names = pd.read_csv(csv_path, nrows=0).columns.tolist()
+    ranges = list(csv_chunk_ranges(csv_path, CHUNK_SIZE, block_size))
+    with open(csv_path, 'rb') as f:
+        data = f.read()
+    lengths = [len(pd.read_csv(io.BytesIO(data[start:end]), names=names, header=None))
+               for start, end in ranges]
+    assert lengths == expected
+
+
+def test_parallel_chunks_match_serial(csv_path):
+    serial = list(iter_csv_chunks(csv_path, CHUNK_SIZE))
+    parallel = list(iter_parallel_csv_chunks(csv_path, CHUNK_SIZE, workers=2))
+    assert [len(chunk) for chunk in parallel] == [len(chunk) for chunk in serial]
+    expected = add_row_hash(pd.concat(serial))
+    actual = pd.concat(parallel)
+    pd.testing.assert_frame_equal(actual, expected)
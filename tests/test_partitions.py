@@ -0,0 +1,62 @@
+from datetime import date
+
+import duckdb
+import pytest
+
+from partitions import (
+    TRAFFIC_STOPS_TABLE, duckdb_period_tables, name_period, next_period, parse_period, partition_name,
+    partition_period_start, period_start, periods_between, split_duckdb_periods
+)
+
+
+def test_period_start_and_next_period():
+    assert period_start(date(2020, 2, 29), "month") == date(2020, 2, 1)
+    assert period_start(date(2020, 2, 29), "year") == date(2020, 1, 1)
+    assert next_period(date(2020, 11, 1), "month") == date(2020, 12, 1)
+    assert next_period(date(2020, 12, 1), "month") == date(2021, 1, 1)
+    assert next_period(date(2020, 1, 1), "year") == date(2021, 1, 1)
+    with pytest.raises(ValueError):
+        period_start(date(2020, 1, 1), "week")
+
+
+def test_periods_between_covers_both_ends():
+    assert periods_between(date(2020, 11, 15), date(2021, 2, 1), "month") == [
+        date(2020, 11, 1), date(2020, 12, 1), date(2021, 1, 1), date(2021, 2, 1)
+    ]
+    assert periods_between(date(2020, 6, 1), date(2022, 1, 1), "year") == [
+        date(2020, 1, 1), date(2021, 1, 1), date(2022, 1, 1)
+    ]
+    assert periods_between(date(2020, 3, 10), date(2020, 3, 20), "month") == [date(2020, 3, 1)]
+
+
+def test_partition_names_round_trip():
+    for start, period in [(date(2020, 1, 1), "month"), (date(2020, 12, 1), "month"), (date(2020, 1, 1), "year")]:
+        name = partition_name(start, period)
+        assert partition_period_start(name) == start
+        assert name_period(name) == period
+    assert partition_name(date(2020, 3, 1), "month") == "p202003"
+    assert partition_name(date(2020, 1, 1), "year") == "p2020"
+    assert partition_period_start("p_future") is None
+
+
+def test_parse_period():
+    assert parse_period(" 2020-03 ", "month") == date(2020, 3, 1)
+    assert parse_period("2020", "year") == date(2020, 1, 1)
+    for value, period in [("2020", "month"), ("2020-03", "year"), ("March 2020", "month")]:
+        with pytest.raises(ValueError):
+            parse_period(value, period)
+
+
+def test_split_duckdb_periods_keeps_every_row():
+    connection = duckdb.connect()
+    connection.execute("""
+        CREATE TABLE source AS
+        SELECT i AS stop_id, DATE '2020-11-20' + CAST(i AS INTEGER) AS stop_date FROM range(100) t(i);
+    """)
+    split_duckdb_periods(connection, "source", "month")
+    assert list(duckdb_period_tables(connection)) == [date(2020, 11, 1), date(2020, 12, 1), date(2021, 1, 1),
+                                                      date(2021, 2, 1)]
+    assert connection.execute(f"SELECT COUNT(*) FROM {TRAFFIC_STOPS_TABLE};").fetchone()[0] == 100
+    assert connection.execute(
+        f"SELECT COUNT(*) FROM {TRAFFIC_STOPS_TABLE} WHERE stop_date >= DATE '2021-01-01'"
+    ).fetchone()[0] == connection.execute("SELECT COUNT(*) FROM source WHERE stop_date >= DATE '2021-01-01'").fetchone()[0]
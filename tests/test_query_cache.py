@@ -0,0 +1,73 @@
+import duckdb
+import pandas as pd
+
+from query_cache import DATA_VERSION_TABLE, QueryResultCache, bump_standin_data_version, cache_key, normalize_sql
+
+
+def frame(rows):
+    return pd.DataFrame({'value': range(rows)})
+
+
+def test_normalize_sql_collapses_whitespace_outside_literals():
+    assert normalize_sql("SELECT  *\n  FROM t\tWHERE a = 'x  y';") == "SELECT * FROM t WHERE a = 'x  y'"
+    assert cache_key("SELECT 1 ;", {'b': 2, 'a': 1}) == cache_key(" SELECT 1", {'a': 1, 'b': 2})
+    assert cache_key("SELECT 1", [1]) != cache_key("SELECT 1", [2])
+
+
+def test_get_returns_a_copy_and_counts_hits():
+    cache = QueryResultCache()
+    key = cache_key("SELECT value FROM t")
+    assert cache.get(key) is None
+    cache.put(key, frame(3), None)
+    cached = cache.get(key)
+    cached.loc[0, 'value'] = 99
+    assert cache.get(key)['value'].tolist() == [0, 1, 2]
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (2, 1)
+
+
+def test_least_recently_used_entries_are_evicted_by_size():
+    size = int(frame(100).memory_usage(index=True, deep=True).sum())
+    cache = QueryResultCache(max_bytes=2 * size)
+    cache.put('a', frame(100), None)
+    cache.put('b', frame(100), None)
+    cache.get('a')
+    cache.put('c', frame(100), None)
+    assert list(cache.entries) == ['a', 'c']
+    assert cache.stats()['evictions'] == 1
+    assert cache.current_bytes == 2 * size
+
+    # A result larger than the whole cache is never stored.
+    cache.put('huge', frame(1000), None)
+    assert 'huge' not in cache.entries
+
+
+def test_a_new_data_version_drops_every_entry():
+    cache = QueryResultCache()
+    cache.sync_version(1)
+    cache.put('a', frame(3), 1)
+    cache.sync_version(1)
+    assert cache.get('a') is not None
+    cache.sync_version(2)
+    assert cache.get('a') is None
+    assert cache.stats()['invalidations'] == 1 and cache.current_bytes == 0
+
+
+def test_a_result_read_across_a_version_bump_is_not_cached():
+    cache = QueryResultCache()
+    cache.sync_version(1)
+    seen_version = cache.data_version
+    # Another session syncs to a reload's new version while this read runs.
+    cache.sync_version(2)
+    cache.put('a', frame(3), seen_version)
+    assert cache.get('a') is None
+    assert cache.current_bytes == 0
+    cache.put('a', frame(3), cache.data_version)
+    assert cache.get('a') is not None
+
+
+def test_standin_data_version_only_moves_forward():
+    connection = duckdb.connect()
+    bump_standin_data_version(connection)
+    first = connection.execute(f"SELECT version FROM {DATA_VERSION_TABLE}").fetchone()[0]
+    bump_standin_data_version(connection)
+    assert connection.execute(f"SELECT version FROM {DATA_VERSION_TABLE}").fetchone()[0] == first + 1
@@ -0,0 +1,77 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from query_governor import QueryRejected, cap_rows, normalize_select, plan_values, review, run_governed
+
+
+def test_normalize_select_strips_trailing_semicolons():
+    assert normalize_select("  SELECT * FROM traffic_stops;; \n") == "SELECT * FROM traffic_stops"
+    assert normalize_select("with t AS (SELECT 1) SELECT * FROM t") == "with t AS (SELECT 1) SELECT * FROM t"
+    assert normalize_select("SELECT * FROM t WHERE note = 'a;b'") == "SELECT * FROM t WHERE note = 'a;b'"
+
+
+@pytest.mark.parametrize("query", [
+    "DELETE FROM traffic_stops",
+    "SELECTED FROM t",
+    "SELECT 1; DROP TABLE traffic_stops",
+    "SELECT * FROM t INTO OUTFILE '/tmp/x'",
+    "SELECT * FROM t FOR UPDATE",
+    "SELECT SLEEP (10)",
+    "SELECT BENCHMARK(1000000, MD5('a'))",
+    "WITH x AS (SELECT 1) DELETE FROM traffic_stops WHERE stop_id < 50 -- LIMIT 10",
+    "with x as (select 1) update traffic_stops set stop_id = 0",
+    "/* report */ WITH x AS (SELECT 1)\nINSERT INTO traffic_stops SELECT * FROM x",
+    "SELECT 1 /* ; */; DROP TABLE traffic_stops",
+])
+def test_normalize_select_rejects_unsafe_queries(query):
+    with pytest.raises(QueryRejected):
+        normalize_select(query)
+
+
+def test_normalize_select_strips_comments_but_not_literals():
+    assert normalize_select("SELECT * FROM t -- LIMIT 10") == "SELECT * FROM t"
+    assert normalize_select("SELECT * FROM t /* LIMIT 10 */") == "SELECT * FROM t"
+    assert normalize_select("SELECT '-- delete' AS `update`, REPLACE(a, 'x', 'y') FROM t") == (
+        "SELECT '-- delete' AS `update`, REPLACE(a, 'x', 'y') FROM t"
+    )
+
+
+def test_a_trailing_comment_does_not_hide_the_missing_limit():
+    assert cap_rows(normalize_select("SELECT * FROM t -- LIMIT 10"), 100) == ("SELECT * FROM t\nLIMIT 100", True)
+
+
+def test_governed_queries_cannot_write(tmp_path):
+    engine = create_engine(f"duckdb:///{tmp_path / 'governed.duckdb'}")
+    with engine.connect() as connection:
+        connection.execute(text("CREATE TABLE traffic_stops AS SELECT range AS stop_id FROM range(100);"))
+        connection.commit()
+    with pytest.raises(QueryRejected):
+        review("WITH x AS (SELECT 1) DELETE FROM traffic_stops WHERE stop_id < 50 -- LIMIT 10", engine=engine)
+    # Even a write that skipped review is rolled back.
+    list(run_governed("DELETE FROM traffic_stops WHERE stop_id < 50", "tester", engine=engine))
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT COUNT(*) FROM traffic_stops;")).scalar() == 100
+    engine.dispose()
+
+
+def test_cap_rows_appends_a_limit():
+    assert cap_rows("SELECT * FROM t", 100) == ("SELECT * FROM t\nLIMIT 100", True)
+    # A LIMIT inside a subquery does not bound the outer query.
+    assert cap_rows("SELECT * FROM (SELECT * FROM t LIMIT 5) s", 100)[1] is True
+
+
+def test_cap_rows_keeps_or_lowers_a_trailing_limit():
+    assert cap_rows("SELECT * FROM t LIMIT 50", 100) == ("SELECT * FROM t LIMIT 50", False)
+    assert cap_rows("SELECT * FROM t limit 500", 100) == ("SELECT * FROM t LIMIT 100", True)
+    assert cap_rows("SELECT * FROM t LIMIT 500 OFFSET 20", 100) == ("SELECT * FROM t LIMIT 100 OFFSET 20", True)
+    assert cap_rows("SELECT * FROM t LIMIT 20, 50", 100) == ("SELECT * FROM t LIMIT 20, 50", False)
+    assert cap_rows("SELECT * FROM t LIMIT 20, 500", 100) == ("SELECT * FROM t LIMIT 20, 100", True)
+
+
+def test_plan_values_walks_nested_plans():
+    plan = {'query_block': {'cost_info': {'query_cost': '12.5'}, 'nested_loop': [
+        {'table': {'rows_examined_per_scan': 10}},
+        {'table': {'rows_examined_per_scan': 400}},
+    ]}}
+    assert list(plan_values(plan, 'rows_examined_per_scan')) == [10, 400]
+    assert list(plan_values(plan, 'query_cost')) == ['12.5']
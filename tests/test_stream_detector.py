@@ -0,0 +1,14 @@
+from stream_detector import FLAG_REWRITE_SECONDS, expire_recent_flags, new_state
+
+
+def test_expired_flags_are_dropped_oldest_first():
+    recent_flags = new_state()['recent_flags']
+    recent_flags[('AB1', 'speeding_30d')] = 0.0
+    recent_flags[('CD2', 'drug_related_stop')] = 10.0
+    recent_flags[('EF3', 'speeding_30d')] = 20.0
+
+    expire_recent_flags(recent_flags, 10.0 + FLAG_REWRITE_SECONDS)
+    assert list(recent_flags) == [('CD2', 'drug_related_stop'), ('EF3', 'speeding_30d')]
+
+    expire_recent_flags(recent_flags, 1000.0 + FLAG_REWRITE_SECONDS)
+    assert not recent_flags
@@ -0,0 +1,64 @@
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from vehicle_profiles import (PROFILE_TABLE, RECENT_SPEEDING_STOPS, TRAFFIC_STOPS_TABLE, build_standin_profiles,
+                              recent_speeding_update_query)
+
+PLATE = "AB12CD3456"
+
+
+def add_stops(connection, first_stop_id, days, violation="Speeding"):
+    for offset, day in enumerate(days):
+        connection.execute(text(f"""
+            INSERT INTO {TRAFFIC_STOPS_TABLE} VALUES
+            (:stop_id, :stop_date, TIME '08:00:00', 'USA', :violation, FALSE, FALSE, FALSE, :plate);
+        """), {'stop_id': first_stop_id + offset, 'stop_date': day, 'violation': violation, 'plate': PLATE})
+
+
+def recent_speeding(connection):
+    stored = connection.execute(
+        text(f"SELECT recent_speeding FROM {PROFILE_TABLE} WHERE vehicle_number = :plate;"), {'plate': PLATE}
+    ).scalar()
+    return [value[:10] for value in stored.split(",")]
+
+
+@pytest.fixture
+def connection():
+    engine = create_engine("duckdb:///:memory:")
+    with engine.connect() as connection:
+        connection.execute(text(f"""
+            CREATE TABLE {TRAFFIC_STOPS_TABLE} (
+                stop_id BIGINT, stop_date DATE, stop_time TIME, country_name VARCHAR, violation VARCHAR,
+                search_conducted BOOLEAN, is_arrested BOOLEAN, drugs_related_stop BOOLEAN, vehicle_number VARCHAR
+            );
+        """))
+        add_stops(connection, 1, [date(2024, 2, 1) + timedelta(days=day) for day in range(RECENT_SPEEDING_STOPS)])
+        build_standin_profiles(connection.connection.dbapi_connection)
+        yield connection
+    engine.dispose()
+
+
+def newest_days(count):
+    return [(date(2024, 2, 1) + timedelta(days=day)).isoformat() for day in range(count - 1, -1, -1)]
+
+
+def test_a_late_arriving_stop_keeps_its_place(connection):
+    expected = newest_days(RECENT_SPEEDING_STOPS)
+    assert recent_speeding(connection) == expected
+
+    # A backfilled stop older than every stored one arrives with a new stop_id.
+    add_stops(connection, 100, [date(2023, 1, 1)])
+    connection.execute(text(recent_speeding_update_query(dialect="duckdb")), {'after_stop_id': 99, 'last_stop_id': 100})
+    assert recent_speeding(connection) == expected
+
+    add_stops(connection, 101, [date(2024, 1, 15), date(2024, 3, 1)])
+    connection.execute(text(recent_speeding_update_query(dialect="duckdb")), {'after_stop_id': 100, 'last_stop_id': 102})
+    assert recent_speeding(connection) == ["2024-03-01"] + expected[:-1]
+
+
+def test_only_stops_up_to_last_stop_id_count(connection):
+    add_stops(connection, 100, [date(2024, 3, 1), date(2024, 4, 1)])
+    connection.execute(text(recent_speeding_update_query(dialect="duckdb")), {'after_stop_id': 99, 'last_stop_id': 100})
+    assert recent_speeding(connection)[0] == "2024-03-01"
@@ -0,0 +1,50 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from vehicle_search import TRAFFIC_STOPS_TABLE, find_plates, populate_benchmark_db, rebuild_trigrams, time_lookup
+
+PLATES = ['AB12CD3456', 'XY12CD9999', 'ABCAXBCABD', 'ZZ00ZZ0000', 'Unknown']
+
+
+@pytest.fixture
+def connection():
+    engine = create_engine("sqlite://")
+    with engine.connect() as connection:
+        connection.execute(text(f"CREATE TABLE {TRAFFIC_STOPS_TABLE} (stop_id INTEGER PRIMARY KEY, vehicle_number VARCHAR(255));"))
+        connection.execute(
+            text(f"INSERT INTO {TRAFFIC_STOPS_TABLE} (stop_id, vehicle_number) VALUES (:stop_id, :vehicle_number);"),
+            [{'stop_id': stop_id, 'vehicle_number': plate} for stop_id, plate in enumerate(PLATES, start=1)],
+        )
+        rebuild_trigrams(connection)
+        yield connection
+    engine.dispose()
+
+
+def test_find_plates_matches_substrings(connection):
+    assert sorted(find_plates(connection, "12CD")) == ['AB12CD3456', 'XY12CD9999']
+    assert find_plates(connection, " cd 34 ") == ['AB12CD3456']
+    assert find_plates(connection, "QQQ") == []
+
+
+def test_find_plates_drops_trigram_false_positives(connection):
+    # ABCAXBCABD holds every trigram of ABCABD but not the term itself.
+    assert find_plates(connection, "ABCABD") == []
+    assert find_plates(connection, "BCABD") == ['ABCAXBCABD']
+
+
+def test_find_plates_declines_short_or_broad_terms(connection):
+    assert find_plates(connection, "AB") is None
+    assert find_plates(connection, "12CD", limit=1) is None
+    assert find_plates(connection, "Unknown") == []
+
+
+def test_benchmark_paths_agree(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'bench.sqlite'}")
+    plates = populate_benchmark_db(engine, 5000)
+    assert len(plates) == 250 and len(set(plates)) == 250
+    with engine.connect() as connection:
+        rebuild_trigrams(connection)
+        for plate in plates[:10]:
+            term = plate[2:7]
+            assert time_lookup(connection, term, False)[1] == time_lookup(connection, term, True)[1] > 0
+    engine.dispose()
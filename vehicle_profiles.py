@@ -0,0 +1,401 @@
+import argparse
+import json
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import bindparam, text
+
+PROFILE_TABLE = "vehicle_profiles"
+PROFILE_STAGING_TABLE = "vehicle_profiles_staging"
+PROFILE_PLATES_TABLE = "vehicle_profiles_plates"
+TRAFFIC_STOPS_TABLE = "traffic_stops"
+FLAGGED_VEHICLES_TABLE = "flagged_vehicles"
+RECENT_SPEEDING_STOPS = 10
+PROFILE_SYNC_BATCH = 5000
+PROFILE_CACHE_ENTRIES = 100000
+BENCHMARK_LOOKUPS = 200
+PLATE_CHARACTERS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+COUNT_COLUMNS = ['stops', 'searches', 'arrests', 'drug_stops', 'speeding_stops']
+STOP_COLUMNS = COUNT_COLUMNS + ['first_seen', 'last_seen_at', 'last_country', 'recent_speeding']
+FLAG_COLUMNS = ['active_flags', 'flag_rules', 'last_flagged_at']
+PROFILE_COLUMNS = ['vehicle_number'] + STOP_COLUMNS + FLAG_COLUMNS
+# The counts each profile keeps, as predicates over one stop.
+COUNT_PREDICATES = {
+    'searches': "search_conducted = TRUE",
+    'arrests': "is_arrested = TRUE",
+    'drug_stops': "drugs_related_stop = TRUE",
+    'speeding_stops': "violation = 'Speeding'",
+}
+# Stop timestamps and the newest-first timestamp list, per dialect. Both
+# render timestamps as fixed-width 'YYYY-MM-DD HH:MM:SS' text.
+DIALECT_SQL = {
+    'mysql': {
+        'stop_at': "TIMESTAMP(stop_date, COALESCE(stop_time, '00:00:00'))",
+        'newest_first': "GROUP_CONCAT(CAST(stop_at AS CHAR) ORDER BY stop_at DESC SEPARATOR ',')",
+    },
+    'duckdb': {
+        'stop_at': "(stop_date + COALESCE(stop_time, TIME '00:00:00'))",
+        'newest_first': "string_agg(CAST(stop_at AS VARCHAR), ',' ORDER BY stop_at DESC)",
+    },
+}
+
+def profile_table_query(table_name=PROFILE_TABLE):
+    return f"""
+    CREATE TABLE IF NOT EXISTS {table_name} (
+        vehicle_number VARCHAR(255) NOT NULL PRIMARY KEY,
+        stops BIGINT NOT NULL DEFAULT 0,
+        searches BIGINT NOT NULL DEFAULT 0,
+        arrests BIGINT NOT NULL DEFAULT 0,
+        drug_stops BIGINT NOT NULL DEFAULT 0,
+        speeding_stops BIGINT NOT NULL DEFAULT 0,
+        first_seen DATE,
+        last_seen_at DATETIME,
+        last_country VARCHAR(255),
+        recent_speeding VARCHAR(255),
+        active_flags INT NOT NULL DEFAULT 0,
+        flag_rules VARCHAR(512),
+        last_flagged_at DATETIME
+    );
+    """
+
+def create_profile_table(connection, table_name=PROFILE_TABLE):
+    connection.execute(text(profile_table_query(table_name)))
+
+def profile_stops_query(source_table=TRAFFIC_STOPS_TABLE, where_clause="1=1", dialect="mysql"):
+    return f"""
+        SELECT stop_id, vehicle_number, stop_date, country_name, violation,
+               search_conducted, is_arrested, drugs_related_stop, {DIALECT_SQL[dialect]['stop_at']} AS stop_at
+        FROM {source_table}
+        WHERE vehicle_number != 'Unknown' AND {where_clause}
+    """
+
+def recent_speeding_query(source_table=TRAFFIC_STOPS_TABLE, where_clause="1=1", dialect="mysql"):
+    # The RECENT_SPEEDING_STOPS newest speeding stops per plate, newest first.
+    return f"""
+        SELECT vehicle_number, {DIALECT_SQL[dialect]['newest_first']} AS recent_speeding
+        FROM (
+            SELECT vehicle_number, stop_at,
+                   ROW_NUMBER() OVER (PARTITION BY vehicle_number ORDER BY stop_at DESC, stop_id DESC) AS recency
+            FROM ({profile_stops_query(source_table, where_clause, dialect)}) profile_stops
+            WHERE violation = 'Speeding'
+        ) speeding
+        WHERE recency <= {RECENT_SPEEDING_STOPS}
+        GROUP BY vehicle_number
+    """
+
+def profile_select_query(source_table=TRAFFIC_STOPS_TABLE, where_clause="1=1", dialect="mysql"):
+    # One row per plate with the STOP_COLUMNS of the matching stops. The last
+    # country rides along with the latest timestamp in a MAX over
+    # "timestamp + country" strings.
+    counts = ",\n            ".join(
+        f"SUM(CASE WHEN {predicate} THEN 1 ELSE 0 END) AS {name}" for name, predicate in COUNT_PREDICATES.items()
+    )
+    profile_stops = profile_stops_query(source_table, where_clause, dialect)
+    return f"""
+    SELECT totals.vehicle_number, {', '.join('totals.' + name for name in STOP_COLUMNS[:-1])},
+           recent.recent_speeding
+    FROM (
+        SELECT
+            vehicle_number,
+            COUNT(*) AS stops,
+            {counts},
+            MIN(stop_date) AS first_seen,
+            MAX(stop_at) AS last_seen_at,
+            SUBSTRING(MAX(CONCAT(CAST(stop_at AS CHAR), country_name)), 20) AS last_country
+        FROM ({profile_stops}) profile_stops
+        GROUP BY vehicle_number
+    ) totals
+    LEFT JOIN ({recent_speeding_query(source_table, where_clause, dialect)}) recent
+        ON recent.vehicle_number = totals.vehicle_number
+    """
+
+def table_exists(connection, table_name):
+    return bool(connection.execute(text("""
+        SELECT COUNT(*) FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table_name;
+    """), {'table_name': table_name}).scalar())
+
+def max_stop_id(connection, stops_table=TRAFFIC_STOPS_TABLE):
+    return connection.execute(text(f"SELECT COALESCE(MAX(stop_id), 0) FROM {stops_table};")).scalar()
+
+def recent_speeding_update_query(stops_table=TRAFFIC_STOPS_TABLE, dialect="mysql"):
+    # Recomputes recent_speeding from the stops up to :last_stop_id for every
+    # plate with a speeding stop in (:after_stop_id, :last_stop_id].
+    plates = (f"vehicle_number IN (SELECT vehicle_number FROM {stops_table} WHERE violation = 'Speeding' "
+              f"AND stop_id > :after_stop_id AND stop_id <= :last_stop_id)")
+    recent = recent_speeding_query(stops_table, f"{plates} AND stop_id <= :last_stop_id", dialect)
+    if dialect == "duckdb":
+        return f"""
+            UPDATE {PROFILE_TABLE} SET recent_speeding = recent.recent_speeding
+            FROM ({recent}) recent WHERE recent.vehicle_number = {PROFILE_TABLE}.vehicle_number;
+        """
+    return f"""
+        UPDATE {PROFILE_TABLE} JOIN ({recent}) recent ON recent.vehicle_number = {PROFILE_TABLE}.vehicle_number
+        SET {PROFILE_TABLE}.recent_speeding = recent.recent_speeding;
+    """
+
+def refresh_profiles(connection, stops_table=TRAFFIC_STOPS_TABLE, after_stop_id=0, last_stop_id=None):
+    # Folds stops in (after_stop_id, last_stop_id] into the profiles: counts
+    # add up and first/last seen widen. recent_speeding is recomputed for the
+    # plates with new speeding stops instead of merged: incremental loads keep
+    # late-arriving stops whatever their date, so a new timestamp does not
+    # always belong in front of the stored ones.
+    # Returns the stop_id the profiles now cover.
+    create_profile_table(connection)
+    if last_stop_id is None:
+        last_stop_id = max_stop_id(connection, stops_table)
+    columns = ", ".join(['vehicle_number'] + STOP_COLUMNS)
+    # Stored values are qualified with the table name: the SELECT's columns
+    # share their names. MySQL applies the assignments left to right, so
+    # last_country compares against last_seen_at before it moves.
+    table = PROFILE_TABLE
+    count_updates = ", ".join(f"{name} = {table}.{name} + VALUES({name})" for name in COUNT_COLUMNS)
+    result = connection.execute(text(f"""
+        INSERT INTO {PROFILE_TABLE} ({columns})
+        {profile_select_query(stops_table, 'stop_id > :after_stop_id AND stop_id <= :last_stop_id')}
+        ON DUPLICATE KEY UPDATE
+            last_country = IF({table}.last_seen_at IS NULL OR VALUES(last_seen_at) >= {table}.last_seen_at,
+                              VALUES(last_country), {table}.last_country),
+            last_seen_at = GREATEST(COALESCE({table}.last_seen_at, VALUES(last_seen_at)), VALUES(last_seen_at)),
+            first_seen = LEAST(COALESCE({table}.first_seen, VALUES(first_seen)), VALUES(first_seen)),
+            {count_updates};
+    """), {'after_stop_id': after_stop_id, 'last_stop_id': last_stop_id})
+    connection.execute(text(recent_speeding_update_query(stops_table)),
+                       {'after_stop_id': after_stop_id, 'last_stop_id': last_stop_id})
+    connection.commit()
+    print(f"SUCCESS: Vehicle profiles updated with stops {after_stop_id + 1}..{last_stop_id} ({result.rowcount} rows touched).")
+    return last_stop_id
+
+def flag_upsert_query(table_name, plate_filter=""):
+    return f"""
+        INSERT INTO {table_name} (vehicle_number, {', '.join(FLAG_COLUMNS)})
+        SELECT vehicle_number, COUNT(*), GROUP_CONCAT(rule_id ORDER BY rule_id SEPARATOR ','), MAX(flag_timestamp)
+        FROM {FLAGGED_VEHICLES_TABLE}
+        WHERE resolved = FALSE {plate_filter}
+        GROUP BY vehicle_number
+        ON DUPLICATE KEY UPDATE {', '.join(f'{name} = VALUES({name})' for name in FLAG_COLUMNS)};
+    """
+
+def rebuild_profiles(connection, stops_table=TRAFFIC_STOPS_TABLE):
+    # Builds every profile in a staging table and renames it into place, so
+    # lookups keep answering from the old profiles until the swap.
+    last_stop_id = max_stop_id(connection, stops_table)
+    connection.execute(text(f"DROP TABLE IF EXISTS {PROFILE_STAGING_TABLE};"))
+    create_profile_table(connection, PROFILE_STAGING_TABLE)
+    connection.execute(
+        text(f"INSERT INTO {PROFILE_STAGING_TABLE} ({', '.join(['vehicle_number'] + STOP_COLUMNS)}) "
+             f"{profile_select_query(stops_table, 'stop_id <= :last_stop_id')};"),
+        {'last_stop_id': last_stop_id},
+    )
+    if table_exists(connection, FLAGGED_VEHICLES_TABLE):
+        connection.execute(text(flag_upsert_query(PROFILE_STAGING_TABLE)))
+    create_profile_table(connection)
+    # A rebuild that failed between the rename and the drop leaves the old
+    # table behind, which would make every later rename fail.
+    connection.execute(text(f"DROP TABLE IF EXISTS {PROFILE_TABLE}_old;"))
+    connection.execute(text(f"""
+        RENAME TABLE {PROFILE_TABLE} TO {PROFILE_TABLE}_old, {PROFILE_STAGING_TABLE} TO {PROFILE_TABLE};
+    """))
+    connection.execute(text(f"DROP TABLE {PROFILE_TABLE}_old;"))
+    connection.commit()
+    print(f"SUCCESS: Vehicle profiles rebuilt from '{stops_table}'.")
+    return last_stop_id
+
+def stage_profile_plates(connection, stops_query):
+    # Saves the plates of the stops stops_query (a SELECT with a
+    # vehicle_number column) returns, for recompute_staged_profiles once those
+    # stops are gone. A plain table rather than a temporary one: the profile
+    # query reads it twice, which MySQL does not allow for temporary tables.
+    connection.execute(text(f"DROP TABLE IF EXISTS {PROFILE_PLATES_TABLE};"))
+    connection.execute(text(f"CREATE TABLE {PROFILE_PLATES_TABLE} (vehicle_number VARCHAR(255) NOT NULL PRIMARY KEY);"))
+    connection.execute(text(f"""
+        INSERT INTO {PROFILE_PLATES_TABLE}
+        SELECT DISTINCT vehicle_number FROM ({stops_query}) stops WHERE vehicle_number != 'Unknown';
+    """))
+
+def recompute_staged_profiles(connection, last_stop_id, stops_table=TRAFFIC_STOPS_TABLE):
+    # Recomputes the staged plates' profiles from their remaining stops up to
+    # last_stop_id, the stop_id the profiles cover, so the next incremental
+    # refresh does not count later stops twice. A plate with no stops left
+    # loses its profile, unless it still has active flags.
+    plates = f"vehicle_number IN (SELECT vehicle_number FROM {PROFILE_PLATES_TABLE})"
+    connection.execute(text(f"DELETE FROM {PROFILE_TABLE} WHERE {plates};"))
+    connection.execute(
+        text(f"INSERT INTO {PROFILE_TABLE} ({', '.join(['vehicle_number'] + STOP_COLUMNS)}) "
+             f"{profile_select_query(stops_table, f'{plates} AND stop_id <= :last_stop_id')};"),
+        {'last_stop_id': last_stop_id},
+    )
+    if table_exists(connection, FLAGGED_VEHICLES_TABLE):
+        connection.execute(text(flag_upsert_query(PROFILE_TABLE, f"AND {plates}")))
+    recomputed = connection.execute(text(f"SELECT COUNT(*) FROM {PROFILE_PLATES_TABLE};")).scalar()
+    connection.execute(text(f"DROP TABLE {PROFILE_PLATES_TABLE};"))
+    return recomputed
+
+def sync_profile_flags(connection, plates):
+    # Recomputes the flag columns of the given plates from their active flags.
+    # The detector calls this for the plates it flagged or resolved, after
+    # create_flagged_vehicles_table has created the profile table; the caller
+    # commits.
+    plates = sorted({plate for plate in plates if plate})
+    if not plates:
+        return 0
+    reset = text(f"""
+        UPDATE {PROFILE_TABLE} SET active_flags = 0, flag_rules = NULL, last_flagged_at = NULL
+        WHERE vehicle_number IN :plates;
+    """).bindparams(bindparam('plates', expanding=True))
+    upsert = text(flag_upsert_query(PROFILE_TABLE, "AND vehicle_number IN :plates")).bindparams(
+        bindparam('plates', expanding=True)
+    )
+    for start in range(0, len(plates), PROFILE_SYNC_BATCH):
+        batch = {'plates': plates[start:start + PROFILE_SYNC_BATCH]}
+        connection.execute(reset, batch)
+        connection.execute(upsert, batch)
+    return len(plates)
+
+def sync_flagged_since(connection, since):
+    # Plates flagged at or after since, e.g. by the detector run that began then.
+    plates = [row[0] for row in connection.execute(text(f"""
+        SELECT DISTINCT vehicle_number FROM {FLAGGED_VEHICLES_TABLE}
+        WHERE resolved = FALSE AND flag_timestamp >= :since;
+    """), {'since': since})]
+    return sync_profile_flags(connection, plates)
+
+def build_standin_profiles(connection):
+    # The DuckDB stand-in's profiles, built once by export_duckdb. It has no
+    # flags table, so the flag columns stay empty.
+    connection.execute(profile_table_query())
+    connection.execute(f"""
+        INSERT INTO {PROFILE_TABLE} ({', '.join(['vehicle_number'] + STOP_COLUMNS)})
+        {profile_select_query(TRAFFIC_STOPS_TABLE, dialect='duckdb')};
+    """)
+
+class ProfileCache:
+    # LRU of looked-up profiles, missing plates included. Like the dashboard's
+    # result cache, entries belong to one data version and are dropped when
+    # it changes.
+
+    def __init__(self, max_entries=PROFILE_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.data_version = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def sync_version(self, data_version):
+        with self.lock:
+            if data_version != self.data_version:
+                self.entries.clear()
+                self.data_version = data_version
+
+    def get(self, plate):
+        # Returns (found, profile).
+        with self.lock:
+            if plate not in self.entries:
+                self.misses += 1
+                return False, None
+            self.entries.move_to_end(plate)
+            self.hits += 1
+            return True, self.entries[plate]
+
+    def put(self, plate, profile):
+        with self.lock:
+            self.entries[plate] = profile
+            self.entries.move_to_end(plate)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self.entries),
+                'data_version': self.data_version,
+            }
+
+def profile_from_row(row):
+    # JSON-ready: dates as ISO strings, the comma lists as lists.
+    profile = dict(row)
+    for name in ('first_seen', 'last_seen_at', 'last_flagged_at'):
+        if profile[name] is not None:
+            profile[name] = str(profile[name])
+    profile['recent_speeding'] = profile['recent_speeding'].split(",") if profile['recent_speeding'] else []
+    profile['flag_rules'] = profile['flag_rules'].split(",") if profile['flag_rules'] else []
+    return profile
+
+def lookup_profile(connection, plate, cache=None):
+    # One primary-key read, or none on a cache hit. Returns None for a plate
+    # with no stops and no flags.
+    plate = plate.strip()
+    if cache is not None:
+        found, profile = cache.get(plate)
+        if found:
+            return profile
+    row = connection.execute(
+        text(f"SELECT {', '.join(PROFILE_COLUMNS)} FROM {PROFILE_TABLE} WHERE vehicle_number = :plate;"),
+        {'plate': plate},
+    ).mappings().first()
+    profile = profile_from_row(row) if row is not None else None
+    if cache is not None:
+        cache.put(plate, profile)
+    return profile
+
+def sample_plates(connection, count=BENCHMARK_LOOKUPS, seed=7):
+    # The busiest plates plus plates found by seeking the primary key from
+    # random prefixes, so lookups of heavy and typical vehicles are both timed.
+    busiest = [row[0] for row in connection.execute(
+        text(f"SELECT vehicle_number FROM {PROFILE_TABLE} ORDER BY stops DESC LIMIT {count // 10 or 1};")
+    )]
+    rng = random.Random(seed)
+    seek = text(f"SELECT MIN(vehicle_number) FROM {PROFILE_TABLE} WHERE vehicle_number >= :prefix;")
+    sampled = [
+        connection.execute(seek, {'prefix': "".join(rng.choice(PLATE_CHARACTERS) for _ in range(3))}).scalar()
+        for _ in range(count - len(busiest))
+    ]
+    return busiest + [plate for plate in sampled if plate is not None]
+
+def run_benchmark(engine, lookups=BENCHMARK_LOOKUPS):
+    # Times cold lookups (no cache) of sampled plates.
+    with engine.connect() as connection:
+        plates = sample_plates(connection, lookups)
+        timings = []
+        for plate in plates:
+            start = time.perf_counter()
+            lookup_profile(connection, plate)
+            timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(f"Profile lookups: median {timings[len(timings) // 2]:.2f} ms, "
+          f"p95 {timings[int(0.95 * (len(timings) - 1))]:.2f} ms, max {timings[-1]:.2f} ms over {len(timings)} plates.")
+    return timings
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Look up, rebuild or benchmark per-vehicle profiles.")
+    parser.add_argument("--plate", help="Print the profile of this vehicle number as JSON.")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild every profile from traffic_stops (MySQL).")
+    parser.add_argument("--benchmark", action="store_true", help="Time primary-key lookups of sampled plates.")
+    parser.add_argument("--backend", choices=("mysql", "duckdb"), help="Backend to read (default SECURECHECK_BACKEND).")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    import backend
+    if args.rebuild:
+        from data_processor import get_db_connection, save_profile_watermark
+        with get_db_connection().connect() as connection:
+            save_profile_watermark(connection, rebuild_profiles(connection))
+    elif args.benchmark:
+        run_benchmark(backend.get_engine(args.backend))
+    elif args.plate:
+        with backend.get_engine(args.backend).connect() as connection:
+            profile = lookup_profile(connection, args.plate)
+        if profile is None:
+            print(f"ERROR: No profile for vehicle '{args.plate.strip()}'.")
+        else:
+            print(json.dumps(profile, indent=2))
+    else:
+        print("Nothing to do: pass --plate, --rebuild or --benchmark.")
@@ -0,0 +1,215 @@
+import argparse
+import os
+import random
+import time
+
+import numpy as np
+from sqlalchemy import bindparam, create_engine, text
+
+TRIGRAM_TABLE = "vehicle_trigrams"
+TRAFFIC_STOPS_TABLE = "traffic_stops"
+TRIGRAM_BATCH_SIZE = 5000
+MAX_CANDIDATE_PLATES = 5000
+BENCHMARK_DB = "vehicle_search_benchmark.sqlite"
+BENCHMARK_SIZES = [1_000_000, 10_000_000, 50_000_000]
+BENCHMARK_ROWS_PER_PLATE = 20
+BENCHMARK_BATCH_ROWS = 500000
+BENCHMARK_LOOKUPS = 20
+
+def normalize_plate(value):
+    return "".join(str(value).upper().split())
+
+def plate_trigrams(plate):
+    plate = normalize_plate(plate)
+    return {plate[i:i + 3] for i in range(len(plate) - 2)}
+
+def insert_ignore(connection):
+    # The only dialect difference the index needs: MySQL in production, SQLite
+    # for the benchmark stand-in.
+    return "INSERT OR IGNORE" if connection.dialect.name == "sqlite" else "INSERT IGNORE"
+
+def create_trigram_table(connection):
+    connection.execute(text(f"""
+    CREATE TABLE IF NOT EXISTS {TRIGRAM_TABLE} (
+        trigram CHAR(3) NOT NULL,
+        vehicle_number VARCHAR(255) NOT NULL,
+        PRIMARY KEY (trigram, vehicle_number)
+    );
+    """))
+
+def index_plates(connection, plates):
+    rows = [
+        {'trigram': trigram, 'vehicle_number': plate}
+        for plate in plates if plate and plate != 'Unknown'
+        for trigram in plate_trigrams(plate)
+    ]
+    for start in range(0, len(rows), TRIGRAM_BATCH_SIZE):
+        connection.execute(
+            text(f"{insert_ignore(connection)} INTO {TRIGRAM_TABLE} (trigram, vehicle_number) VALUES (:trigram, :vehicle_number);"),
+            rows[start:start + TRIGRAM_BATCH_SIZE],
+        )
+    return len(rows)
+
+def refresh_trigrams(connection, stops_table=TRAFFIC_STOPS_TABLE, after_stop_id=0, max_stop_id=None):
+    # Indexes the plates of stops in (after_stop_id, max_stop_id]. Plates seen
+    # before are re-offered and ignored by the primary key, which is cheaper
+    # than checking first. Returns the stop_id the index now covers.
+    create_trigram_table(connection)
+    if max_stop_id is None:
+        max_stop_id = connection.execute(text(f"SELECT COALESCE(MAX(stop_id), 0) FROM {stops_table};")).scalar()
+    result = connection.execute(
+        text(f"SELECT DISTINCT vehicle_number FROM {stops_table} WHERE stop_id > :after AND stop_id <= :max_stop_id;"),
+        {'after': after_stop_id, 'max_stop_id': max_stop_id},
+    )
+    plates_seen = 0
+    while True:
+        plates = [row[0] for row in result.fetchmany(TRIGRAM_BATCH_SIZE)]
+        if not plates:
+            break
+        index_plates(connection, plates)
+        plates_seen += len(plates)
+    connection.commit()
+    print(f"SUCCESS: Trigram index updated with {plates_seen} plates from stops {after_stop_id + 1}..{max_stop_id}.")
+    return max_stop_id
+
+def rebuild_trigrams(connection, stops_table=TRAFFIC_STOPS_TABLE):
+    connection.execute(text(f"DROP TABLE IF EXISTS {TRIGRAM_TABLE};"))
+    return refresh_trigrams(connection, stops_table)
+
+def find_plates(connection, term, limit=MAX_CANDIDATE_PLATES):
+    # Returns the plates containing term, or None when the index cannot answer
+    # (terms shorter than a trigram) or the match is too broad to be useful.
+    # Every plate holding all of the term's trigrams is a candidate; the LIKE
+    # then runs only over those few candidates to drop false positives.
+    term = normalize_plate(term)
+    trigrams = sorted(plate_trigrams(term))
+    if not trigrams:
+        return None
+    escaped = term.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+    query = text(f"""
+        SELECT candidates.vehicle_number
+        FROM (
+            SELECT vehicle_number
+            FROM {TRIGRAM_TABLE}
+            WHERE trigram IN :trigrams
+            GROUP BY vehicle_number
+            HAVING COUNT(*) = :trigram_count
+        ) candidates
+        WHERE UPPER(candidates.vehicle_number) LIKE :pattern ESCAPE '!'
+        LIMIT :limit;
+    """).bindparams(bindparam('trigrams', expanding=True))
+    plates = [row[0] for row in connection.execute(query, {
+        'trigrams': trigrams,
+        'trigram_count': len(trigrams),
+        'pattern': f"%{escaped}%",
+        'limit': limit + 1,
+    })]
+    if len(plates) > limit:
+        return None
+    return plates
+
+def populate_benchmark_db(engine, total_rows, seed=42):
+    # Stops are generated with numpy a batch at a time and bulk inserted
+    # through the driver, so the 50M-row size loads without a Python loop per row.
+    # synthetic_data is imported here because it imports data_processor, which
+    # imports this module.
+    from synthetic_data import PLATE_SPACE, format_plates
+    rng = np.random.default_rng(seed)
+    plate_count = max(1, total_rows // BENCHMARK_ROWS_PER_PLATE)
+    plates = format_plates(rng.choice(PLATE_SPACE, size=plate_count, replace=False))
+    stop_dates = np.array([f"2020-01-{day:02d}" for day in range(1, 29)], dtype=object)
+    with engine.connect() as connection:
+        connection.execute(text(f"DROP TABLE IF EXISTS {TRAFFIC_STOPS_TABLE};"))
+        connection.execute(text(f"DROP TABLE IF EXISTS {TRIGRAM_TABLE};"))
+        connection.execute(text(f"""
+        CREATE TABLE {TRAFFIC_STOPS_TABLE} (
+            stop_id INTEGER PRIMARY KEY,
+            stop_date DATE,
+            vehicle_number VARCHAR(255)
+        );
+        """))
+        for start in range(0, total_rows, BENCHMARK_BATCH_ROWS):
+            stop_ids = np.arange(start + 1, min(start + BENCHMARK_BATCH_ROWS, total_rows) + 1)
+            batch = zip(
+                stop_ids.tolist(),
+                stop_dates[stop_ids % len(stop_dates)].tolist(),
+                plates[rng.integers(0, plate_count, size=len(stop_ids))].tolist(),
+            )
+            connection.exec_driver_sql(f"INSERT INTO {TRAFFIC_STOPS_TABLE} VALUES (?, ?, ?);", list(batch))
+        connection.execute(text(f"CREATE INDEX idx_vehicle_number ON {TRAFFIC_STOPS_TABLE} (vehicle_number);"))
+        connection.commit()
+    return plates.tolist()
+
+def time_lookup(connection, term, use_index):
+    start = time.perf_counter()
+    if use_index:
+        plates = find_plates(connection, term)
+        query = text(f"SELECT * FROM {TRAFFIC_STOPS_TABLE} WHERE vehicle_number IN :plates;").bindparams(
+            bindparam('plates', expanding=True)
+        )
+        rows = connection.execute(query, {'plates': plates}).fetchall() if plates else []
+    else:
+        rows = connection.execute(
+            text(f"SELECT * FROM {TRAFFIC_STOPS_TABLE} WHERE vehicle_number LIKE :pattern;"),
+            {'pattern': f"%{term}%"},
+        ).fetchall()
+    return time.perf_counter() - start, len(rows)
+
+def run_benchmark(sizes=BENCHMARK_SIZES, db_path=BENCHMARK_DB, lookups=BENCHMARK_LOOKUPS):
+    # SQLite stands in for MySQL: both do a full scan for a leading-wildcard
+    # LIKE and a B-tree probe for the trigram postings, so the ratio carries over.
+    rng = random.Random(7)
+    for total_rows in sizes:
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        engine = create_engine(f"sqlite:///{db_path}")
+        print(f"--- {total_rows:,} rows ---")
+        start = time.perf_counter()
+        plates = populate_benchmark_db(engine, total_rows)
+        print(f"Loaded {total_rows:,} stops over {len(plates):,} plates in {time.perf_counter() - start:.1f}s.")
+
+        with engine.connect() as connection:
+            start = time.perf_counter()
+            rebuild_trigrams(connection)
+            print(f"Trigram index built in {time.perf_counter() - start:.1f}s.")
+
+            terms = []
+            for _ in range(lookups):
+                plate = rng.choice(plates)
+                offset = rng.randint(0, len(plate) - 5)
+                terms.append(plate[offset:offset + rng.randint(4, 5)])
+
+            for label, use_index in (("LIKE scan", False), ("trigram index", True)):
+                timings = []
+                for term in terms:
+                    seconds, _ = time_lookup(connection, term, use_index)
+                    timings.append(seconds)
+                timings.sort()
+                print(f"{label:>14}: median {timings[len(timings) // 2] * 1000:,.1f} ms, "
+                      f"max {timings[-1] * 1000:,.1f} ms over {len(terms)} lookups")
+
+            # Both paths must find exactly the same stops.
+            for term in terms[:5]:
+                assert time_lookup(connection, term, False)[1] == time_lookup(connection, term, True)[1]
+        engine.dispose()
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Maintain or benchmark the vehicle-number trigram index.")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the trigram index from traffic_stops.")
+    parser.add_argument("--benchmark", help="Comma-separated row counts to benchmark against LIKE on SQLite "
+                                            "(default 1000000,10000000,50000000).", nargs="?",
+                        const=",".join(str(size) for size in BENCHMARK_SIZES))
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.benchmark:
+        run_benchmark([int(size) for size in args.benchmark.split(",")])
+    elif args.rebuild:
+        from data_processor import get_db_connection, save_trigram_watermark
+        with get_db_connection().connect() as connection:
+            save_trigram_watermark(connection, rebuild_trigrams(connection))
+    else:
+        print("Nothing to do: pass --rebuild or --benchmark.")